@@ -1,8 +1,24 @@
-import json
+import asyncio
+import logging
 import os
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional
 
-import requests
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from . import metrics
+from .answer_cache import answer_cache
+from .chunking import AI_CONTEXT_TOKENS, chunk_document, collapse_passages, fit_to_budget
+from .documents import epoch
+from .embedding_cache import embedding_cache
+from .lexical import lexical_index
+from .ollama_client import AsyncOllamaClient, OllamaClient, CircuitBreaker, OllamaUnavailable
+from .singleflight import SingleFlight, flight_key
+from .vector_store import AI_VECTOR_BACKEND, AI_VECTOR_DIR, NumpyVectorStore, np
 
 try:
     import chromadb
@@ -12,6 +28,8 @@ except Exception:
     embedding_functions = None
 
 
+logger = logging.getLogger(__name__)
+
 # Reduce Chroma telemetry noise in local dev
 os.environ.setdefault('ANONYMIZED_TELEMETRY', 'False')
 
@@ -20,96 +38,286 @@ OLLAMA_CHAT_MODEL = os.environ.get('OLLAMA_CHAT_MODEL', 'llama3')
 OLLAMA_EMBED_MODEL = os.environ.get('OLLAMA_EMBED_MODEL', 'nomic-embed-text')
 CHROMA_DIR = os.environ.get('CHROMA_DIR', '.chroma')
 CHROMA_COLLECTION = os.environ.get('CHROMA_COLLECTION', 'unify_content')
+# Batched indexing: texts per /api/embed request and number of batches in flight
+OLLAMA_EMBED_BATCH_SIZE = int(os.environ.get('OLLAMA_EMBED_BATCH_SIZE', '32'))
+OLLAMA_EMBED_CONCURRENCY = int(os.environ.get('OLLAMA_EMBED_CONCURRENCY', '4'))
+# HTTP client: keep-alive pool per process, (connect, read) timeouts, retries
+# for embedding calls only, and a circuit breaker that fails fast when down
+OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', str(max(10, OLLAMA_EMBED_CONCURRENCY))))
+# Connections for the async views; requests beyond this wait as coroutines
+OLLAMA_ASYNC_POOL_SIZE = int(os.environ.get('OLLAMA_ASYNC_POOL_SIZE', '100'))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', '3'))
+OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', '120'))
+OLLAMA_EMBED_READ_TIMEOUT = float(os.environ.get('OLLAMA_EMBED_READ_TIMEOUT', '60'))
+OLLAMA_EMBED_RETRIES = int(os.environ.get('OLLAMA_EMBED_RETRIES', '2'))
+OLLAMA_BREAKER_THRESHOLD = int(os.environ.get('OLLAMA_BREAKER_THRESHOLD', '5'))
+OLLAMA_BREAKER_RESET = float(os.environ.get('OLLAMA_BREAKER_RESET', '30'))
+# Retrieval: 'hybrid' (vector + BM25 fused), 'vector' or 'lexical'
+AI_RETRIEVAL_MODE = os.environ.get('AI_RETRIEVAL_MODE', 'hybrid')
+AI_HYBRID_CANDIDATES = int(os.environ.get('AI_HYBRID_CANDIDATES', '20'))
+AI_RRF_K = int(os.environ.get('AI_RRF_K', '60'))
+# Passages fetched per requested document before collapsing to parents
+AI_PASSAGE_FANOUT = int(os.environ.get('AI_PASSAGE_FANOUT', '3'))
+# Posts retrieved for questions about today's news
+AI_NEWS_QA_TOP_K = int(os.environ.get('AI_NEWS_QA_TOP_K', '8'))
+
+
+# Shared by views, signals, tasks and management commands in this process
+ollama = OllamaClient(
+    OLLAMA_HOST,
+    chat_model=OLLAMA_CHAT_MODEL,
+    embed_model=OLLAMA_EMBED_MODEL,
+    pool_size=OLLAMA_POOL_SIZE,
+    connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+    read_timeout=OLLAMA_READ_TIMEOUT,
+    embed_read_timeout=OLLAMA_EMBED_READ_TIMEOUT,
+    embed_retries=OLLAMA_EMBED_RETRIES,
+    breaker=CircuitBreaker(OLLAMA_BREAKER_THRESHOLD, OLLAMA_BREAKER_RESET),
+    on_call=metrics.observe_call,
+)
+
+
+# Async views share the sync client's settings and circuit breaker
+aollama = AsyncOllamaClient(ollama, pool_size=OLLAMA_ASYNC_POOL_SIZE)
+
+
+# Identical prompts in flight at the same time share one generation
+generate_flight = SingleFlight()
 
 
 def ollama_generate(prompt: str, model: Optional[str] = None, temperature: float = 0.2) -> str:
-    url = f"{OLLAMA_HOST}/api/generate"
-    payload = {
-        "model": model or OLLAMA_CHAT_MODEL,
-        "prompt": prompt,
-        "options": {"temperature": temperature},
-        "stream": False,
-    }
-    try:
-        r = requests.post(url, json=payload, timeout=120)
-        r.raise_for_status()
-    except requests.exceptions.ConnectionError as ce:
-        raise RuntimeError("Cannot connect to Ollama at %s. Is it running? Try `ollama serve`." % OLLAMA_HOST) from ce
-    # Prefer non-stream single JSON
-    try:
-        data = r.json()
-        if isinstance(data, dict) and data.get('response'):
-            return data['response']
-    except Exception:
-        pass
-    # If server still streamed, concatenate lines' response fields
-    try:
-        parts = []
-        for line in r.text.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-                if isinstance(obj, dict) and 'response' in obj:
-                    parts.append(obj['response'])
-            except Exception:
-                continue
-        if parts:
-            return ''.join(parts)
-    except Exception:
-        pass
-    return r.text
+    model = model or OLLAMA_CHAT_MODEL
+    key = flight_key(model, prompt, temperature)
+    return generate_flight.do(key, lambda: ollama.generate(prompt, model=model, temperature=temperature))
+
+
+def ollama_generate_stream(prompt: str, model: Optional[str] = None, temperature: float = 0.2) -> Iterator[str]:
+    # Streams are consumed after the view returns; keep its metrics scope
+    return metrics.bind(ollama.generate_stream(prompt, model=model, temperature=temperature))
 
 
 def ollama_embed(text: str, model: Optional[str] = None) -> List[float]:
-    url = f"{OLLAMA_HOST}/api/embeddings"
-    payload = {"model": model or OLLAMA_EMBED_MODEL, "prompt": text}
-    try:
-        r = requests.post(url, json=payload, timeout=60)
-        if r.status_code == 404:
-            raise RuntimeError("Ollama embeddings endpoint returned 404. Ensure Ollama is running and the embedding model is available: `ollama pull %s`." % (model or OLLAMA_EMBED_MODEL))
-        r.raise_for_status()
-    except requests.exceptions.ConnectionError as ce:
-        raise RuntimeError("Cannot connect to Ollama at %s. Is it running? Try `ollama serve`." % OLLAMA_HOST) from ce
-    data = r.json()
-    vec = data.get('embedding') or data.get('embeddings') or []
-    if not vec:
-        raise RuntimeError('Ollama did not return an embedding vector.')
+    return ollama.embed(text, model=model)
+
+
+def ollama_embed_batch(texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+    return ollama.embed_batch(texts, model=model)
+
+
+def embed_query(text: str) -> List[float]:
+    """Embed a single text, consulting the embedding cache first."""
+    vec = embedding_cache.get(OLLAMA_EMBED_MODEL, text)
+    if vec is None:
+        vec = ollama_embed(text)
+        embedding_cache.put(OLLAMA_EMBED_MODEL, text, vec)
+    return vec
+
+
+async def aollama_generate(prompt: str, model: Optional[str] = None, temperature: float = 0.2) -> str:
+    model = model or OLLAMA_CHAT_MODEL
+    key = flight_key(model, prompt, temperature)
+    return await generate_flight.ado(key, lambda: aollama.generate(prompt, model=model, temperature=temperature))
+
+
+def aollama_generate_stream(prompt: str, model: Optional[str] = None, temperature: float = 0.2) -> AsyncIterator[str]:
+    return metrics.abind(aollama.generate_stream(prompt, model=model, temperature=temperature))
+
+
+async def aembed_query(text: str) -> List[float]:
+    # The cache is a local SQLite file; only the Ollama call is awaited on the network
+    vec = await sync_to_async(embedding_cache.get, thread_sensitive=False)(OLLAMA_EMBED_MODEL, text)
+    if vec is None:
+        vec = await aollama.embed(text)
+        await sync_to_async(embedding_cache.put, thread_sensitive=False)(OLLAMA_EMBED_MODEL, text, vec)
     return vec
 
 
+def _batched(items: List[Any], size: int) -> List[List[Any]]:
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
 def _get_chroma_client():
     if chromadb is None:
         raise RuntimeError('ChromaDB not installed. Please add chromadb to requirements and install.')
     return chromadb.PersistentClient(path=CHROMA_DIR)
 
 
+# One vector store handle per process: a Chroma collection, or a
+# NumpyVectorStore when AI_VECTOR_BACKEND=numpy. The owning pid is recorded so
+# a worker forked from a preloading master (gunicorn --preload) opens its own
+# handle instead of reusing the parent's.
+_chroma_lock = threading.Lock()
+_chroma_handle: Dict[str, Any] = {'pid': None, 'client': None, 'collection': None}
+chroma_warmup_seconds: Optional[float] = None
+
+
 def get_collection():
-    client = _get_chroma_client()
-    try:
-        coll = client.get_collection(CHROMA_COLLECTION)
-    except Exception:
-        coll = client.create_collection(CHROMA_COLLECTION)
-    return coll
+    handle = _chroma_handle
+    if handle['collection'] is not None and handle['pid'] == os.getpid():
+        return handle['collection']
+    with _chroma_lock:
+        if handle['collection'] is None or handle['pid'] != os.getpid():
+            if AI_VECTOR_BACKEND == 'numpy':
+                client, coll = None, NumpyVectorStore(AI_VECTOR_DIR)
+            else:
+                client = _get_chroma_client()
+                try:
+                    coll = client.get_collection(CHROMA_COLLECTION)
+                except Exception:
+                    coll = client.create_collection(CHROMA_COLLECTION)
+            handle.update(pid=os.getpid(), client=client, collection=coll)
+        return handle['collection']
+
+
+def reset_collection():
+    """Drop the cached handle; the next get_collection() reopens the store."""
+    with _chroma_lock:
+        _chroma_handle.update(pid=None, client=None, collection=None)
+
+
+def _reset_after_fork():
+    # The parent may fork while another thread (the warm-up) holds the lock;
+    # the child would never see it released, so it starts with a fresh one
+    global _chroma_lock
+    _chroma_lock = threading.Lock()
+    _chroma_handle.update(pid=None, client=None, collection=None)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
 
+def vector_store_name() -> Optional[str]:
+    """Describe the store get_collection() opens; None if its library is not installed."""
+    if AI_VECTOR_BACKEND == 'numpy':
+        return None if np is None else "NumPy vector store '%s'" % AI_VECTOR_DIR
+    return None if chromadb is None else "Chroma collection '%s'" % CHROMA_COLLECTION
 
-def add_documents(docs: List[Dict[str, Any]]):
+
+def warm_up() -> float:
+    """Open the vector store and touch the collection. Returns elapsed seconds."""
+    global chroma_warmup_seconds
+    started = time.perf_counter()
+    get_collection().count()
+    chroma_warmup_seconds = time.perf_counter() - started
+    return chroma_warmup_seconds
+
+
+def add_documents(docs: List[Dict[str, Any]], batch_size: Optional[int] = None, concurrency: Optional[int] = None):
     # docs: [{id, text, metadata}]
+    # Each document is split into overlapping passages (see ai/chunking.py)
+    # that are embedded and stored under `<id>#<n>`.
+    # Embeds `batch_size` texts per request with up to `concurrency` requests in
+    # flight, and upserts each batch into Chroma as soon as its vectors arrive.
+    # Texts already in the embedding cache are not sent to Ollama at all.
     if not docs:
         return
     coll = get_collection()
-    ids = [str(d['id']) for d in docs]
-    texts = [d['text'] for d in docs]
-    metadatas = [d.get('metadata', {}) for d in docs]
-    embeddings = [ollama_embed(t) for t in texts]
-    coll.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+    parent_ids = [str(d['id']) for d in docs]
+    passages = [c for d in docs for c in chunk_document(d)]
+    batches = _batched(passages, batch_size or OLLAMA_EMBED_BATCH_SIZE)
+    workers = max(1, min(concurrency or OLLAMA_EMBED_CONCURRENCY, len(batches)))
+
+    def _embed(batch):
+        texts = [d['text'] for d in batch]
+        vecs = embedding_cache.get_many(OLLAMA_EMBED_MODEL, texts)
+        missing = [i for i, v in enumerate(vecs) if v is None]
+        if missing:
+            fresh = ollama_embed_batch([texts[i] for i in missing])
+            embedding_cache.put_many(OLLAMA_EMBED_MODEL, [texts[i] for i in missing], fresh)
+            for i, v in zip(missing, fresh):
+                vecs[i] = v
+        return vecs
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Chroma upserts stay on the calling thread; only HTTP runs in the pool.
+        for batch, embeddings in zip(batches, pool.map(metrics.propagate(_embed), batches)):
+            with metrics.timed('vector_upsert'):
+                coll.upsert(
+                    ids=[d['id'] for d in batch],
+                    documents=[d['text'] for d in batch],
+                    metadatas=[d['metadata'] for d in batch],
+                    embeddings=embeddings,
+                )
+    _delete_stale_passages(coll, parent_ids, {d['id'] for d in passages})
+    # Cached chat answers built on the old text of these documents are stale
+    answer_cache.invalidate_docs(parent_ids)
+
+
+def _delete_stale_passages(coll, parent_ids: List[str], current: set):
+    # Drop passages left over from a longer previous version of a document, and
+    # whole-document entries stored before indexing was chunked
+    existing = coll.get(where={'parent_id': {'$in': parent_ids}}, include=[]).get('ids') or []
+    legacy = coll.get(ids=parent_ids, include=[]).get('ids') or []
+    stale = [i for i in existing if i not in current] + list(legacy)
+    if stale:
+        coll.delete(ids=stale)
+
+
+def remove_documents(ids: List[str]):
+    """Remove documents (all of their passages) from the vector store."""
+    if not ids:
+        return
+    ids = [str(i) for i in ids]
+    coll = get_collection()
+    _delete_stale_passages(coll, ids, set())
+    answer_cache.invalidate_docs(ids)
+
+
+def store_path() -> str:
+    return AI_VECTOR_DIR if AI_VECTOR_BACKEND == 'numpy' else CHROMA_DIR
+
+
+def get_stored_hashes(ids: List[str]) -> Dict[str, str]:
+    """Return {document id: hash of its indexed text} for documents already in the collection."""
+    if not ids:
+        return {}
+    coll = get_collection()
+    res = coll.get(where={'parent_id': {'$in': [str(i) for i in ids]}}, include=['metadatas'])
+    return {m['parent_id']: m.get('parent_hash', '') for m in res.get('metadatas') or [] if m}
+
+
+def build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Translate retrieval filters into a vector-store metadata where-clause.
+
+    filters may contain `type` ('news' or 'project'), `category`, and
+    `since` / `until` datetimes (until is exclusive) matched against the
+    document's created_at.
+    """
+    if not filters:
+        return None
+    clauses = []
+    for key in ('type', 'category'):
+        if filters.get(key):
+            clauses.append({key: filters[key]})
+    if filters.get('since') is not None:
+        clauses.append({'created_at': {'$gte': epoch(filters['since'])}})
+    if filters.get('until') is not None:
+        clauses.append({'created_at': {'$lt': epoch(filters['until'])}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
 
 
-def query_similar(query_text: str, n: int = 5) -> List[Dict[str, Any]]:
+def day_filters(day: date, **extra) -> Dict[str, Any]:
+    """Filters matching news posts created on `day` in the current time zone."""
+    since = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return dict(extra, type='news', since=since, until=since + timedelta(days=1))
+
+
+def _vector_search(query_text: str, n: int, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    get_collection()  # fail before the embedding call if the store is unavailable
+    return _search_collection(embed_query(query_text), n, where)
+
+
+def _search_collection(qvec: List[float], n: int, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    # Search passages, then collapse them to their `n` best parent documents.
+    # Several passages of one document can rank highly, so over-fetch.
     coll = get_collection()
-    qvec = ollama_embed(query_text)
-    res = coll.query(query_embeddings=[qvec], n_results=n)
+    kwargs = {'where': where} if where else {}
+    with metrics.timed('vector_query'):
+        res = coll.query(query_embeddings=[qvec], n_results=n * AI_PASSAGE_FANOUT, **kwargs)
     results = []
     for i in range(len(res.get('ids', [[]])[0])):
         results.append({
@@ -118,4 +326,184 @@ def query_similar(query_text: str, n: int = 5) -> List[Dict[str, Any]]:
             'metadata': res['metadatas'][0][i],
             'distance': res.get('distances', [[None]])[0][i] if res.get('distances') else None,
         })
-    return results
\ No newline at end of file
+    return collapse_passages(results, n)
+
+
+def _lexical_search(query_text: str, n: int, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    with metrics.timed('lexical_query'):
+        return lexical_index.search(query_text, n=n, where=where)
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], n: int, k: int = AI_RRF_K) -> List[Dict[str, Any]]:
+    """Merge ranked lists by summing 1 / (k + rank) per document id.
+
+    A document keeps the text and metadata of the first list that ranked it;
+    later lists only add to its score. Callers pass the vector results first,
+    so their passage context (see chunking.collapse_passages) is what gets prompted.
+    """
+    scores: Dict[str, float] = {}
+    merged: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, r in enumerate(results, start=1):
+            scores[r['id']] = scores.get(r['id'], 0.0) + 1.0 / (k + rank)
+            merged.setdefault(r['id'], r)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:n]
+    return [dict(merged[i], rrf_score=scores[i]) for i in ranked]
+
+
+@metrics.in_phase('retrieval')
+def query_similar(query_text: str, n: int = 5, mode: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Retrieve the top `n` documents for `query_text`.
+
+    mode is 'vector' (Chroma only), 'lexical' (in-process BM25, no embedding
+    call) or 'hybrid' (both, fused with reciprocal-rank fusion). Hybrid falls
+    back to lexical results when the vector side is unavailable.
+
+    filters (see build_where) restrict both sides before ranking, so a
+    day-scoped question ranks only that day's posts.
+    """
+    mode = mode or AI_RETRIEVAL_MODE
+    where = build_where(filters)
+    if mode == 'lexical':
+        return _lexical_search(query_text, n, where)
+    if mode == 'vector':
+        return _vector_search(query_text, n, where)
+    candidates = max(n, AI_HYBRID_CANDIDATES)
+    lexical = _lexical_search(query_text, candidates, where)
+    try:
+        vector = _vector_search(query_text, candidates, where)
+    except RuntimeError as e:
+        logger.warning("Vector retrieval unavailable, using lexical results only: %s", e)
+        return lexical[:n]
+    return reciprocal_rank_fusion([vector, lexical], n=n)
+
+
+@metrics.in_phase('retrieval')
+async def aquery_similar(query_text: str, n: int = 5, mode: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Async query_similar: the embedding call is awaited and the lexical and
+    vector searches run concurrently."""
+    mode = mode or AI_RETRIEVAL_MODE
+    where = build_where(filters)
+    # The first lexical search may load the index from the database
+    lexical_search = sync_to_async(_lexical_search)
+    if mode == 'lexical':
+        return await lexical_search(query_text, n, where)
+    if mode == 'vector':
+        return await _avector_search(query_text, n, where)
+    candidates = max(n, AI_HYBRID_CANDIDATES)
+    lexical, vector = await asyncio.gather(
+        lexical_search(query_text, candidates, where),
+        _avector_search(query_text, candidates, where),
+        return_exceptions=True,
+    )
+    if isinstance(lexical, BaseException):
+        raise lexical
+    if isinstance(vector, RuntimeError):
+        logger.warning("Vector retrieval unavailable, using lexical results only: %s", vector)
+        return lexical[:n]
+    if isinstance(vector, BaseException):
+        raise vector
+    return reciprocal_rank_fusion([vector, lexical], n=n)
+
+
+async def _avector_search(query_text: str, n: int, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    await sync_to_async(get_collection, thread_sensitive=False)()
+    qvec = await aembed_query(query_text)
+    return await sync_to_async(_search_collection, thread_sensitive=False)(qvec, n, where)
+
+
+def build_chat_prompt(question: str, retrieved: List[Dict[str, Any]], budget: int = AI_CONTEXT_TOKENS) -> str:
+    # Context is filled in rank order until `budget` tokens are used
+    context_blocks = []
+    for r in fit_to_budget(retrieved, budget):
+        meta = r.get('metadata') or {}
+        prefix = 'News' if meta.get('type') == 'news' else 'Project'
+        context_blocks.append(f"[{prefix}] {meta.get('title','')}\n{r.get('text','')}")
+    context_text = "\n\n".join(context_blocks) if context_blocks else "No context found."
+    return (
+        "You are a helpful university assistant. Use the provided context to answer the user's question accurately.\n"
+        f"Context:\n{context_text}\n\n"
+        f"Question: {question}\n"
+        "Answer concisely and cite whether info came from News or Projects when relevant."
+    )
+
+
+@metrics.in_phase('retrieval')
+def retrieve_news_for_day(question: str, day: date, n: int = AI_NEWS_QA_TOP_K) -> List[Dict[str, Any]]:
+    """Top `n` posts of `day` for `question`, newest posts if the index has none yet."""
+    retrieved = query_similar(question, n=n, filters=day_filters(day))
+    if retrieved:
+        return retrieved
+    from news.models import NewsPost
+    from .documents import NEWS_DOCUMENT_FIELDS, news_document
+    posts = NewsPost.objects.filter(created_at__date=day).only(*NEWS_DOCUMENT_FIELDS).order_by('-created_at')[:n]
+    return [news_document(p) for p in posts]
+
+
+@metrics.in_phase('retrieval')
+async def aretrieve_news_for_day(question: str, day: date, n: int = AI_NEWS_QA_TOP_K) -> List[Dict[str, Any]]:
+    retrieved = await aquery_similar(question, n=n, filters=day_filters(day))
+    if retrieved:
+        return retrieved
+    from news.models import NewsPost
+    from .documents import NEWS_DOCUMENT_FIELDS, news_document
+    posts = NewsPost.objects.filter(created_at__date=day).only(*NEWS_DOCUMENT_FIELDS).order_by('-created_at')[:n]
+    return [news_document(p) async for p in posts]
+
+
+def build_news_qa_prompt(question: str, retrieved: List[Dict[str, Any]], total: int, budget: int = AI_CONTEXT_TOKENS) -> str:
+    # Only the most relevant posts are included; the total lets the model
+    # still answer "how many" questions
+    items = "\n\n".join(f"- {r['text']}" for r in fit_to_budget(retrieved, budget))
+    return (
+        "You are a helpful university assistant. Using ONLY the provided items from today's news, answer the user's question precisely.\n"
+        "If the user asks for a count, respond with the number first, followed by a short explanation.\n"
+        f"{total} items were published today; the {len(retrieved)} most relevant to the question are:\n{items}\n\n"
+        f"Question: {question}\n"
+        "Answer:"
+    )
+
+
+@metrics.in_phase('retrieval')
+def lookup_answer(question: str) -> Optional[Dict[str, Any]]:
+    """Return a cached answer to a semantically equivalent question, if any."""
+    if not answer_cache.enabled:
+        return None
+    try:
+        return answer_cache.lookup(embed_query(question))
+    except OllamaUnavailable:
+        # Best effort: retrieval may still work from the lexical index
+        return None
+
+
+def remember_answer(question: str, answer: str, retrieved: List[Dict[str, Any]]):
+    if not answer_cache.enabled:
+        return
+    try:
+        vector = embed_query(question)
+    except OllamaUnavailable:
+        return
+    answer_cache.store(question, vector, answer, [r['id'] for r in retrieved], used_context=len(retrieved))
+
+
+@metrics.in_phase('retrieval')
+async def alookup_answer(question: str) -> Optional[Dict[str, Any]]:
+    if not answer_cache.enabled:
+        return None
+    try:
+        vector = await aembed_query(question)
+    except OllamaUnavailable:
+        return None
+    return await sync_to_async(answer_cache.lookup, thread_sensitive=False)(vector)
+
+
+async def aremember_answer(question: str, answer: str, retrieved: List[Dict[str, Any]]):
+    if not answer_cache.enabled:
+        return
+    try:
+        vector = await aembed_query(question)
+    except OllamaUnavailable:
+        return
+    await sync_to_async(answer_cache.store, thread_sensitive=False)(
+        question, vector, answer, [r['id'] for r in retrieved], used_context=len(retrieved)
+    )
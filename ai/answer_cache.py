@@ -0,0 +1,145 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional
+
+
+AI_ANSWER_CACHE_PATH = os.environ.get('AI_ANSWER_CACHE_PATH', '.answer_cache.sqlite3')
+AI_ANSWER_CACHE_THRESHOLD = float(os.environ.get('AI_ANSWER_CACHE_THRESHOLD', '0.95'))
+AI_ANSWER_CACHE_TTL = float(os.environ.get('AI_ANSWER_CACHE_TTL', '3600'))
+AI_ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('AI_ANSWER_CACHE_MAX_ENTRIES', '500'))
+
+
+def _unit(vec: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+class SemanticAnswerCache:
+    """Answers keyed by question embedding, shared by every process via SQLite.
+
+    A lookup returns the stored answer whose question vector has the highest
+    cosine similarity to the new one, if it is at least `threshold` and the
+    entry is younger than `ttl` seconds. Each entry remembers the document ids
+    its context came from; re-indexing any of them drops the entry. An empty
+    `path` disables the cache.
+    """
+
+    def __init__(self, path: str, threshold: float = AI_ANSWER_CACHE_THRESHOLD, ttl: float = AI_ANSWER_CACHE_TTL, max_entries: int = AI_ANSWER_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        # Decoded unit vectors by row id; rows are immutable so this never goes stale
+        self._vectors: Dict[int, List[float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS answers ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL, vector BLOB NOT NULL, '
+                'answer TEXT NOT NULL, used_context INTEGER NOT NULL, created_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE TABLE IF NOT EXISTS answer_docs (answer_id INTEGER NOT NULL, doc_id TEXT NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS answer_docs_doc ON answer_docs (doc_id)')
+            self._conn = conn
+            self._pid = os.getpid()
+            self._vectors = {}
+        return self._conn
+
+    def lookup(self, vector: List[float]) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        query = _unit(vector)
+        best_id, best_score = None, self.threshold
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute('SELECT id, vector FROM answers WHERE created_at >= ?', (time.time() - self.ttl,)).fetchall()
+            live = set()
+            for row_id, blob in rows:
+                live.add(row_id)
+                vec = self._vectors.get(row_id)
+                if vec is None:
+                    vec = self._vectors[row_id] = array('f', blob).tolist()
+                if len(vec) != len(query):
+                    continue
+                score = sum(a * b for a, b in zip(query, vec))
+                if score >= best_score:
+                    best_id, best_score = row_id, score
+            for stale in set(self._vectors) - live:
+                del self._vectors[stale]
+            if best_id is None:
+                self.misses += 1
+                return None
+            question, answer, used_context = conn.execute(
+                'SELECT question, answer, used_context FROM answers WHERE id = ?', (best_id,)
+            ).fetchone()
+            self.hits += 1
+        return {'question': question, 'answer': answer, 'used_context': used_context, 'similarity': best_score}
+
+    def store(self, question: str, vector: List[float], answer: str, doc_ids: List[str], used_context: int = 0):
+        if not self.enabled or not answer:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            cur = conn.execute(
+                'INSERT INTO answers (question, vector, answer, used_context, created_at) VALUES (?, ?, ?, ?, ?)',
+                (question, array('f', _unit(vector)).tobytes(), answer, used_context, now),
+            )
+            conn.executemany('INSERT INTO answer_docs (answer_id, doc_id) VALUES (?, ?)', [(cur.lastrowid, str(d)) for d in set(doc_ids)])
+            # Expired entries first, then the oldest beyond max_entries
+            conn.execute('DELETE FROM answers WHERE created_at < ?', (now - self.ttl,))
+            conn.execute(
+                'DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY created_at DESC LIMIT ?)',
+                (self.max_entries,),
+            )
+            conn.execute('DELETE FROM answer_docs WHERE answer_id NOT IN (SELECT id FROM answers)')
+            conn.commit()
+
+    def invalidate_docs(self, doc_ids: List[str]) -> int:
+        """Drop every cached answer whose context included one of `doc_ids`."""
+        if not self.enabled or not doc_ids:
+            return 0
+        removed = 0
+        with self._lock:
+            conn = self._connection()
+            ids = [str(d) for d in doc_ids]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                sub = f'SELECT answer_id FROM answer_docs WHERE doc_id IN ({marks})'
+                removed += conn.execute(f'DELETE FROM answers WHERE id IN ({sub})', chunk).rowcount
+            conn.execute('DELETE FROM answer_docs WHERE answer_id NOT IN (SELECT id FROM answers)')
+            conn.commit()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        entries = 0
+        if self.enabled:
+            with self._lock:
+                (entries,) = self._connection().execute('SELECT COUNT(*) FROM answers').fetchone()
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'entries': entries,
+        }
+
+
+answer_cache = SemanticAnswerCache(AI_ANSWER_CACHE_PATH)
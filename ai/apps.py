@@ -1,5 +1,19 @@
+import logging
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
+
+def serving() -> bool:
+    """False under management commands (migrate, test, run_worker, ...) other than runserver."""
+    argv = sys.argv or ['']
+    command_line = os.path.basename(argv[0]) in ('manage.py', 'django-admin') or argv[0].endswith(os.path.join('django', '__main__.py'))
+    return not command_line or argv[1:2] == ['runserver']
+
 
 class AiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -10,4 +24,29 @@ class AiConfig(AppConfig):
         try:
             from . import signals  # noqa: F401
         except Exception:
-            pass
\ No newline at end of file
+            pass
+        if os.environ.get('AI_WARMUP', '1') != '0' and serving():
+            self.start_warm_up()
+            # Workers forked from a preloading master (gunicorn --preload) open
+            # and warm their own handle; ai_services resets its lock in the
+            # child first, as its fork hook was registered when it was imported
+            from . import ai_services  # noqa: F401
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self.start_warm_up)
+
+    def start_warm_up(self):
+        threading.Thread(target=self.warm_up, name='ai-warmup', daemon=True).start()
+
+    def warm_up(self):
+        # Open the vector store off the startup path so the first chat query
+        # only pays for the search itself
+        from . import ai_services
+        store = ai_services.vector_store_name()
+        if store is None:
+            return
+        try:
+            elapsed = ai_services.warm_up()
+        except Exception as e:
+            logger.warning("AI warm-up failed: %s", e)
+            return
+        logger.info("AI warm-up: %s ready in %.0f ms", store, elapsed * 1000)
@@ -0,0 +1,92 @@
+import hashlib
+import os
+from typing import Any, Dict, List
+
+# Passage size and overlap for indexing, and the context budget for prompts,
+# all in approximate tokens
+AI_CHUNK_TOKENS = int(os.environ.get('AI_CHUNK_TOKENS', '200'))
+AI_CHUNK_OVERLAP = int(os.environ.get('AI_CHUNK_OVERLAP', '40'))
+AI_CONTEXT_TOKENS = int(os.environ.get('AI_CONTEXT_TOKENS', '1500'))
+
+# English text averages roughly four characters, or three quarters of a word, per token
+CHARS_PER_TOKEN = 4
+WORDS_PER_TOKEN = 0.75
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or '') + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def chunk_document(doc: Dict[str, Any], max_tokens: int = AI_CHUNK_TOKENS, overlap: int = AI_CHUNK_OVERLAP) -> List[Dict[str, Any]]:
+    """Split a {id, text, metadata} document into overlapping passages.
+
+    Passage ids are `<parent id>#<n>` (e.g. `news:12#0`) and each passage's
+    metadata records `parent_id`, `chunk` and `parent_hash` (sha256 of the full
+    text). Passages after the first repeat the document's header line so they
+    still say what they belong to.
+    """
+    parent_id = str(doc['id'])
+    text = doc['text']
+    meta = dict(doc.get('metadata') or {}, parent_id=parent_id, parent_hash=text_hash(text))
+    words = text.split()
+    size = max(1, int(max_tokens * WORDS_PER_TOKEN))
+    step = max(1, size - int(overlap * WORDS_PER_TOKEN))
+    if len(words) <= size:
+        return [{'id': f'{parent_id}#0', 'text': text, 'metadata': dict(meta, chunk=0)}]
+    header = text.split('\n', 1)[0]
+    chunks = []
+    for start in range(0, len(words), step):
+        piece = ' '.join(words[start:start + size])
+        if start:
+            piece = f'{header}\n... {piece}'
+        chunks.append({'id': f'{parent_id}#{len(chunks)}', 'text': piece, 'metadata': dict(meta, chunk=len(chunks))})
+        if start + size >= len(words):
+            break
+    return chunks
+
+
+def collapse_passages(results: List[Dict[str, Any]], n: int) -> List[Dict[str, Any]]:
+    """Group ranked passages by parent document, keeping the parents' rank order.
+
+    Each parent's text is its matched passages in document order, so only the
+    relevant parts of a long post reach the prompt.
+    """
+    parents: Dict[str, Dict[str, Any]] = {}
+    for r in results:
+        meta = r.get('metadata') or {}
+        parent_id = meta.get('parent_id') or r['id']
+        entry = parents.get(parent_id)
+        if entry is None:
+            if len(parents) >= n:
+                continue
+            base = {k: v for k, v in meta.items() if k not in ('parent_id', 'parent_hash', 'chunk')}
+            entry = parents[parent_id] = {'id': parent_id, 'metadata': base, 'distance': r.get('distance'), 'passages': {}}
+        entry['passages'].setdefault(meta.get('chunk', 0), r.get('text', ''))
+    collapsed = []
+    for entry in parents.values():
+        passages = entry.pop('passages')
+        entry['text'] = '\n'.join(passages[k] for k in sorted(passages))
+        collapsed.append(entry)
+    return collapsed
+
+
+def fit_to_budget(results: List[Dict[str, Any]], budget: int = AI_CONTEXT_TOKENS) -> List[Dict[str, Any]]:
+    """Keep ranked results until `budget` tokens are used, truncating the last one."""
+    fitted = []
+    remaining = budget
+    for r in results:
+        if remaining <= 0:
+            break
+        text = r.get('text', '')
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            cut = text[:remaining * CHARS_PER_TOKEN]
+            text = (cut.rsplit(' ', 1)[0] if ' ' in cut else cut) + ' ...'
+            tokens = remaining
+        fitted.append(dict(r, text=text))
+        remaining -= tokens
+    return fitted
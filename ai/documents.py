@@ -0,0 +1,33 @@
+from typing import Any, Dict
+
+from news.models import NewsPost
+from projects.models import Project
+
+
+# Model fields the document builders read; use with .only() when loading rows
+NEWS_DOCUMENT_FIELDS = ('id', 'title', 'category', 'content', 'author_id', 'created_at')
+PROJECT_DOCUMENT_FIELDS = ('id', 'title', 'skills', 'description', 'author_id', 'created_at')
+
+
+def epoch(dt) -> int:
+    # Vector store metadata filters compare numbers, not datetimes
+    return int(dt.timestamp()) if dt else 0
+
+
+def news_document(n: NewsPost) -> Dict[str, Any]:
+    text = f"News: {n.title}\nCategory: {n.get_category_display()}\n{n.content}"
+    metadata = {
+        'type': 'news', 'title': n.title, 'category': n.category,
+        'author_id': n.author_id, 'created_at': epoch(n.created_at),
+    }
+    return {'id': f'news:{n.id}', 'text': text, 'metadata': metadata}
+
+
+def project_document(p: Project) -> Dict[str, Any]:
+    skills = ', '.join(p.skills_list())
+    text = f"Project: {p.title}\nSkills: {skills}\n{p.description}"
+    metadata = {
+        'type': 'project', 'title': p.title, 'skills': skills,
+        'author_id': p.author_id, 'created_at': epoch(p.created_at),
+    }
+    return {'id': f'project:{p.id}', 'text': text, 'metadata': metadata}
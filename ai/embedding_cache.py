@@ -0,0 +1,125 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import List, Optional, Dict
+
+
+EMBED_CACHE_PATH = os.environ.get('EMBED_CACHE_PATH', '.embed_cache.sqlite3')
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get('EMBED_CACHE_MAX_ENTRIES', '50000'))
+
+
+def normalize_text(text: str) -> str:
+    # Whitespace and unicode form differences should not cause a re-embed
+    return ' '.join(unicodedata.normalize('NFC', text or '').split())
+
+
+def cache_key(model: str, text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    return f"{model}:{digest}"
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (model, sha256 of normalized text).
+
+    Vectors are stored as float32 blobs in a small SQLite file and evicted in
+    least-recently-used order once `max_entries` is exceeded. An empty `path`
+    disables the cache.
+    """
+
+    def __init__(self, path: str, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._clock = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self):
+        # Reopen after fork: SQLite handles must not be shared across processes
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings ('
+                'key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _now(self) -> float:
+        # Strictly increasing so LRU order is stable within a process
+        self._clock = max(time.time(), self._clock + 1e-6)
+        return self._clock
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        if not self.enabled:
+            return [None] * len(texts)
+        keys = [cache_key(model, t) for t in texts]
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            unique = list(dict.fromkeys(keys))
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                for key, blob in conn.execute(f'SELECT key, vector FROM embeddings WHERE key IN ({marks})', chunk):
+                    found[key] = array('f', blob).tolist()
+            if found:
+                now = self._now()
+                conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?', [(now, k) for k in found])
+                conn.commit()
+            result = [found.get(k) for k in keys]
+            hits = sum(1 for v in result if v is not None)
+            self.hits += hits
+            self.misses += len(result) - hits
+        return result
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        if not self.enabled or not texts:
+            return
+        with self._lock:
+            now = self._now()
+            rows = [(cache_key(model, t), array('f', v).tobytes(), now) for t, v in zip(texts, vectors)]
+            conn = self._connection()
+            conn.executemany('INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)', rows)
+            (count,) = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    'DELETE FROM embeddings WHERE key IN '
+                    '(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)',
+                    (excess,),
+                )
+            conn.commit()
+
+    def put(self, model: str, text: str, vector: List[float]):
+        self.put_many(model, [text], [vector])
+
+    def stats(self) -> Dict[str, int]:
+        entries = 0
+        if self.enabled:
+            with self._lock:
+                (entries,) = self._connection().execute('SELECT COUNT(*) FROM embeddings').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+
+embedding_cache = EmbeddingCache(EMBED_CACHE_PATH)
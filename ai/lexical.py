@@ -0,0 +1,179 @@
+import heapq
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from .vector_store import matches_where
+
+logger = logging.getLogger(__name__)
+
+# Rebuild from the database when the index is older than this many seconds,
+# to pick up edits made by other processes
+AI_LEXICAL_MAX_AGE = float(os.environ.get('AI_LEXICAL_MAX_AGE', '300'))
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset(
+    'a an and are as at be by for from has have how i in is it its of on or that the this to was what when where which who why will with'.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or '').lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over the same documents Chroma holds.
+
+    Documents are added, replaced and removed one at a time, so the index can
+    be kept current from signals without rebuilding it.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return str(doc_id) in self._docs
+
+    def add(self, doc: Dict[str, Any]):
+        doc_id = str(doc['id'])
+        terms = Counter(tokenize(doc['text']))
+        with self._lock:
+            self._remove(doc_id)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            length = sum(terms.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+            self._docs[doc_id] = {'text': doc['text'], 'metadata': doc.get('metadata', {}), 'terms': list(terms)}
+
+    def add_many(self, docs: Iterable[Dict[str, Any]]):
+        for doc in docs:
+            self.add(doc)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(str(doc_id))
+
+    def _remove(self, doc_id: str):
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        for term in entry['terms']:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id, 0)
+
+    def search(self, query: str, n: int = 5, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        # `where` is a Chroma-style metadata filter, applied before ranking
+        terms = set(tokenize(query))
+        with self._lock:
+            total = len(self._docs)
+            if not terms or not total:
+                return []
+            avgdl = self._total_length / total or 1.0
+            scores: Dict[str, float] = {}
+            allowed: Dict[str, bool] = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    if where is not None:
+                        if doc_id not in allowed:
+                            allowed[doc_id] = matches_where(self._docs[doc_id]['metadata'], where)
+                        if not allowed[doc_id]:
+                            continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+            top = heapq.nlargest(n, scores.items(), key=lambda kv: kv[1])
+            return [
+                {'id': doc_id, 'text': self._docs[doc_id]['text'], 'metadata': self._docs[doc_id]['metadata'], 'score': score}
+                for doc_id, score in top
+            ]
+
+
+class LexicalIndex:
+    """Process-wide BM25 index, loaded from the database on first use.
+
+    Saves in this process update it immediately (see ai/signals.py); it is
+    rebuilt in the background every AI_LEXICAL_MAX_AGE seconds so changes
+    made by other processes show up too.
+    """
+
+    def __init__(self, max_age: float = AI_LEXICAL_MAX_AGE):
+        self.max_age = max_age
+        self.index: Optional[BM25Index] = None
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    @property
+    def loaded(self) -> bool:
+        return self.index is not None
+
+    def build(self) -> BM25Index:
+        from news.models import NewsPost
+        from projects.models import Project
+        from .documents import NEWS_DOCUMENT_FIELDS, PROJECT_DOCUMENT_FIELDS, news_document, project_document
+        index = BM25Index()
+        for obj in NewsPost.objects.only(*NEWS_DOCUMENT_FIELDS).iterator(chunk_size=1000):
+            index.add(news_document(obj))
+        for obj in Project.objects.only(*PROJECT_DOCUMENT_FIELDS).iterator(chunk_size=1000):
+            index.add(project_document(obj))
+        return index
+
+    def _rebuild(self):
+        try:
+            started = time.perf_counter()
+            index = self.build()
+            self.index, self.loaded_at = index, time.monotonic()
+            logger.info("Lexical index rebuilt: %d documents in %.0f ms", len(index), (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            logger.warning("Lexical index rebuild failed: %s", e)
+        finally:
+            from django.db import connection
+            connection.close()
+            self._rebuilding = False
+
+    def get(self) -> BM25Index:
+        if self.index is None:
+            with self._lock:
+                if self.index is None:
+                    self.index, self.loaded_at = self.build(), time.monotonic()
+        elif time.monotonic() - self.loaded_at > self.max_age and not self._rebuilding:
+            # Serve the current index while a fresh one is built
+            self._rebuilding = True
+            threading.Thread(target=self._rebuild, name='lexical-rebuild', daemon=True).start()
+        return self.index
+
+    def upsert(self, doc: Dict[str, Any]):
+        if self.index is not None:
+            self.index.add(doc)
+
+    def remove(self, doc_id: str):
+        if self.index is not None:
+            self.index.remove(doc_id)
+
+    def search(self, query: str, n: int = 5, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self.get().search(query, n=n, where=where)
+
+
+lexical_index = LexicalIndex()
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from ai import ai_services
+from ai.answer_cache import answer_cache
+from ai.embedding_cache import embedding_cache
+from ai.management.commands.ai_vector_bench import percentile
+from ai.standin import StandinConfig, start_in_thread
+from ai.summaries import refresh_daily_summary
+
+QUESTIONS = [
+    'Which projects use Python?',
+    'Are there any research grants announced?',
+    'What events are happening this week?',
+    'Which teams are looking for machine learning contributors?',
+    'Any updates about placements or the career fair?',
+    'What sports news is there?',
+    'Which projects need a frontend developer?',
+    'What did the library announce?',
+]
+TARGETS = {
+    'chat': ('ai:chat', 'post'),
+    'qa': ('ai:news_qa_today', 'post'),
+    'summary': ('ai:news_summary_today', 'get'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Load-test the AI endpoints and ai_reindex at a given concurrency; report throughput and latency percentiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=list(TARGETS) + ['reindex'], action='append', help='Target to run; repeatable (default: all).')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint (default 50).')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight (default 8).')
+        parser.add_argument('--user', help='Username to send requests as (default: first user).')
+        parser.add_argument('--stream', action='store_true', help='Request streamed chat answers and read them to the end.')
+        parser.add_argument('--cold', action='store_true', help='Disable the answer and embedding caches.')
+        parser.add_argument('--standin', action='store_true', help='Start an in-process Ollama stand-in and send all model calls to it.')
+        parser.add_argument('--latency', type=float, default=0.05, help='Stand-in: seconds before the first token (default 0.05).')
+        parser.add_argument('--token-rate', type=float, default=200.0, help='Stand-in: tokens per second (default 200).')
+        parser.add_argument('--tokens', type=int, default=40, help='Stand-in: tokens per answer (default 40).')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.filter(username=options['user']).first() if options['user'] else User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('No user to send requests as; run seed_university_data or pass --user.')
+        if options['standin']:
+            config = StandinConfig(latency=options['latency'], token_rate=options['token_rate'], tokens=options['tokens'])
+            server = start_in_thread(config)
+            ai_services.ollama.host = 'http://%s:%d' % server.server_address[:2]
+            self.stdout.write(f'Using Ollama stand-in at {ai_services.ollama.host}')
+        if options['cold']:
+            answer_cache.path = ''
+            embedding_cache.path = ''
+
+        targets = options['target'] or list(TARGETS) + ['reindex']
+        self.factory = RequestFactory()
+        self.user = user
+        self.stream = options['stream']
+        self.stdout.write(f"{options['requests']} requests per endpoint, concurrency {options['concurrency']}")
+        for target in targets:
+            if target == 'reindex':
+                self.bench_reindex()
+                continue
+            if target == 'summary':
+                started = time.perf_counter()
+                refresh_daily_summary(timezone.localdate())
+                self.stdout.write(f'summary refresh: {(time.perf_counter() - started) * 1000:.0f} ms')
+            self.bench_endpoint(target, options['requests'], options['concurrency'])
+
+    def call(self, target, i):
+        name, method = TARGETS[target]
+        path = reverse(name)
+        data = {'q': QUESTIONS[i % len(QUESTIONS)]} if method == 'post' else {}
+        if self.stream and target == 'chat':
+            data['stream'] = '1'
+        request = getattr(self.factory, method)(path, data)
+        request.user = self.user
+        request.resolver_match = resolve(path)
+        view = request.resolver_match.func
+        started = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(view):
+                response = async_to_sync(self._call_async)(view, request)
+            else:
+                response = view(request)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        finally:
+            connection.close()
+        return (time.perf_counter() - started) * 1000, ok
+
+    async def _call_async(self, view, request):
+        user = self.user
+
+        async def auser():
+            return user
+        request.auser = auser
+        response = await view(request)
+        if response.streaming:
+            async for _ in response.streaming_content:
+                pass
+        return response
+
+    def bench_endpoint(self, target, n, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            results = list(pool.map(lambda i: self.call(target, i), range(n)))
+        elapsed = time.perf_counter() - started
+        self.report(target, [ms for ms, _ in results], sum(1 for _, ok in results if not ok), elapsed)
+
+    def bench_reindex(self):
+        started = time.perf_counter()
+        out = StringIO()
+        try:
+            call_command('ai_reindex', stdout=out)
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'[reindex] failed: {e}'))
+            return
+        elapsed = time.perf_counter() - started
+        summary = [line for line in out.getvalue().splitlines() if line.startswith('Indexed')]
+        self.stdout.write(self.style.SUCCESS('[reindex]'))
+        self.stdout.write(f"  {elapsed:.2f} s{'; ' + summary[0] if summary else ''}")
+
+    def report(self, target, timings, errors, elapsed):
+        self.stdout.write(self.style.SUCCESS(f'[{target}]'))
+        self.stdout.write(f'  {len(timings)} requests, {errors} errors, {len(timings) / elapsed:.1f} req/s')
+        self.stdout.write(
+            f'  latency: p50 {percentile(timings, 50):.0f} ms, p95 {percentile(timings, 95):.0f} ms, '
+            f'p99 {percentile(timings, 99):.0f} ms'
+        )
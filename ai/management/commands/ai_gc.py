@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from ai.ai_services import get_collection, remove_documents, store_path
+from ai.lexical import lexical_index
+from news.models import NewsPost
+from projects.models import Project
+
+MODELS = {'news': NewsPost, 'project': Project}
+
+
+def disk_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def parent_of(entry_id, metadata):
+    return (metadata or {}).get('parent_id') or entry_id.split('#', 1)[0]
+
+
+def parse_parent(parent_id):
+    kind, _, pk = parent_id.partition(':')
+    if kind in MODELS and pk.isdigit():
+        return kind, int(pk)
+    return None, None
+
+
+class Command(BaseCommand):
+    help = 'Remove vector index entries whose post or project no longer exists, then compact the store.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Index entries read and checked per batch (default 1000).')
+        parser.add_argument('--dry-run', action='store_true', help='Report orphans without removing them.')
+        parser.add_argument('--queries', type=int, default=20, help='Sample queries used to time retrieval before and after (default 20).')
+
+    def handle(self, *args, **options):
+        coll = get_collection()
+        batch_size = max(1, options['batch_size'])
+        path = store_path()
+        before_count, before_bytes = coll.count(), disk_size(path)
+        samples = self.sample_queries(coll, options['queries'])
+        before_ms = self.time_queries(coll, samples)
+        self.stdout.write(f'Index: {before_count} entries, {before_bytes / 1e6:.1f} MB on disk')
+
+        orphans = self.find_orphans(coll, batch_size)
+        if not orphans:
+            self.stdout.write(self.style.SUCCESS('No orphaned entries.'))
+            return
+        self.stdout.write(f'{len(orphans)} orphaned documents found.')
+        if options['dry_run']:
+            for parent_id in sorted(orphans)[:20]:
+                self.stdout.write(f'  {parent_id}')
+            return
+
+        parents = sorted(orphans)
+        for i in range(0, len(parents), batch_size):
+            remove_documents(parents[i:i + batch_size])
+            for parent_id in parents[i:i + batch_size]:
+                lexical_index.remove(parent_id)
+        self.compact(coll, path)
+
+        after_count, after_bytes = coll.count(), disk_size(path)
+        after_ms = self.time_queries(coll, samples)
+        self.stdout.write(
+            f'Removed {before_count - after_count} entries: {before_count} -> {after_count} entries, '
+            f'{before_bytes / 1e6:.1f} -> {after_bytes / 1e6:.1f} MB on disk'
+        )
+        if before_ms is not None and after_ms is not None:
+            self.stdout.write(f'Median query latency: {before_ms:.2f} -> {after_ms:.2f} ms')
+        self.stdout.write(self.style.SUCCESS('Garbage collection complete.'))
+
+    def find_orphans(self, coll, batch_size):
+        # Read the index page by page; ids are only collected here and removed
+        # afterwards so the pagination offsets stay valid
+        orphans = set()
+        offset = 0
+        while True:
+            page = coll.get(include=['metadatas'], limit=batch_size, offset=offset)
+            ids = page.get('ids') or []
+            if not ids:
+                return orphans
+            parents = {parent_of(i, m) for i, m in zip(ids, page.get('metadatas') or [None] * len(ids))}
+            wanted = {'news': set(), 'project': set()}
+            for parent_id in parents:
+                kind, pk = parse_parent(parent_id)
+                if kind is None:
+                    orphans.add(parent_id)
+                else:
+                    wanted[kind].add(pk)
+            for kind, pks in wanted.items():
+                if not pks:
+                    continue
+                existing = set(MODELS[kind].objects.filter(id__in=pks).values_list('id', flat=True))
+                orphans.update(f'{kind}:{pk}' for pk in pks - existing)
+            offset += len(ids)
+
+    def compact(self, coll, path):
+        if hasattr(coll, 'compact'):
+            coll.compact()
+            return
+        # Chroma: reclaim the space freed in its SQLite file
+        db = os.path.join(path, 'chroma.sqlite3')
+        if not os.path.exists(db):
+            return
+        try:
+            conn = sqlite3.connect(db, timeout=30)
+            conn.execute('VACUUM')
+            conn.close()
+        except sqlite3.Error as e:
+            self.stdout.write(self.style.WARNING(f'Could not compact {db}: {e}'))
+
+    def sample_queries(self, coll, n):
+        if n <= 0:
+            return []
+        try:
+            page = coll.get(include=['embeddings'], limit=n)
+        except Exception:
+            return []
+        embeddings = page.get('embeddings')
+        return [list(e) for e in embeddings] if embeddings is not None else []
+
+    def time_queries(self, coll, samples):
+        # Stored embeddings stand in for query vectors, so no Ollama call is needed
+        if not samples:
+            return None
+        timings = []
+        for vec in samples:
+            started = time.perf_counter()
+            coll.query(query_embeddings=[vec], n_results=10)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -1,31 +1,85 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from ai.ai_services import add_documents
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from ai.ai_services import add_documents, get_stored_hashes
+from ai.metrics import source
+from ai.chunking import text_hash
+from ai.documents import NEWS_DOCUMENT_FIELDS, PROJECT_DOCUMENT_FIELDS, news_document, project_document
+from ai.embedding_cache import embedding_cache
 from news.models import NewsPost
 from projects.models import Project
 
 
+def parse_since(value):
+    dt = parse_datetime(value)
+    if dt is None:
+        d = parse_date(value)
+        if d is None:
+            raise CommandError(f'Invalid --since value: {value!r} (use YYYY-MM-DD or an ISO timestamp)')
+        dt = datetime.combine(d, time.min)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def iter_chunks(qs, size):
+    # Keyset pages on id: each page is fully read before the caller does any
+    # network I/O, so no SQLite cursor or transaction stays open meanwhile.
+    last_id = 0
+    while True:
+        rows = list(qs.filter(id__gt=last_id).order_by('id')[:size].iterator(chunk_size=size))
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
 class Command(BaseCommand):
-    help = 'Re-index all News and Projects into Chroma using Ollama embeddings.'
+    help = 'Re-index News and Projects into Chroma using Ollama embeddings, streaming rows in chunks.'
 
-    @transaction.atomic
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=['news', 'project'], help='Only index this document type.')
+        parser.add_argument('--since', help='Only index rows created at or after this date/timestamp.')
+        parser.add_argument('--changed-only', action='store_true', help='Skip documents whose stored text is unchanged.')
+        parser.add_argument('--chunk-size', type=int, default=256, help='Rows read, embedded and upserted per chunk (default 256).')
+
+    # No transaction here: rows are read in short autocommit queries and all
+    # network I/O (Ollama, Chroma) happens between them. Memory is bounded by
+    # --chunk-size regardless of corpus size.
+    @source('command:ai_reindex')
     def handle(self, *args, **options):
-        docs = []
-        self.stdout.write(self.style.WARNING('Collecting News posts...'))
-        for n in NewsPost.objects.all().iterator():
-            text = f"News: {n.title}\nCategory: {n.get_category_display()}\n{n.content}"
-            docs.append({'id': f'news:{n.id}', 'text': text, 'metadata': {'type': 'news', 'title': n.title, 'category': n.category}})
-
-        self.stdout.write(self.style.WARNING('Collecting Projects...'))
-        for p in Project.objects.all().iterator():
-            skills = ', '.join(p.skills_list())
-            text = f"Project: {p.title}\nSkills: {skills}\n{p.description}"
-            docs.append({'id': f'project:{p.id}', 'text': text, 'metadata': {'type': 'project', 'title': p.title, 'skills': skills}})
-
-        if not docs:
+        since = parse_since(options['since']) if options['since'] else None
+        chunk_size = max(1, options['chunk_size'])
+        sources = [
+            ('news', 'News posts', NewsPost.objects.only(*NEWS_DOCUMENT_FIELDS), news_document),
+            ('project', 'Projects', Project.objects.only(*PROJECT_DOCUMENT_FIELDS), project_document),
+        ]
+        embedding_cache.reset_stats()
+        seen = indexed = 0
+        for doc_type, label, qs, to_document in sources:
+            if options['type'] and options['type'] != doc_type:
+                continue
+            if since is not None:
+                qs = qs.filter(created_at__gte=since)
+            self.stdout.write(self.style.WARNING(f'Indexing {label}...'))
+            for rows in iter_chunks(qs, chunk_size):
+                indexed += self.index_chunk([to_document(obj) for obj in rows], options['changed_only'])
+                seen += len(rows)
+                self.stdout.write(f'  {seen} documents processed, {indexed} indexed')
+
+        if not seen:
             self.stdout.write('No documents to index.')
             return
+        stats = embedding_cache.stats()
+        self.stdout.write(f'Indexed {indexed} of {seen} documents ({seen - indexed} unchanged).')
+        self.stdout.write(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+        self.stdout.write(self.style.SUCCESS('Reindex complete.'))
 
-        self.stdout.write(self.style.WARNING(f'Indexing {len(docs)} documents...'))
+    def index_chunk(self, docs, changed_only):
+        if changed_only:
+            stored = get_stored_hashes([d['id'] for d in docs])
+            docs = [d for d in docs if stored.get(d['id']) != text_hash(d['text'])]
         add_documents(docs)
-        self.stdout.write(self.style.SUCCESS('Reindex complete.'))
\ No newline at end of file
+        return len(docs)
@@ -0,0 +1,118 @@
+import multiprocessing
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from ai.vector_store import NumpyVectorStore, np
+
+try:
+    import chromadb
+except Exception:
+    chromadb = None
+
+
+def rss_kb():
+    """(anonymous, file-backed) resident memory of this process in kB, Linux only."""
+    fields = {}
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                key, _, value = line.partition(':')
+                if key in ('RssAnon', 'RssFile'):
+                    fields[key] = int(value.split()[0])
+    except OSError:
+        return None, None
+    return fields.get('RssAnon'), fields.get('RssFile')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def open_numpy(path):
+    return NumpyVectorStore(path)
+
+
+def open_chroma(path):
+    return chromadb.PersistentClient(path=path).get_or_create_collection('bench', metadata={'hnsw:space': 'cosine'})
+
+
+def measure_queries(opener, path, queries, k, out):
+    # Runs in a fresh worker process: open the store, query, report latency and memory
+    anon_before, file_before = rss_kb()
+    coll = opener(path)
+    coll.query(query_embeddings=[queries[0].tolist()], n_results=k)
+    timings = []
+    for q in queries:
+        started = time.perf_counter()
+        coll.query(query_embeddings=[q.tolist()], n_results=k)
+        timings.append((time.perf_counter() - started) * 1000)
+    anon_after, file_after = rss_kb()
+    out.put({
+        'timings': timings,
+        'anon_kb': None if anon_before is None else anon_after - anon_before,
+        'file_kb': None if file_before is None else file_after - file_before,
+    })
+
+
+class Command(BaseCommand):
+    help = 'Compare the Chroma and NumPy vector backends: upsert throughput, query latency and memory per worker.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vectors', type=int, default=20000, help='Number of stored vectors (default 20000).')
+        parser.add_argument('--dim', type=int, default=768, help='Embedding dimension (default 768).')
+        parser.add_argument('--queries', type=int, default=200, help='Timed queries per backend (default 200).')
+        parser.add_argument('--k', type=int, default=20, help='Results per query (default 20).')
+        parser.add_argument('--batch-size', type=int, default=256, help='Vectors per upsert call (default 256).')
+        parser.add_argument('--backend', choices=['numpy', 'chroma'], action='append', help='Backend to run; repeatable (default: all available).')
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('NumPy is required for this benchmark.')
+        backends = options['backend'] or ['numpy', 'chroma']
+        if 'chroma' in backends and chromadb is None:
+            self.stdout.write(self.style.WARNING('chromadb not installed; skipping the Chroma backend.'))
+            backends = [b for b in backends if b != 'chroma']
+        if not backends:
+            raise CommandError('No backend available to benchmark.')
+
+        rng = np.random.default_rng(0)
+        n, dim = options['vectors'], options['dim']
+        vectors = rng.standard_normal((n, dim), dtype=np.float32)
+        queries = rng.standard_normal((options['queries'], dim), dtype=np.float32)
+        ids = [f'news:{i}#0' for i in range(n)]
+        metadatas = [{'type': 'news', 'parent_id': f'news:{i}', 'chunk': 0} for i in range(n)]
+        openers = {'numpy': open_numpy, 'chroma': open_chroma}
+        self.stdout.write(f"{n} vectors x {dim} dims, {options['queries']} queries, k={options['k']}")
+
+        for name in backends:
+            with tempfile.TemporaryDirectory() as path:
+                coll = openers[name](path)
+                started = time.perf_counter()
+                for i in range(0, n, options['batch_size']):
+                    j = i + options['batch_size']
+                    coll.upsert(ids=ids[i:j], embeddings=vectors[i:j].tolist(), documents=[''] * len(ids[i:j]), metadatas=metadatas[i:j])
+                upsert_seconds = time.perf_counter() - started
+                del coll
+
+                # Query from a separate process so memory reflects a fresh worker
+                ctx = multiprocessing.get_context('fork')
+                out = ctx.Queue()
+                worker = ctx.Process(target=measure_queries, args=(openers[name], path, queries, options['k'], out))
+                worker.start()
+                result = out.get()
+                worker.join()
+
+            timings = result['timings']
+            memory = 'n/a'
+            if result['anon_kb'] is not None:
+                memory = f"{result['anon_kb'] / 1024:.1f} MB private, {result['file_kb'] / 1024:.1f} MB shared file pages"
+            self.stdout.write(self.style.SUCCESS(f'[{name}]'))
+            self.stdout.write(f'  upsert: {n / upsert_seconds:,.0f} vectors/s ({upsert_seconds:.2f} s)')
+            self.stdout.write(
+                f'  query: p50 {percentile(timings, 50):.2f} ms, p95 {percentile(timings, 95):.2f} ms, '
+                f'mean {statistics.mean(timings):.2f} ms'
+            )
+            self.stdout.write(f'  worker memory: {memory}')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from ai.standin import StandinConfig, make_server
+
+
+class Command(BaseCommand):
+    help = 'Serve a stand-in for the Ollama API (deterministic embeddings, synthetic generation) for benchmarks and CI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=11435, help='Port to listen on (default 11435).')
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds before the first generated token (default 0.05).')
+        parser.add_argument('--token-rate', type=float, default=50.0, help='Generated tokens per second (default 50).')
+        parser.add_argument('--tokens', type=int, default=40, help='Tokens per generated answer (default 40).')
+        parser.add_argument('--dim', type=int, default=768, help='Embedding dimension (default 768).')
+        parser.add_argument('--embed-latency', type=float, default=0.005, help='Seconds per embedding request (default 0.005).')
+
+    def handle(self, *args, **options):
+        config = StandinConfig(
+            latency=options['latency'], token_rate=options['token_rate'], tokens=options['tokens'],
+            dim=options['dim'], embed_latency=options['embed_latency'],
+        )
+        server = make_server(options['host'], options['port'], config)
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f'Ollama stand-in listening on http://{host}:{port} (set OLLAMA_HOST to use it)'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
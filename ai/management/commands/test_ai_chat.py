@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
-from ai.ai_services import query_similar, ollama_generate
+from ai.ai_services import query_similar, ollama_generate, build_chat_prompt, lookup_answer, remember_answer
+from ai.metrics import source
+from ai.answer_cache import answer_cache
 
 
 class Command(BaseCommand):
@@ -8,24 +10,22 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('question', type=str, help='The question to ask the assistant.')
 
+    @source('command:test_ai_chat')
     def handle(self, *args, **options):
         q = options['question']
         if not q:
             raise CommandError('Question is required')
         self.stdout.write(self.style.WARNING(f'Question: {q}'))
-        retrieved = query_similar(q, n=6)
-        context_blocks = []
-        for r in retrieved:
-            meta = r.get('metadata') or {}
-            prefix = 'News' if meta.get('type') == 'news' else 'Project'
-            context_blocks.append(f"[{prefix}] {meta.get('title','')}\n{r.get('text','')}")
-        context_text = "\n\n".join(context_blocks) if context_blocks else "No context found."
-        prompt = (
-            "You are a helpful university assistant. Use the provided context to answer the user's question accurately.\n"
-            f"Context:\n{context_text}\n\n"
-            f"Question: {q}\n"
-            "Answer concisely and cite whether info came from News or Projects when relevant."
-        )
-        answer = ollama_generate(prompt)
-        self.stdout.write(self.style.SUCCESS('Answer:'))
-        self.stdout.write(answer)
\ No newline at end of file
+        hit = lookup_answer(q)
+        if hit is not None:
+            self.stdout.write(self.style.SUCCESS(f"Answer (cached, similarity {hit['similarity']:.3f}):"))
+            self.stdout.write(hit['answer'])
+        else:
+            retrieved = query_similar(q, n=6)
+            prompt = build_chat_prompt(q, retrieved)
+            answer = ollama_generate(prompt)
+            remember_answer(q, answer, retrieved)
+            self.stdout.write(self.style.SUCCESS('Answer:'))
+            self.stdout.write(answer)
+        stats = answer_cache.stats()
+        self.stdout.write(f"Answer cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
\ No newline at end of file
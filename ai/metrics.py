@@ -0,0 +1,410 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('ai.slow')
+
+# Calls slower than this many milliseconds are logged to the `ai.slow`
+# logger; 0 turns the slow-call log off
+AI_SLOW_CALL_MS = float(os.environ.get('AI_SLOW_CALL_MS', '0'))
+# Bearer token that lets a Prometheus scraper read /ai/metrics/ without a
+# staff session; empty means staff only
+AI_METRICS_TOKEN = os.environ.get('AI_METRICS_TOKEN', '')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRICS = {
+    'ai_call_seconds': ('histogram', 'Duration of Ollama and vector store calls.'),
+    'ai_call_errors_total': ('counter', 'Calls that raised an error.'),
+    'ai_first_token_seconds': ('histogram', 'Time to the first streamed token.'),
+    'ai_prompt_tokens_total': ('counter', 'Prompt tokens evaluated (prompt_eval_count).'),
+    'ai_completion_tokens_total': ('counter', 'Tokens generated (eval_count).'),
+    'ai_prompt_eval_seconds_total': ('counter', 'Time Ollama spent evaluating prompts (prompt_eval_duration).'),
+    'ai_eval_seconds_total': ('counter', 'Time Ollama spent generating tokens (eval_duration).'),
+    'ai_load_seconds_total': ('counter', 'Time Ollama spent loading models (load_duration).'),
+    'ai_generation_tokens_per_second': ('gauge', 'Completion tokens per second of generation time.'),
+    'ai_request_seconds': ('histogram', 'Time per AI request by phase: retrieval, generation and total.'),
+}
+# Ollama reports durations in nanoseconds
+DURATION_FIELDS = {
+    'prompt_eval_duration': 'ai_prompt_eval_seconds_total',
+    'eval_duration': 'ai_eval_seconds_total',
+    'load_duration': 'ai_load_seconds_total',
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    """Per-process counters and histograms, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, name: str, labels: Labels, value: float):
+        with self._lock:
+            hist = self.histograms.get((name, labels))
+            if hist is None:
+                hist = self.histograms[(name, labels)] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name: str, labels: Labels, value: float = 1.0):
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0.0) + value
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def gauges(self) -> Dict[Tuple[str, Labels], float]:
+        tokens = {labels: v for (name, labels), v in self.counters.items() if name == 'ai_completion_tokens_total'}
+        seconds = {labels: v for (name, labels), v in self.counters.items() if name == 'ai_eval_seconds_total'}
+        return {
+            ('ai_generation_tokens_per_second', labels): tokens[labels] / seconds[labels]
+            for labels in tokens if seconds.get(labels)
+        }
+
+    def render(self) -> str:
+        with self._lock:
+            series = {}
+            for (name, labels), hist in self.histograms.items():
+                series.setdefault(name, []).extend(_histogram_lines(name, labels, hist))
+            for (name, labels), value in list(self.counters.items()) + list(self.gauges().items()):
+                series.setdefault(name, []).append(f'{name}{_labels(labels)} {_number(value)}')
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            if name not in series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(sorted(series[name]) if kind != 'histogram' else series[name])
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-source call counts, latency and token rates for /ai/stats/."""
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for (name, labels), hist in self.histograms.items():
+                tags = dict(labels)
+                entry = out.setdefault(tags['source'], {})
+                if name == 'ai_call_seconds':
+                    entry[tags['op']] = {
+                        'calls': hist.count,
+                        'avg_ms': round(hist.sum / hist.count * 1000, 1),
+                        'p95_ms_le': _ms(hist.quantile(0.95)),
+                    }
+                elif name == 'ai_request_seconds':
+                    entry.setdefault('requests', {})[tags['phase'] + '_avg_ms'] = round(hist.sum / hist.count * 1000, 1)
+            for (name, labels), value in list(self.counters.items()) + list(self.gauges().items()):
+                tags = dict(labels)
+                entry = out.setdefault(tags['source'], {})
+                key = name[len('ai_'):]
+                entry[key] = round(entry.get(key, 0.0) + value, 3)
+        return out
+
+
+def _labels(labels: Labels, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    if seconds is None or seconds == float('inf'):
+        return None
+    return round(seconds * 1000, 1)
+
+
+def _histogram_lines(name: str, labels: Labels, hist: Histogram):
+    cumulative = 0
+    for bound, n in zip(hist.buckets, hist.counts):
+        cumulative += n
+        yield f'{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}'
+    yield f'{name}_bucket{_labels(labels, le="+Inf")} {hist.count}'
+    yield f'{name}_sum{_labels(labels)} {_number(hist.sum)}'
+    yield f'{name}_count{_labels(labels)} {hist.count}'
+
+
+registry = MetricsRegistry()
+
+
+class Scope:
+    """What a call is made on behalf of: a view, command or background task.
+
+    Views also accumulate per-request phase times here, recorded once the
+    response (or the end of its stream) is complete.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {'retrieval': 0.0, 'generation': 0.0}
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] += seconds
+
+    def finish(self):
+        total = time.perf_counter() - self.started
+        for phase, seconds in dict(self.phases, total=total).items():
+            registry.observe('ai_request_seconds', (('source', self.source), ('phase', phase)), seconds)
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.started
+        return ', '.join(f'{p};dur={s * 1000:.1f}' for p, s in dict(self.phases, total=total).items())
+
+    def attach(self, response):
+        # Streamed answers generate after the view returns: record at stream end
+        if not response.streaming:
+            response['Server-Timing'] = self.server_timing()
+            self.finish()
+            return response
+        original = response.streaming_content
+        if response.is_async:
+            async def content():
+                try:
+                    async for chunk in original:
+                        yield chunk
+                finally:
+                    self.finish()
+        else:
+            def content():
+                try:
+                    yield from original
+                finally:
+                    self.finish()
+        response.streaming_content = content()
+        return response
+
+
+_scope: contextvars.ContextVar = contextvars.ContextVar('ai_metrics_scope', default=None)
+_phase: contextvars.ContextVar = contextvars.ContextVar('ai_metrics_phase', default=None)
+
+
+def current_source() -> str:
+    scope = _scope.get()
+    return scope.source if scope is not None else 'other'
+
+
+@contextmanager
+def source(name: str):
+    """Attribute the calls made inside the block to `name`."""
+    token = _scope.set(Scope(name))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+@contextmanager
+def phase(name: str):
+    # Wall-clock time of the outermost phase only, so retrieval helpers that
+    # call each other (or run searches concurrently) are not counted twice
+    scope = _scope.get()
+    if scope is None or _phase.get() is not None:
+        yield
+        return
+    token = _phase.set(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phase.reset(token)
+        scope.add(name, time.perf_counter() - started)
+
+
+def in_phase(name: str):
+    """Decorator form of phase() for sync and async functions."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with phase(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_call(op: str, seconds: float, stats: Optional[Dict[str, Any]] = None, error: bool = False):
+    """Record one call; `stats` holds the counters Ollama returned with it."""
+    scope = _scope.get()
+    src = scope.source if scope is not None else 'other'
+    labels = (('op', op), ('source', src))
+    stats = stats or {}
+    registry.observe('ai_call_seconds', labels, seconds)
+    if error:
+        registry.inc('ai_call_errors_total', labels)
+    if stats.get('prompt_eval_count'):
+        registry.inc('ai_prompt_tokens_total', labels, stats['prompt_eval_count'])
+    if op == 'generate':
+        by_source = (('source', src),)
+        if stats.get('eval_count'):
+            registry.inc('ai_completion_tokens_total', by_source, stats['eval_count'])
+        for field, name in DURATION_FIELDS.items():
+            if stats.get(field):
+                registry.inc(name, by_source, stats[field] / 1e9)
+        if stats.get('first_token') is not None:
+            registry.observe('ai_first_token_seconds', by_source, stats['first_token'])
+        if scope is not None:
+            scope.add('generation', seconds)
+    if AI_SLOW_CALL_MS and seconds * 1000 >= AI_SLOW_CALL_MS:
+        slow_logger.warning(
+            "Slow %s call from %s: %.0f ms (prompt %s tokens, completion %s tokens, model load %.0f ms)%s",
+            op, src, seconds * 1000, stats.get('prompt_eval_count', '-'), stats.get('eval_count', '-'),
+            stats.get('load_duration', 0) / 1e6, ' [error]' if error else '',
+        )
+
+
+@contextmanager
+def timed(op: str):
+    """Time the block as one `op` call; the yielded dict collects its stats."""
+    stats: Dict[str, Any] = {}
+    started = time.perf_counter()
+    error = False
+    try:
+        yield stats
+    except Exception:
+        error = True
+        raise
+    finally:
+        observe_call(op, time.perf_counter() - started, stats, error)
+
+
+def bind(iterator):
+    """Keep the current scope for an iterator consumed after the view returns."""
+    ctx = contextvars.copy_context()
+
+    def steps():
+        it = iter(iterator)
+        try:
+            while True:
+                try:
+                    item = ctx.run(next, it)
+                except StopIteration:
+                    return
+                yield item
+        finally:
+            close = getattr(it, 'close', None)
+            if close is not None:
+                ctx.run(close)
+    return steps()
+
+
+def abind(aiterator):
+    """Async bind(): set the captured scope around each step of the iterator."""
+    scope = _scope.get()
+
+    async def steps():
+        it = aiterator.__aiter__()
+        try:
+            while True:
+                token = _scope.set(scope)
+                try:
+                    item = await it.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    _scope.reset(token)
+                yield item
+        finally:
+            aclose = getattr(it, 'aclose', None)
+            if aclose is not None:
+                token = _scope.set(scope)
+                try:
+                    await aclose()
+                finally:
+                    _scope.reset(token)
+    return steps()
+
+
+def propagate(fn):
+    """Wrap `fn` to run in a copy of the caller's context, e.g. in a thread pool."""
+    ctx = contextvars.copy_context()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def instrument_view(view):
+    """Attribute a view's AI calls to its URL name and time its phases.
+
+    Non-streamed responses carry a Server-Timing header with the retrieval,
+    generation and total time of the request.
+    """
+    def view_source(request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match is not None and match.view_name else view.__name__
+
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            scope = Scope(view_source(request))
+            token = _scope.set(scope)
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                _scope.reset(token)
+            return scope.attach(response)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        scope = Scope(view_source(request))
+        token = _scope.set(scope)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _scope.reset(token)
+        return scope.attach(response)
+    return wrapper
@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class DailySummary(models.Model):
+	"""Materialized LLM summary of one day's news, refreshed by the job worker."""
+	date = models.DateField(unique=True)
+	summary = models.TextField()
+	# sha256 over the (id, title, content) of the posts the summary covered
+	fingerprint = models.CharField(max_length=64)
+	post_count = models.PositiveIntegerField(default=0)
+	generated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		ordering = ['-date']
+
+	def __str__(self):
+		return f"Summary for {self.date}"
@@ -0,0 +1,476 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+# Counters and timings Ollama returns alongside a generation or embedding
+STAT_FIELDS = ('load_duration', 'prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration', 'total_duration')
+
+
+def call_stats(data) -> dict:
+    if not isinstance(data, dict):
+        return {}
+    return {k: data[k] for k in STAT_FIELDS if isinstance(data.get(k), (int, float))}
+
+
+class OllamaUnavailable(RuntimeError):
+    """Ollama could not be reached, or the circuit breaker is open."""
+
+
+def parse_generate_body(body: str) -> str:
+    """Extract the generated text from a /api/generate response body."""
+    # Prefer non-stream single JSON
+    try:
+        data = json.loads(body)
+        if isinstance(data, dict) and data.get('response'):
+            return data['response']
+    except Exception:
+        pass
+    # If server still streamed, concatenate lines' response fields
+    parts = []
+    for line in body.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+            if isinstance(obj, dict) and 'response' in obj:
+                parts.append(obj['response'])
+        except Exception:
+            continue
+    if parts:
+        return ''.join(parts)
+    return body
+
+
+def parse_stream_line(line) -> dict:
+    """Decode one NDJSON line of a streaming /api/generate response ({} if unparsable)."""
+    if not line:
+        return {}
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return {}
+    if obj.get('error'):
+        raise RuntimeError('Ollama error: %s' % obj['error'])
+    return obj
+
+
+class CircuitBreaker:
+    """Fail fast after `failure_threshold` consecutive transport failures.
+
+    Once open, calls are rejected for `reset_timeout` seconds; then a single
+    trial call is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Let another trial through after one ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class OllamaClient:
+    """Keep-alive HTTP client for the Ollama API.
+
+    One instance per process: the connection pool is rebuilt after a fork so
+    gunicorn workers never share sockets. Embedding calls are idempotent and
+    retried with jittered backoff; generation is not retried.
+
+    `on_call(op, seconds, stats, error)` is invoked after every generate and
+    embed call with the token counts and durations Ollama reported.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        chat_model: str,
+        embed_model: str,
+        pool_size: int = 10,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 120.0,
+        embed_read_timeout: float = 60.0,
+        embed_retries: int = 2,
+        retry_backoff: float = 0.5,
+        breaker: Optional[CircuitBreaker] = None,
+        on_call: Optional[Callable[..., None]] = None,
+    ):
+        self.host = host.rstrip('/')
+        self.chat_model = chat_model
+        self.embed_model = embed_model
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.embed_read_timeout = embed_read_timeout
+        self.embed_retries = embed_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.on_call = on_call
+        self._session: Optional[requests.Session] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    s = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    s.mount('http://', adapter)
+                    s.mount('https://', adapter)
+                    self._session = s
+                    self._pid = os.getpid()
+        return self._session
+
+    def post(self, path: str, payload: dict, read_timeout: Optional[float] = None, retries: int = 0, stream: bool = False) -> requests.Response:
+        if not self.breaker.allow():
+            raise OllamaUnavailable(
+                "Ollama at %s is unavailable; not retrying for %.0fs." % (self.host, self.breaker.retry_after())
+            )
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        attempt = 0
+        recorded = False
+        try:
+            while True:
+                try:
+                    r = self.session.post(f"{self.host}{path}", json=payload, timeout=timeout, stream=stream)
+                    if r.status_code >= 500 and attempt < retries:
+                        raise requests.exceptions.RetryError(f"Ollama returned {r.status_code}")
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.RetryError) as e:
+                    if attempt < retries:
+                        attempt += 1
+                        time.sleep(self.retry_backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+                        continue
+                    if isinstance(e, requests.exceptions.ConnectionError):
+                        raise OllamaUnavailable("Cannot connect to Ollama at %s. Is it running? Try `ollama serve`." % self.host) from e
+                    raise OllamaUnavailable("Ollama at %s did not respond in time: %s" % (self.host, e)) from e
+                recorded = True
+                if r.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                return r
+        except Exception:
+            # Any other error (e.g. ChunkedEncodingError) counts as a failure too
+            recorded = True
+            self.breaker.record_failure()
+            raise
+        finally:
+            if not recorded:
+                # Interrupted before an outcome; a half-open breaker must not stay stuck
+                self.breaker.release_trial()
+
+    @contextmanager
+    def observe(self, op: str):
+        """Time the block as one `op` call and report it to `on_call`."""
+        stats = {}
+        started = time.perf_counter()
+        error = False
+        try:
+            yield stats
+        except Exception:
+            error = True
+            raise
+        finally:
+            if self.on_call is not None:
+                self.on_call(op, time.perf_counter() - started, stats, error)
+
+    def generate(self, prompt: str, model: Optional[str] = None, temperature: float = 0.2) -> str:
+        payload = {
+            "model": model or self.chat_model,
+            "prompt": prompt,
+            "options": {"temperature": temperature},
+            "stream": False,
+        }
+        with self.observe('generate') as stats:
+            r = self.post('/api/generate', payload)
+            r.raise_for_status()
+            try:
+                data = r.json()
+                if isinstance(data, dict) and data.get('response'):
+                    stats.update(call_stats(data))
+                    return data['response']
+            except Exception:
+                pass
+            return parse_generate_body(r.text)
+
+    def generate_stream(self, prompt: str, model: Optional[str] = None, temperature: float = 0.2) -> Iterator[str]:
+        """Yield response tokens as Ollama produces them."""
+        payload = {
+            "model": model or self.chat_model,
+            "prompt": prompt,
+            "options": {"temperature": temperature},
+            "stream": True,
+        }
+        with self.observe('generate') as stats:
+            started = time.perf_counter()
+            r = self.post('/api/generate', payload, stream=True)
+            try:
+                r.raise_for_status()
+                for line in r.iter_lines():
+                    obj = parse_stream_line(line)
+                    if obj.get('response'):
+                        stats.setdefault('first_token', time.perf_counter() - started)
+                        yield obj['response']
+                    if obj.get('done'):
+                        stats.update(call_stats(obj))
+                        break
+            finally:
+                r.close()
+
+    def embed(self, text: str, model: Optional[str] = None) -> List[float]:
+        model = model or self.embed_model
+        with self.observe('embed'):
+            r = self.post('/api/embeddings', {"model": model, "prompt": text}, read_timeout=self.embed_read_timeout, retries=self.embed_retries)
+            if r.status_code == 404:
+                raise RuntimeError("Ollama embeddings endpoint returned 404. Ensure Ollama is running and the embedding model is available: `ollama pull %s`." % model)
+            r.raise_for_status()
+            data = r.json()
+        vec = data.get('embedding') or data.get('embeddings') or []
+        if not vec:
+            raise RuntimeError('Ollama did not return an embedding vector.')
+        return vec
+
+    def embed_batch(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Embed many texts in one request via the batch `/api/embed` endpoint.
+
+        Falls back to one `/api/embeddings` call per text on Ollama versions
+        that predate the batch endpoint.
+        """
+        if not texts:
+            return []
+        payload = {"model": model or self.embed_model, "input": list(texts)}
+        with self.observe('embed') as stats:
+            r = self.post('/api/embed', payload, read_timeout=self.embed_read_timeout * 2, retries=self.embed_retries)
+            if r.status_code != 404:
+                r.raise_for_status()
+                data = r.json()
+                stats.update(call_stats(data))
+        if r.status_code == 404:
+            return [self.embed(t, model=model) for t in texts]
+        vecs = data.get('embeddings') or []
+        if len(vecs) != len(texts):
+            raise RuntimeError('Ollama returned %d embeddings for %d texts.' % (len(vecs), len(texts)))
+        return vecs
+
+
+class AsyncOllamaClient:
+    """Async counterpart of OllamaClient, used by the async views under ASGI.
+
+    Requests are coroutines on one httpx.AsyncClient connection pool per
+    event loop, so waiting on Ollama costs no OS thread. Timeouts, retries and
+    the circuit breaker are shared with the sync client it wraps. Without
+    httpx installed, calls run the sync client in a worker thread instead.
+    """
+
+    def __init__(self, sync_client: OllamaClient, pool_size: int = 100, transport=None):
+        self.sync = sync_client
+        self.pool_size = pool_size
+        self.transport = transport
+        self._clients = weakref.WeakKeyDictionary()
+        self._pid: Optional[int] = None
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self.sync.breaker
+
+    def client(self):
+        # httpx connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._pid != os.getpid():
+            self._clients = weakref.WeakKeyDictionary()
+            self._pid = os.getpid()
+        client = self._clients.get(loop)
+        if client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            client = httpx.AsyncClient(base_url=self.sync.host, limits=limits, transport=self.transport)
+            self._clients[loop] = client
+        return client
+
+    def _timeout(self, read_timeout: Optional[float]):
+        read = read_timeout or self.sync.read_timeout
+        # Waiting for a free pooled connection counts against the read budget
+        return httpx.Timeout(read, connect=self.sync.connect_timeout, pool=read)
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise OllamaUnavailable(
+                "Ollama at %s is unavailable; not retrying for %.0fs." % (self.sync.host, self.breaker.retry_after())
+            )
+
+    def _unavailable(self, e: Exception) -> OllamaUnavailable:
+        if isinstance(e, httpx.ConnectError):
+            return OllamaUnavailable("Cannot connect to Ollama at %s. Is it running? Try `ollama serve`." % self.sync.host)
+        return OllamaUnavailable("Ollama at %s did not respond in time: %s" % (self.sync.host, e))
+
+    async def post(self, path: str, payload: dict, read_timeout: Optional[float] = None, retries: int = 0):
+        self._check_breaker()
+        attempt = 0
+        recorded = False
+        try:
+            while True:
+                try:
+                    r = await self.client().post(path, json=payload, timeout=self._timeout(read_timeout))
+                    if r.status_code >= 500 and attempt < retries:
+                        raise httpx.HTTPStatusError(f"Ollama returned {r.status_code}", request=r.request, response=r)
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    if attempt < retries:
+                        attempt += 1
+                        await asyncio.sleep(self.sync.retry_backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+                        continue
+                    raise self._unavailable(e) from e
+                recorded = True
+                if r.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                return r
+        except Exception:
+            recorded = True
+            self.breaker.record_failure()
+            raise
+        finally:
+            if not recorded:
+                # Cancelled before an outcome; a half-open breaker must not stay stuck
+                self.breaker.release_trial()
+
+    async def generate(self, prompt: str, model: Optional[str] = None, temperature: float = 0.2) -> str:
+        if httpx is None:
+            return await sync_to_async(self.sync.generate, thread_sensitive=False)(prompt, model=model, temperature=temperature)
+        payload = {
+            "model": model or self.sync.chat_model,
+            "prompt": prompt,
+            "options": {"temperature": temperature},
+            "stream": False,
+        }
+        with self.sync.observe('generate') as stats:
+            r = await self.post('/api/generate', payload)
+            r.raise_for_status()
+            try:
+                stats.update(call_stats(r.json()))
+            except ValueError:
+                pass
+            return parse_generate_body(r.text)
+
+    async def generate_stream(self, prompt: str, model: Optional[str] = None, temperature: float = 0.2) -> AsyncIterator[str]:
+        """Yield response tokens as Ollama produces them."""
+        if httpx is None:
+            tokens = self.sync.generate_stream(prompt, model=model, temperature=temperature)
+            next_token = sync_to_async(next, thread_sensitive=False)
+            while True:
+                token = await next_token(tokens, None)
+                if token is None:
+                    return
+                yield token
+        payload = {
+            "model": model or self.sync.chat_model,
+            "prompt": prompt,
+            "options": {"temperature": temperature},
+            "stream": True,
+        }
+        self._check_breaker()
+        recorded = False
+        with self.sync.observe('generate') as stats:
+            started = time.perf_counter()
+            try:
+                async with self.client().stream('POST', '/api/generate', json=payload, timeout=self._timeout(None)) as r:
+                    recorded = True
+                    if r.status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        obj = parse_stream_line(line)
+                        if obj.get('response'):
+                            stats.setdefault('first_token', time.perf_counter() - started)
+                            yield obj['response']
+                        if obj.get('done'):
+                            stats.update(call_stats(obj))
+                            break
+            except httpx.TransportError as e:
+                recorded = True
+                self.breaker.record_failure()
+                raise self._unavailable(e) from e
+            except Exception:
+                if not recorded:
+                    recorded = True
+                    self.breaker.record_failure()
+                raise
+            finally:
+                if not recorded:
+                    self.breaker.release_trial()
+
+    async def embed(self, text: str, model: Optional[str] = None) -> List[float]:
+        if httpx is None:
+            return await sync_to_async(self.sync.embed, thread_sensitive=False)(text, model=model)
+        model = model or self.sync.embed_model
+        with self.sync.observe('embed'):
+            r = await self.post('/api/embeddings', {"model": model, "prompt": text}, read_timeout=self.sync.embed_read_timeout, retries=self.sync.embed_retries)
+            if r.status_code == 404:
+                raise RuntimeError("Ollama embeddings endpoint returned 404. Ensure Ollama is running and the embedding model is available: `ollama pull %s`." % model)
+            r.raise_for_status()
+            data = r.json()
+        vec = data.get('embedding') or data.get('embeddings') or []
+        if not vec:
+            raise RuntimeError('Ollama did not return an embedding vector.')
+        return vec
@@ -1,39 +1,68 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
+from django.db import transaction
 from django.dispatch import receiver
 from news.models import NewsPost
 from projects.models import Project
-from .ai_services import add_documents
+from django.utils import timezone
+from jobs.queue import enqueue
+from .documents import news_document, project_document
+from .lexical import lexical_index
+from .summaries import schedule_summary_refresh
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# Embedding happens in the job worker (`manage.py run_worker`) so saves never
+# wait on Ollama. Repeated saves collapse into one queued job per document.
+
 @receiver(post_save, sender=NewsPost)
 def index_news(sender, instance: NewsPost, created, **kwargs):
-    text = f"News: {instance.title}\nCategory: {instance.get_category_display()}\n{instance.content}"
+    # The in-process lexical index needs no network call, so update it as
+    # soon as the row is committed
+    doc = news_document(instance)
+    transaction.on_commit(lambda: lexical_index.upsert(doc))
     try:
-        add_documents([
-            {
-                'id': f"news:{instance.id}",
-                'text': text,
-                'metadata': {'type': 'news', 'title': instance.title, 'category': instance.category}
-            }
-        ])
+        enqueue('ai.index_news', {'id': instance.id}, unique_key=f"ai.index:news:{instance.id}")
     except Exception as e:
-        logger.warning("Failed to index news %s: %s", instance.id, e)
+        logger.warning("Failed to queue indexing for news %s: %s", instance.id, e)
+    day = timezone.localdate(instance.created_at)
+    if day == timezone.localdate():
+        try:
+            schedule_summary_refresh(day)
+        except Exception as e:
+            logger.warning("Failed to queue summary refresh for %s: %s", day, e)
 
 
 @receiver(post_save, sender=Project)
 def index_project(sender, instance: Project, created, **kwargs):
-    skills = ', '.join(instance.skills_list())
-    text = f"Project: {instance.title}\nSkills: {skills}\n{instance.description}"
+    doc = project_document(instance)
+    transaction.on_commit(lambda: lexical_index.upsert(doc))
+    try:
+        enqueue('ai.index_project', {'id': instance.id}, unique_key=f"ai.index:project:{instance.id}")
+    except Exception as e:
+        logger.warning("Failed to queue indexing for project %s: %s", instance.id, e)
+
+
+def _remove_from_index(doc_id: str):
+    transaction.on_commit(lambda: lexical_index.remove(doc_id))
     try:
-        add_documents([
-            {
-                'id': f"project:{instance.id}",
-                'text': text,
-                'metadata': {'type': 'project', 'title': instance.title, 'skills': skills}
-            }
-        ])
+        enqueue('ai.remove_documents', {'ids': [doc_id]}, unique_key=f"ai.remove:{doc_id}")
     except Exception as e:
-        logger.warning("Failed to index project %s: %s", instance.id, e)
\ No newline at end of file
+        logger.warning("Failed to queue index removal for %s: %s", doc_id, e)
+
+
+@receiver(post_delete, sender=NewsPost)
+def unindex_news(sender, instance: NewsPost, **kwargs):
+    _remove_from_index(f"news:{instance.id}")
+    day = timezone.localdate(instance.created_at)
+    if day == timezone.localdate():
+        try:
+            schedule_summary_refresh(day)
+        except Exception as e:
+            logger.warning("Failed to queue summary refresh for %s: %s", day, e)
+
+
+@receiver(post_delete, sender=Project)
+def unindex_project(sender, instance: Project, **kwargs):
+    _remove_from_index(f"project:{instance.id}")
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Directory for cross-process coalescing (file locks plus short-lived result
+# files); empty keeps coalescing within each process
+AI_SINGLEFLIGHT_DIR = os.environ.get('AI_SINGLEFLIGHT_DIR', '')
+# Seconds a finished result stays readable by processes that waited on it
+AI_SINGLEFLIGHT_RESULT_TTL = float(os.environ.get('AI_SINGLEFLIGHT_RESULT_TTL', '10'))
+
+
+def flight_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait and receive the same result (or exception). With `lock_dir` set,
+    processes coordinate through one lock file per key: a process that finds
+    the lock held waits for it, then reads the result the holder left behind.
+    Async callers are coalesced per event loop with `ado`.
+    """
+
+    def __init__(self, lock_dir: str = AI_SINGLEFLIGHT_DIR, result_ttl: float = AI_SINGLEFLIGHT_RESULT_TTL):
+        self.lock_dir = lock_dir if fcntl is not None else ''
+        self.result_ttl = result_ttl
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Any, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.coalesced_remote = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = self._run(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        with self._lock:
+            self.calls += 1
+            task = self._async_calls.get(slot)
+            if task is None:
+                # Detached from the caller that started it, so cancelling any
+                # one caller (a dropped client) never cancels the shared call
+                task = self._async_calls[slot] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda t: self._finish_async(slot, t))
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish_async(self, slot, task: asyncio.Future):
+        with self._lock:
+            self._async_calls.pop(slot, None)
+        # Mark retrieved so a call every caller gave up on does not log a warning
+        if not task.cancelled():
+            task.exception()
+
+    def _run(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not self.lock_dir:
+            with self._lock:
+                self.executed += 1
+            return fn()
+        os.makedirs(self.lock_dir, exist_ok=True)
+        result_path = os.path.join(self.lock_dir, key + '.json')
+        started = time.time()
+        with open(os.path.join(self.lock_dir, key + '.lock'), 'a+') as fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process is running this call: wait for it to finish
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                shared = self._read_result(result_path, since=started)
+                if shared is not None:
+                    with self._lock:
+                        self.coalesced_remote += 1
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+                    return shared[0]
+            try:
+                with self._lock:
+                    self.executed += 1
+                result = fn()
+                self._write_result(result_path, result)
+                return result
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _read_result(self, path: str, since: float):
+        try:
+            if os.path.getmtime(path) < since:
+                return None
+            with open(path) as f:
+                return (json.load(f)['result'],)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_result(self, path: str, result: Any):
+        try:
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'result': result}, f)
+            os.replace(tmp, path)
+            self._sweep()
+        except (OSError, TypeError) as e:
+            logger.warning("Could not share single-flight result: %s", e)
+
+    def _sweep(self):
+        # Drop results too old for any waiter to still need them. Lock files
+        # are empty and stay: another process may have one open and be about
+        # to flock it, and unlinking it would let a third process lock a new
+        # file under the same name and lead the same call a second time
+        cutoff = time.time() - self.result_ttl
+        for name in os.listdir(self.lock_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        coalesced = self.coalesced + self.coalesced_remote
+        return {
+            'calls': self.calls,
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'coalesced_remote': self.coalesced_remote,
+            'coalesced_rate': round(coalesced / self.calls, 4) if self.calls else 0.0,
+        }
+
+    def reset_stats(self):
+        self.calls = self.executed = self.coalesced = self.coalesced_remote = 0
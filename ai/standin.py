@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+def deterministic_vector(text: str, dim: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256((text or '').encode('utf-8')).digest()[:8], 'big')
+    rng = random.Random(seed)
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class StandinConfig:
+    def __init__(self, latency: float = 0.05, token_rate: float = 50.0, tokens: int = 40, dim: int = 768, embed_latency: float = 0.005):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.dim = dim
+        self.embed_latency = embed_latency
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Stand-in for the Ollama HTTP API, for benchmarks and CI without real models.
+
+    Implements /api/generate (streaming and non-streaming), /api/embeddings
+    and /api/embed. Embeddings are deterministic unit vectors derived from the
+    text; generation emits `tokens` tokens at `token_rate` per second after
+    `latency` seconds, with the timing fields Ollama reports.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    config = StandinConfig()
+
+    def log_message(self, format, *args):
+        logger.debug("standin: " + format, *args)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return {}
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json(200, {'models': [{'name': 'standin'}]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path == '/api/generate':
+            self.generate(payload)
+        elif self.path == '/api/embeddings':
+            time.sleep(self.config.embed_latency)
+            self._send_json(200, {'embedding': deterministic_vector(payload.get('prompt', ''), self.config.dim)})
+        elif self.path == '/api/embed':
+            texts = payload.get('input') or []
+            texts = [texts] if isinstance(texts, str) else texts
+            time.sleep(self.config.embed_latency)
+            self._send_json(200, {'embeddings': [deterministic_vector(t, self.config.dim) for t in texts]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def generate(self, payload):
+        cfg = self.config
+        prompt = payload.get('prompt', '')
+        words = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        tokens = [f' w{words[i % len(words)]}{i}' for i in range(cfg.tokens)]
+        delay = 1.0 / cfg.token_rate if cfg.token_rate > 0 else 0.0
+        started = time.perf_counter()
+        time.sleep(cfg.latency)
+        stats = {
+            'model': payload.get('model', 'standin'),
+            'load_duration': int(cfg.latency * 1e9),
+            'prompt_eval_count': max(1, len(prompt) // 4),
+            'prompt_eval_duration': 0,
+            'eval_count': len(tokens),
+        }
+        if payload.get('stream', True) is False:
+            time.sleep(delay * len(tokens))
+            stats.update(eval_duration=int(delay * len(tokens) * 1e9), total_duration=int((time.perf_counter() - started) * 1e9))
+            self._send_json(200, dict(stats, response=''.join(tokens).strip(), done=True))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for token in tokens:
+            time.sleep(delay)
+            self._write_chunk({'model': stats['model'], 'response': token, 'done': False})
+        stats.update(eval_duration=int(delay * len(tokens) * 1e9), total_duration=int((time.perf_counter() - started) * 1e9))
+        self._write_chunk(dict(stats, response='', done=True))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, obj):
+        data = (json.dumps(obj) + '\n').encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+def make_server(host: str = '127.0.0.1', port: int = 0, config: StandinConfig = None) -> ThreadingHTTPServer:
+    """Create a stand-in server; port 0 picks a free port (see server.server_address)."""
+    handler = type('ConfiguredStandinHandler', (StandinHandler,), {'config': config or StandinConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(config: StandinConfig = None, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    server = make_server(host, port, config)
+    threading.Thread(target=server.serve_forever, name='ollama-standin', daemon=True).start()
+    return server
@@ -0,0 +1,173 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from itertools import groupby
+from typing import Iterable, List, Optional, Tuple
+
+from news.models import NewsPost
+from jobs.models import Job
+from jobs.queue import enqueue
+from . import metrics
+from .ai_services import ollama_generate
+from .chunking import CHARS_PER_TOKEN, estimate_tokens
+from .models import DailySummary
+
+# Seconds to wait after a post is saved before regenerating, so a burst of
+# posts results in a single regeneration
+AI_SUMMARY_DEBOUNCE = float(os.environ.get('AI_SUMMARY_DEBOUNCE', '30'))
+# Days whose posts exceed this many (approximate) tokens are summarized
+# map-reduce style: groups of at most AI_SUMMARY_GROUP_TOKENS are summarized
+# AI_SUMMARY_CONCURRENCY at a time, then the partial summaries are merged
+AI_SUMMARY_MAP_REDUCE_TOKENS = int(os.environ.get('AI_SUMMARY_MAP_REDUCE_TOKENS', '3000'))
+AI_SUMMARY_GROUP_TOKENS = int(os.environ.get('AI_SUMMARY_GROUP_TOKENS', '2000'))
+AI_SUMMARY_CONCURRENCY = int(os.environ.get('AI_SUMMARY_CONCURRENCY', '4'))
+
+# Columns the summary needs; the rest of each row is never loaded
+SUMMARY_FIELDS = ('id', 'title', 'category', 'content', 'created_at')
+
+
+def summary_job_key(day: date) -> str:
+    return f"ai.daily_summary:{day.isoformat()}"
+
+
+def posts_for_day(day: date):
+    return NewsPost.objects.filter(created_at__date=day).order_by('-created_at')
+
+
+def posts_fingerprint(posts: Iterable[NewsPost]) -> str:
+    h = hashlib.sha256()
+    for p in sorted(posts, key=lambda p: p.id):
+        h.update(f"{p.id}\0{p.title}\0{p.content}\0".encode('utf-8'))
+    return h.hexdigest()
+
+
+def build_summary_prompt(posts: Iterable[NewsPost]) -> str:
+    joined = "\n\n".join([f"- {p.title}: {p.content}" for p in posts])
+    return (
+        "Summarize today's university news into 4-6 bullet points that capture key updates.\n"
+        f"Today's items:\n{joined}\n"
+        "Provide a student-friendly, factual summary."
+    )
+
+
+def post_line(p: NewsPost, max_tokens: Optional[int] = None) -> str:
+    line = f"- {p.title}: {p.content}"
+    if max_tokens is not None and estimate_tokens(line) > max_tokens:
+        line = line[:max_tokens * CHARS_PER_TOKEN].rsplit(' ', 1)[0] + ' ...'
+    return line
+
+
+def group_posts(posts: Iterable[NewsPost], budget: Optional[int] = None) -> List[Tuple[str, List[str]]]:
+    """Partition posts by category into groups of at most `budget` tokens.
+
+    Returns [(category label, [post lines])]; a category too large for one
+    group is split across several, and a single oversized post is truncated.
+    """
+    budget = budget or AI_SUMMARY_GROUP_TOKENS
+    groups = []
+    ordered = sorted(posts, key=lambda p: (p.category, p.id))
+    for _, items in groupby(ordered, key=lambda p: p.category):
+        items = list(items)
+        label = items[0].get_category_display()
+        lines, used = [], 0
+        for p in items:
+            line = post_line(p, max_tokens=budget)
+            tokens = estimate_tokens(line)
+            if lines and used + tokens > budget:
+                groups.append((label, lines))
+                lines, used = [], 0
+            lines.append(line)
+            used += tokens
+        groups.append((label, lines))
+    return groups
+
+
+def build_group_prompt(label: str, lines: List[str]) -> str:
+    joined = "\n\n".join(lines)
+    return (
+        f"Summarize these university news items from the {label} category into 2-4 short bullet points.\n"
+        f"Items:\n{joined}\n"
+        "Keep names, dates and numbers exact."
+    )
+
+
+def build_merge_prompt(partials: List[str]) -> str:
+    joined = "\n\n".join(partials)
+    return (
+        "Below are partial summaries of today's university news, grouped by category.\n"
+        "Merge them into 4-6 bullet points that capture the key updates, without repeating items.\n"
+        f"Partial summaries:\n{joined}\n"
+        "Provide a student-friendly, factual summary."
+    )
+
+
+def _generate_all(prompts: List[str]) -> List[str]:
+    if len(prompts) == 1:
+        return [ollama_generate(prompts[0])]
+    with ThreadPoolExecutor(max_workers=max(1, min(AI_SUMMARY_CONCURRENCY, len(prompts)))) as pool:
+        return list(pool.map(metrics.propagate(ollama_generate), prompts))
+
+
+def summarize_posts(posts: List[NewsPost]) -> str:
+    """Summarize a day's posts in one prompt, or map-reduce when they are too long.
+
+    The map step summarizes token-budgeted category groups concurrently. The
+    reduce step merges partial summaries, in further concurrent rounds if
+    they do not fit one prompt, so latency grows with the number of rounds
+    rather than the number of posts.
+    """
+    if sum(estimate_tokens(post_line(p)) for p in posts) <= AI_SUMMARY_MAP_REDUCE_TOKENS:
+        return ollama_generate(build_summary_prompt(posts))
+    groups = group_posts(posts)
+    partials = _generate_all([build_group_prompt(label, lines) for label, lines in groups])
+    while len(partials) > 1 and sum(estimate_tokens(t) for t in partials) > AI_SUMMARY_GROUP_TOKENS:
+        batches, batch, used = [], [], 0
+        for text in partials:
+            tokens = estimate_tokens(text)
+            if batch and used + tokens > AI_SUMMARY_GROUP_TOKENS:
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append(text)
+            used += tokens
+        batches.append(batch)
+        if len(batches) == len(partials):
+            # Each partial fills a prompt on its own; merging pairwise still shrinks the list
+            batches = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        partials = _generate_all([build_merge_prompt(b) for b in batches])
+    return ollama_generate(build_merge_prompt(partials))
+
+
+def schedule_summary_refresh(day: date, delay: float = AI_SUMMARY_DEBOUNCE) -> Job:
+    # Collapses into the already-queued refresh for this day, if there is one
+    return enqueue('ai.refresh_daily_summary', {'date': day.isoformat()}, unique_key=summary_job_key(day), delay=delay)
+
+
+def _refresh_jobs(day: date):
+    return Job.objects.filter(unique_key=summary_job_key(day), status__in=['queued', 'running'])
+
+
+def refresh_pending(day: date) -> bool:
+    return _refresh_jobs(day).exists()
+
+
+async def arefresh_pending(day: date) -> bool:
+    return await _refresh_jobs(day).aexists()
+
+
+def refresh_daily_summary(day: date) -> Optional[DailySummary]:
+    """Regenerate the stored summary for `day` unless its posts are unchanged."""
+    posts = list(posts_for_day(day).only(*SUMMARY_FIELDS))
+    if not posts:
+        DailySummary.objects.filter(date=day).delete()
+        return None
+    fingerprint = posts_fingerprint(posts)
+    current = DailySummary.objects.filter(date=day).first()
+    if current is not None and current.fingerprint == fingerprint:
+        return current
+    summary = summarize_posts(posts)
+    obj, _ = DailySummary.objects.update_or_create(
+        date=day,
+        defaults={'summary': summary, 'fingerprint': fingerprint, 'post_count': len(posts)},
+    )
+    return obj
@@ -0,0 +1,39 @@
+from datetime import date
+
+from jobs.queue import task
+from news.models import NewsPost
+from projects.models import Project
+from .ai_services import add_documents, remove_documents
+from .documents import news_document, project_document
+from .metrics import source
+from .summaries import refresh_daily_summary
+
+
+@task('ai.index_news')
+@source('task:ai.index_news')
+def index_news(payload):
+    post = NewsPost.objects.filter(id=payload['id']).first()
+    if post is None:
+        return
+    add_documents([news_document(post)])
+
+
+@task('ai.index_project')
+@source('task:ai.index_project')
+def index_project(payload):
+    project = Project.objects.filter(id=payload['id']).first()
+    if project is None:
+        return
+    add_documents([project_document(project)])
+
+
+@task('ai.remove_documents')
+@source('task:ai.remove_documents')
+def remove_docs(payload):
+    remove_documents(payload['ids'])
+
+
+@task('ai.refresh_daily_summary')
+@source('task:ai.refresh_daily_summary')
+def refresh_summary(payload):
+    refresh_daily_summary(date.fromisoformat(payload['date']))
@@ -1,10 +1,18 @@
+import json
+import os
+import tempfile
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.utils import timezone
 from unittest.mock import patch
 from django.contrib.auth.models import User
 from premitive.models import UserProfile
 from news.models import NewsPost
 from projects.models import Project
+from ai.answer_cache import SemanticAnswerCache
+from ai.embedding_cache import EmbeddingCache
+from ai.ollama_client import OllamaUnavailable
+from jobs.queue import run_pending
 
 
 class AiServicesAndViewsTest(TestCase):
@@ -13,10 +21,14 @@ class AiServicesAndViewsTest(TestCase):
         self.user = User.objects.create_user(username='u@example.com', email='u@example.com', password='pass')
         UserProfile.objects.create(user=self.user, role='student')
         self.client.login(username='u@example.com', password='pass')
+        patcher = patch('ai.ai_services.answer_cache', SemanticAnswerCache(''))
+        patcher.start()
+        self.addCleanup(patcher.stop)
         # Seed minimal content
         self.post = NewsPost.objects.create(title='Library Update', category='academics', content='New Python resources available', author=self.user)
         self.project = Project.objects.create(title='Data Tools', description='Build Python data tools', skills='Python, Pandas', author=self.user)
 
+    @patch('ai.ai_services.embedding_cache', EmbeddingCache(''))
     @patch('ai.ai_services.get_collection')
     @patch('ai.ai_services.ollama_embed')
     def test_index_signals_do_not_crash(self, m_embed, m_coll):
@@ -47,13 +59,20 @@ class AiServicesAndViewsTest(TestCase):
         self.assertIn('answer', data)
         self.assertTrue(data['answer'].startswith('Projects that use Python'))
 
-    @patch('ai.views.ollama_generate')
+    @patch('ai.summaries.ollama_generate')
     def test_news_summary_today(self, m_gen):
         m_gen.return_value = 'Summary bullets here.'
         url = reverse('ai:news_summary_today')
         r = self.client.get(url)
         self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.json().get('pending'))
+        # The summary is generated by the job worker, then served from storage
+        with patch('ai.tasks.add_documents'):
+            run_pending()
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
         self.assertEqual(r.json().get('summary'), 'Summary bullets here.')
+        self.assertEqual(m_gen.call_count, 1)
 
     @patch('ai.views.ollama_generate')
     def test_news_qa_today(self, m_gen):
@@ -63,4 +82,78 @@ class AiServicesAndViewsTest(TestCase):
         self.assertEqual(r.status_code, 200)
         data = r.json()
         self.assertIn('answer', data)
-        self.assertTrue(data['answer'].startswith('3'))
\ No newline at end of file
+        self.assertTrue(data['answer'].startswith('3'))
+
+    @patch('ai.views.ollama_generate')
+    @patch('ai.ai_services.query_similar')
+    def test_news_qa_prompt_holds_only_retrieved_posts(self, m_query, m_gen):
+        NewsPost.objects.create(title='Cafeteria Menu', category='general', content='Pasta on Friday', author=self.user)
+        m_query.return_value = [{'id': f'news:{self.post.id}', 'text': 'News: Library Update\nNew Python resources available', 'metadata': {'type': 'news'}}]
+        m_gen.return_value = 'The library has new Python resources.'
+        r = self.client.post(reverse('ai:news_qa_today'), {'q': 'What is new at the library?'})
+        self.assertEqual(r.json()['count'], 2)
+        self.assertEqual(r.json()['used_context'], 1)
+        filters = m_query.call_args[1]['filters']
+        self.assertEqual(filters['type'], 'news')
+        self.assertEqual(filters['since'].date(), timezone.localdate())
+        prompt = m_gen.call_args[0][0]
+        self.assertIn('Library Update', prompt)
+        self.assertNotIn('Cafeteria', prompt)
+        self.assertIn('2 items were published today', prompt)
+
+    @patch('ai.views.ollama_generate')
+    def test_news_qa_returns_503_when_ollama_unavailable(self, m_gen):
+        m_gen.side_effect = OllamaUnavailable('down')
+        r = self.client.post(reverse('ai:news_qa_today'), {'q': 'Anything new?'})
+        self.assertEqual(r.status_code, 503)
+        self.assertIn('error', r.json())
+
+    @patch('ai.views.ollama_generate_stream')
+    @patch('ai.views.query_similar')
+    def test_chat_view_streams_tokens(self, m_query, m_stream):
+        m_query.return_value = []
+        m_stream.return_value = iter(['Data', ' Tools'])
+        r = self.client.post(reverse('ai:chat'), {'q': 'What projects use Python?', 'stream': '1'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r['Content-Type'], 'application/x-ndjson')
+        events = [json.loads(line) for line in b''.join(r.streaming_content).decode().splitlines()]
+        self.assertEqual([e['type'] for e in events], ['meta', 'token', 'token', 'done'])
+        self.assertEqual(''.join(e['text'] for e in events if e['type'] == 'token'), 'Data Tools')
+
+
+class ChatAnswerCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='c@example.com', password='pass')
+        self.client.login(username='c@example.com', password='pass')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = SemanticAnswerCache(os.path.join(tmp.name, 'answers.sqlite3'), threshold=0.9)
+        vectors = {'When is the career fair?': [1.0, 0.0], 'when is the career fair': [0.99, 0.05], 'Any sports news?': [0.0, 1.0]}
+        for patcher in (
+            patch('ai.ai_services.answer_cache', self.cache),
+            patch('ai.ai_services.embed_query', side_effect=lambda q: vectors[q]),
+            patch('ai.views.query_similar', return_value=[{'id': 'news:7', 'text': 'Career fair Friday', 'metadata': {'type': 'news'}}]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch('ai.views.ollama_generate')
+    def test_similar_question_is_served_from_cache(self, m_gen):
+        m_gen.return_value = 'Friday.'
+        first = self.client.post(reverse('ai:chat'), {'q': 'When is the career fair?'}).json()
+        second = self.client.post(reverse('ai:chat'), {'q': 'when is the career fair'}).json()
+        other = self.client.post(reverse('ai:chat'), {'q': 'Any sports news?'}).json()
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['answer'], 'Friday.')
+        self.assertFalse(other['cached'])
+        self.assertEqual(m_gen.call_count, 2)
+        self.assertEqual(self.cache.stats()['hit_rate'], round(1 / 3, 4))
+
+    @patch('ai.views.ollama_generate')
+    def test_reindexing_a_cited_document_invalidates_answer(self, m_gen):
+        m_gen.return_value = 'Friday.'
+        self.client.post(reverse('ai:chat'), {'q': 'When is the career fair?'})
+        self.assertEqual(self.cache.invalidate_docs(['news:7']), 1)
+        r = self.client.post(reverse('ai:chat'), {'q': 'When is the career fair?'}).json()
+        self.assertFalse(r['cached'])
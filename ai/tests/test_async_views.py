@@ -0,0 +1,113 @@
+import json
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from django.contrib.auth.models import User
+from django.test import AsyncRequestFactory, TestCase
+
+from ai import views
+from ai.answer_cache import SemanticAnswerCache
+from ai.models import DailySummary
+from ai.ollama_client import AsyncOllamaClient, CircuitBreaker, OllamaClient, OllamaUnavailable, httpx
+from news.models import NewsPost
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='a@example.com', password='pass')
+        self.factory = AsyncRequestFactory()
+        patcher = patch('ai.ai_services.answer_cache', SemanticAnswerCache(''))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, method, path, data=None):
+        request = getattr(self.factory, method)(path, data or {})
+        user = self.user
+
+        async def auser():
+            return user
+        request.user, request.auser = user, auser
+        return request
+
+    @patch('ai.views.aollama_generate', new_callable=AsyncMock, return_value='Data Tools uses Python.')
+    @patch('ai.views.aquery_similar', new_callable=AsyncMock, return_value=[{'id': 'project:1', 'text': 'Data Tools', 'metadata': {'type': 'project'}}])
+    async def test_chat_answers_without_threads(self, m_query, m_gen):
+        r = await views.chat_assistant_async(self.request('post', '/ai/chat/', {'q': 'Python projects?'}))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(json.loads(r.content), {'answer': 'Data Tools uses Python.', 'used_context': 1, 'cached': False})
+        self.assertIn('Data Tools', m_gen.await_args[0][0])
+
+    @patch('ai.views.aquery_similar', new_callable=AsyncMock, return_value=[])
+    async def test_chat_streams_tokens(self, m_query):
+        async def tokens(prompt):
+            for t in ['Data', ' Tools']:
+                yield t
+        with patch('ai.views.aollama_generate_stream', side_effect=tokens):
+            r = await views.chat_assistant_async(self.request('post', '/ai/chat/', {'q': 'Python?', 'stream': '1'}))
+            lines = [chunk async for chunk in r.streaming_content]
+        events = [json.loads(line) for line in b''.join(lines).decode().splitlines()]
+        self.assertEqual([e['type'] for e in events], ['meta', 'token', 'token', 'done'])
+
+    @patch('ai.views.aquery_similar', new_callable=AsyncMock, side_effect=OllamaUnavailable('down'))
+    async def test_chat_returns_503_when_ollama_unavailable(self, m_query):
+        r = await views.chat_assistant_async(self.request('post', '/ai/chat/', {'q': 'Anything?'}))
+        self.assertEqual(r.status_code, 503)
+
+    async def test_summary_served_from_storage(self):
+        r = await views.news_summary_today_async(self.request('get', '/ai/news/summary/today/'))
+        self.assertEqual(json.loads(r.content)['summary'], 'No news published today.')
+        with patch('ai.tasks.add_documents'):
+            await NewsPost.objects.acreate(title='Fest', category='events', content='Tonight', author=self.user)
+        r = await views.news_summary_today_async(self.request('get', '/ai/news/summary/today/'))
+        self.assertTrue(json.loads(r.content)['pending'])
+        await DailySummary.objects.aupdate_or_create(date=views.timezone.localdate(), defaults={'summary': 'Fest tonight', 'post_count': 1})
+        r = await views.news_summary_today_async(self.request('get', '/ai/news/summary/today/'))
+        self.assertEqual(json.loads(r.content)['summary'], 'Fest tonight')
+
+    @patch('ai.views.aollama_generate', new_callable=AsyncMock, return_value='Yes, the fest is tonight.')
+    @patch('ai.ai_services.aquery_similar', new_callable=AsyncMock, return_value=[])
+    async def test_news_qa_falls_back_to_latest_posts(self, m_query, m_gen):
+        await NewsPost.objects.acreate(title='Fest', category='events', content='Tonight', author=self.user)
+        r = await views.news_qa_today_async(self.request('post', '/ai/news/qa/today/', {'q': 'Is the fest tonight?'}))
+        data = json.loads(r.content)
+        self.assertEqual((data['count'], data['used_context']), (1, 1))
+        self.assertIn('News: Fest', m_gen.await_args[0][0])
+
+
+@unittest.skipIf(httpx is None, 'httpx not installed')
+class AsyncOllamaClientTest(TestCase):
+    def client_for(self, handler):
+        sync = OllamaClient('http://ollama.test', chat_model='m', embed_model='e', breaker=CircuitBreaker(1, 30))
+        return AsyncOllamaClient(sync, transport=httpx.MockTransport(handler))
+
+    async def test_generate_and_stream(self):
+        def handler(request):
+            body = json.loads(request.content)
+            if body['stream']:
+                lines = [{'response': 'Hel'}, {'response': 'lo'}, {'done': True}]
+                return httpx.Response(200, content='\n'.join(json.dumps(l) for l in lines))
+            return httpx.Response(200, json={'response': 'Hello'})
+        client = self.client_for(handler)
+        self.assertEqual(await client.generate('hi'), 'Hello')
+        self.assertEqual([t async for t in client.generate_stream('hi')], ['Hel', 'lo'])
+        self.assertIs(client.client(), client.client())
+
+    async def test_connection_error_opens_breaker(self):
+        def handler(request):
+            raise httpx.ConnectError('refused', request=request)
+        client = self.client_for(handler)
+        with self.assertRaises(OllamaUnavailable):
+            await client.generate('hi')
+        self.assertEqual(client.breaker.state, 'open')
+        with self.assertRaises(OllamaUnavailable):
+            await client.embed('hi')
+
+    async def test_unexpected_error_in_half_open_trial_reopens_breaker(self):
+        def handler(request):
+            raise httpx.DecodingError('bad gzip', request=request)
+        client = self.client_for(handler)
+        client.breaker.record_failure()
+        client.breaker.opened_at -= 31
+        with self.assertRaises(httpx.DecodingError):
+            await client.generate('hi')
+        self.assertEqual(client.breaker.state, 'open')
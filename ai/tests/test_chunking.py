@@ -0,0 +1,92 @@
+from django.test import SimpleTestCase
+from unittest.mock import patch
+
+from ai import ai_services
+from ai.answer_cache import SemanticAnswerCache
+from ai.chunking import chunk_document, collapse_passages, estimate_tokens, fit_to_budget
+from ai.embedding_cache import EmbeddingCache
+from ai.tests.test_indexing import FakeCollection
+
+
+def long_document(words=100):
+    body = ' '.join(f'w{i}' for i in range(words))
+    return {'id': 'news:1', 'text': f'News: Long post\nCategory: Events\n{body}', 'metadata': {'type': 'news', 'title': 'Long post'}}
+
+
+class ChunkDocumentTest(SimpleTestCase):
+    def test_short_document_is_one_passage(self):
+        chunks = chunk_document({'id': 'project:3', 'text': 'Project: P\nSkills: Python', 'metadata': {'type': 'project'}})
+        self.assertEqual([c['id'] for c in chunks], ['project:3#0'])
+        self.assertEqual(chunks[0]['metadata']['parent_id'], 'project:3')
+        self.assertEqual(chunks[0]['metadata']['type'], 'project')
+
+    def test_long_document_splits_into_overlapping_passages(self):
+        # 20 tokens ~ 15 words per passage, 4 tokens ~ 3 words of overlap
+        chunks = chunk_document(long_document(), max_tokens=20, overlap=4)
+        self.assertEqual(chunks[0]['id'], 'news:1#0')
+        self.assertEqual([c['metadata']['chunk'] for c in chunks], list(range(len(chunks))))
+        self.assertTrue(chunks[1]['text'].startswith('News: Long post\n'))
+        first, second = chunks[0]['text'].split(), chunks[1]['text'].split()
+        self.assertEqual(first[-3:], second[4:7])
+        self.assertIn('w99', chunks[-1]['text'])
+        self.assertEqual(len({c['metadata']['parent_hash'] for c in chunks}), 1)
+
+    def test_collapse_groups_passages_by_parent_in_rank_order(self):
+        hits = [
+            {'id': 'news:2#3', 'text': 'late', 'metadata': {'parent_id': 'news:2', 'chunk': 3, 'title': 'Two'}, 'distance': 0.1},
+            {'id': 'project:1#0', 'text': 'proj', 'metadata': {'parent_id': 'project:1', 'chunk': 0}, 'distance': 0.2},
+            {'id': 'news:2#1', 'text': 'early', 'metadata': {'parent_id': 'news:2', 'chunk': 1, 'title': 'Two'}, 'distance': 0.3},
+            {'id': 'news:9#0', 'text': 'cut', 'metadata': {'parent_id': 'news:9', 'chunk': 0}, 'distance': 0.4},
+        ]
+        docs = collapse_passages(hits, n=2)
+        self.assertEqual([d['id'] for d in docs], ['news:2', 'project:1'])
+        self.assertEqual(docs[0]['text'], 'early\nlate')
+        self.assertEqual(docs[0]['metadata'], {'title': 'Two'})
+        self.assertEqual(docs[0]['distance'], 0.1)
+
+    def test_fit_to_budget_truncates_and_stops(self):
+        docs = [{'id': 'a', 'text': 'x ' * 20}, {'id': 'b', 'text': 'y ' * 40}, {'id': 'c', 'text': 'z'}]
+        fitted = fit_to_budget(docs, budget=30)
+        self.assertEqual([d['id'] for d in fitted], ['a', 'b'])
+        self.assertLessEqual(sum(estimate_tokens(d['text']) for d in fitted), 32)
+
+
+class ChunkedIndexingTest(SimpleTestCase):
+    def setUp(self):
+        self.coll = FakeCollection()
+        for patcher in (
+            patch('ai.ai_services.get_collection', return_value=self.coll),
+            patch('ai.ai_services.embedding_cache', EmbeddingCache('')),
+            patch('ai.ai_services.answer_cache', SemanticAnswerCache('')),
+            patch('ai.ai_services.ollama_embed_batch', side_effect=lambda texts: [[1.0] for _ in texts]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_shrinking_document_drops_stale_passages(self):
+        self.coll.items['news:1'] = {'document': 'whole post, pre-chunking', 'metadata': {}}
+        with patch('ai.ai_services.chunk_document', side_effect=lambda d: chunk_document(d, max_tokens=20, overlap=4)):
+            ai_services.add_documents([long_document(100)])
+            count = len(self.coll.items)
+            ai_services.add_documents([long_document(30)])
+        self.assertGreater(count, len(self.coll.items))
+        self.assertNotIn('news:1', self.coll.items)
+        self.assertTrue(all(m['metadata']['parent_id'] == 'news:1' for m in self.coll.items.values()))
+        stored = ai_services.get_stored_hashes(['news:1'])
+        self.assertEqual(set(stored), {'news:1'})
+
+    def test_vector_search_returns_parent_documents(self):
+        hits = {'ids': [['news:1#2', 'news:1#0', 'project:4#0']], 'documents': [['b', 'a', 'p']],
+                'metadatas': [[{'parent_id': 'news:1', 'chunk': 2}, {'parent_id': 'news:1', 'chunk': 0}, {'parent_id': 'project:4', 'chunk': 0}]],
+                'distances': [[0.1, 0.2, 0.3]]}
+        coll = type('C', (), {'query': lambda self, **kw: hits})()
+        with patch('ai.ai_services.get_collection', return_value=coll), patch('ai.ai_services.embed_query', return_value=[1.0]):
+            docs = ai_services.query_similar('anything', n=2, mode='vector')
+        self.assertEqual([(d['id'], d['text']) for d in docs], [('news:1', 'a\nb'), ('project:4', 'p')])
+
+    def test_chat_prompt_respects_context_budget(self):
+        retrieved = [{'id': f'news:{i}', 'text': 'word ' * 200, 'metadata': {'type': 'news', 'title': f'T{i}'}} for i in range(10)]
+        prompt = ai_services.build_chat_prompt('q?', retrieved, budget=300)
+        self.assertIn('T0', prompt)
+        self.assertIn('T1', prompt)
+        self.assertNotIn('T2', prompt)
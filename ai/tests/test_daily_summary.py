@@ -0,0 +1,78 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from ai.models import DailySummary
+from ai.summaries import group_posts, refresh_daily_summary, summary_job_key
+from jobs.models import Job
+from news.models import NewsPost
+
+
+@patch('ai.tasks.add_documents')
+class DailySummaryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='s@example.com', password='pass')
+        self.today = timezone.localdate()
+
+    def post(self, title):
+        return NewsPost.objects.create(title=title, category='events', content='Body', author=self.user)
+
+    def test_burst_of_posts_queues_one_refresh(self, m_add):
+        for i in range(5):
+            self.post(f'P{i}')
+        jobs = Job.objects.filter(unique_key=summary_job_key(self.today), status='queued')
+        self.assertEqual(jobs.count(), 1)
+        self.assertGreater(jobs.get().run_at, timezone.now())
+
+    @patch('ai.summaries.ollama_generate', return_value='Bullets')
+    def test_refresh_skips_generation_when_posts_unchanged(self, m_gen, m_add):
+        p = self.post('P')
+        refresh_daily_summary(self.today)
+        refresh_daily_summary(self.today)
+        self.assertEqual(m_gen.call_count, 1)
+        p.content = 'Edited body'
+        p.save()
+        refresh_daily_summary(self.today)
+        self.assertEqual(m_gen.call_count, 2)
+        self.assertEqual(DailySummary.objects.get(date=self.today).post_count, 1)
+
+
+@patch('ai.tasks.add_documents')
+@patch('ai.summaries.AI_SUMMARY_MAP_REDUCE_TOKENS', 100)
+@patch('ai.summaries.AI_SUMMARY_GROUP_TOKENS', 60)
+class MapReduceSummaryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='m@example.com', password='pass')
+        self.today = timezone.localdate()
+
+    def post(self, title, category):
+        return NewsPost.objects.create(title=title, category=category, content='word ' * 30, author=self.user)
+
+    @patch('ai.summaries.ollama_generate', return_value='Bullets')
+    def test_small_day_uses_a_single_prompt(self, m_gen, m_add):
+        self.post('Only', 'events')
+        refresh_daily_summary(self.today)
+        self.assertEqual(m_gen.call_count, 1)
+
+    @patch('ai.summaries.ollama_generate')
+    def test_large_day_is_summarized_per_category_then_merged(self, m_gen, m_add):
+        m_gen.side_effect = lambda prompt: 'MERGED' if prompt.startswith('Below are partial') else 'partial'
+        for i in range(3):
+            self.post(f'Event {i}', 'events')
+        self.post('Exam dates', 'academics')
+        summary = refresh_daily_summary(self.today)
+        self.assertEqual(summary.summary, 'MERGED')
+        prompts = [c[0][0] for c in m_gen.call_args_list]
+        group_prompts = [p for p in prompts if not p.startswith('Below are partial')]
+        # ~41 tokens per post and a 60 token budget: one group per post
+        self.assertEqual(len(group_prompts), 4)
+        self.assertTrue(any('Academics' in p and 'Exam dates' in p and 'Event' not in p for p in group_prompts))
+        self.assertEqual(prompts[-1].count('partial'), 5)
+
+    def test_group_posts_respects_budget(self, m_add):
+        for i in range(3):
+            self.post(f'Event {i}', 'events')
+        groups = group_posts(NewsPost.objects.all(), budget=90)
+        self.assertEqual([(label, len(lines)) for label, lines in groups], [('Events', 2), ('Events', 1)])
@@ -0,0 +1,64 @@
+import tempfile
+import unittest
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from ai.answer_cache import SemanticAnswerCache
+from ai.vector_store import NumpyVectorStore, np
+from jobs.models import Job
+from news.models import NewsPost
+from projects.models import Project
+
+
+class DeleteSignalTest(TestCase):
+    def test_deleting_a_post_queues_index_removal(self):
+        user = User.objects.create_user(username='d@example.com', password='pass')
+        post = NewsPost.objects.create(title='Gone', category='events', content='Soon', author=user)
+        project = Project.objects.create(title='P', description='D', skills='Python', author=user)
+        post_id, project_id = post.id, project.id
+        post.delete()
+        project.delete()
+        payloads = list(Job.objects.filter(name='ai.remove_documents').values_list('payload', flat=True))
+        self.assertEqual(payloads, [{'ids': [f'news:{post_id}']}, {'ids': [f'project:{project_id}']}])
+
+
+@unittest.skipIf(np is None, 'numpy not installed')
+class GarbageCollectTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='g@example.com', password='pass')
+        self.kept = NewsPost.objects.create(title='Kept', category='events', content='Here', author=user)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = NumpyVectorStore(tmp.name)
+        entries = [(f'news:{self.kept.id}', 0), ('news:999', 0), ('news:999', 1), ('project:998', 0)]
+        self.store.upsert(
+            ids=[f'{parent}#{n}' for parent, n in entries] + ['legacy-entry'],
+            embeddings=[[1.0, float(i)] for i in range(len(entries) + 1)],
+            metadatas=[{'parent_id': parent, 'chunk': n} for parent, n in entries] + [{}],
+        )
+        for patcher in (
+            patch('ai.management.commands.ai_gc.get_collection', return_value=self.store),
+            patch('ai.management.commands.ai_gc.store_path', return_value=tmp.name),
+            patch('ai.ai_services.get_collection', return_value=self.store),
+            patch('ai.ai_services.answer_cache', SemanticAnswerCache('')),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_dry_run_reports_without_removing(self):
+        out = StringIO()
+        call_command('ai_gc', '--dry-run', stdout=out)
+        self.assertIn('3 orphaned documents found', out.getvalue())
+        self.assertEqual(self.store.count(), 5)
+
+    def test_removes_orphans_and_compacts(self):
+        out = StringIO()
+        call_command('ai_gc', '--batch-size', '2', stdout=out)
+        self.assertEqual(self.store.get(include=[])['ids'], [f'news:{self.kept.id}#0'])
+        self.assertEqual(self.store._matrix.shape[0], 1)
+        self.assertIn('5 -> 1 entries', out.getvalue())
+        self.assertIn('Median query latency', out.getvalue())
@@ -0,0 +1,201 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from unittest import skipUnless
+from unittest.mock import patch
+
+from ai import ai_services
+from ai.apps import serving
+from ai.chunking import text_hash
+from ai.documents import news_document
+from ai.answer_cache import SemanticAnswerCache
+from ai.embedding_cache import EmbeddingCache
+from ai.vector_store import NumpyVectorStore, np
+from news.models import NewsPost
+from projects.models import Project
+
+
+class FakeCollection:
+    def __init__(self):
+        self.upserts = []
+        self.items = {}
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        self.upserts.append({'ids': ids, 'documents': documents, 'metadatas': metadatas, 'embeddings': embeddings})
+        for i, doc, meta in zip(ids, documents, metadatas):
+            self.items[i] = {'document': doc, 'metadata': meta}
+
+    def get(self, ids=None, where=None, include=()):
+        # Supports the id lookups and {'parent_id': {'$in': [...]}} filters add_documents uses
+        found = [i for i in self.items if ids is None or i in ids]
+        if where is not None:
+            parents = where['parent_id']['$in']
+            found = [i for i in found if self.items[i]['metadata'].get('parent_id') in parents]
+        return {'ids': found, 'metadatas': [self.items[i]['metadata'] for i in found]}
+
+    def delete(self, ids):
+        for i in ids:
+            self.items.pop(i, None)
+
+
+class BatchedAddDocumentsTest(SimpleTestCase):
+    def setUp(self):
+        self.coll = FakeCollection()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = EmbeddingCache(os.path.join(tmp.name, 'cache.sqlite3'), max_entries=100)
+        for patcher in (
+            patch('ai.ai_services.get_collection', return_value=self.coll),
+            patch('ai.ai_services.embedding_cache', self.cache),
+            patch('ai.ai_services.answer_cache', SemanticAnswerCache('')),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch('ai.ai_services.ollama_embed_batch')
+    def test_batches_embeddings_and_upserts(self, m_batch):
+        m_batch.side_effect = lambda texts: [[float(len(t))] for t in texts]
+        docs = [{'id': f'news:{i}', 'text': 'x' * i, 'metadata': {'type': 'news'}} for i in range(1, 8)]
+        ai_services.add_documents(docs, batch_size=3, concurrency=2)
+        self.assertEqual(m_batch.call_count, 3)
+        self.assertEqual([len(u['ids']) for u in self.coll.upserts], [3, 3, 1])
+        ids = [i for u in self.coll.upserts for i in u['ids']]
+        vecs = [v for u in self.coll.upserts for v in u['embeddings']]
+        self.assertEqual(ids, [f'news:{i}#0' for i in range(1, 8)])
+        self.assertEqual(vecs, [[float(i)] for i in range(1, 8)])
+
+    @patch.object(ai_services.ollama, 'embed')
+    @patch.object(ai_services.ollama, 'post')
+    def test_batch_endpoint_falls_back_on_404(self, m_post, m_embed):
+        m_post.return_value.status_code = 404
+        m_embed.return_value = [0.5]
+        vecs = ai_services.ollama_embed_batch(['a', 'b'])
+        self.assertEqual(vecs, [[0.5], [0.5]])
+        self.assertEqual(m_embed.call_count, 2)
+
+    @patch('ai.ai_services.ollama_embed_batch')
+    def test_unchanged_corpus_reindex_makes_no_embedding_calls(self, m_batch):
+        m_batch.side_effect = lambda texts: [[1.0, 2.0] for _ in texts]
+        docs = [{'id': f'news:{i}', 'text': f'Post {i}'} for i in range(5)]
+        ai_services.add_documents(docs, batch_size=2)
+        calls = m_batch.call_count
+        # Whitespace-only edits normalize to the same cache key
+        docs[0]['text'] = '  Post   0 '
+        self.cache.reset_stats()
+        ai_services.add_documents(docs, batch_size=2)
+        self.assertEqual(m_batch.call_count, calls)
+        self.assertEqual(self.cache.stats()['hits'], 5)
+        self.assertEqual(self.cache.stats()['misses'], 0)
+        self.assertEqual(len(self.coll.upserts), 6)
+
+
+class EmbeddingCacheTest(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = EmbeddingCache(os.path.join(tmp.name, 'cache.sqlite3'), max_entries=2)
+
+    def test_keyed_by_model(self):
+        self.cache.put('m1', 'hello', [0.25])
+        self.assertEqual(self.cache.get('m1', 'hello'), [0.25])
+        self.assertIsNone(self.cache.get('m2', 'hello'))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put('m', 'a', [1.0])
+        self.cache.put('m', 'b', [2.0])
+        self.cache.get('m', 'a')
+        self.cache.put('m', 'c', [3.0])
+        self.assertEqual(self.cache.stats()['entries'], 2)
+        self.assertIsNone(self.cache.get('m', 'b'))
+        self.assertEqual(self.cache.get('m', 'a'), [1.0])
+
+
+class ReindexCommandTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='a@example.com', password='pass')
+        self.posts = [NewsPost.objects.create(title=f'N{i}', category='events', content='C', author=user) for i in range(5)]
+        self.project = Project.objects.create(title='P', description='D', skills='Python', author=user)
+        NewsPost.objects.filter(id=self.posts[0].id).update(created_at=timezone.now() - timedelta(days=10))
+        self.batches = []
+        for patcher in (
+            patch('ai.management.commands.ai_reindex.add_documents', side_effect=lambda docs: self.batches.append([d['id'] for d in docs])),
+            patch('ai.management.commands.ai_reindex.embedding_cache', EmbeddingCache('')),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def reindex(self, *args):
+        call_command('ai_reindex', *args, stdout=StringIO())
+        return [i for b in self.batches for i in b]
+
+    def test_streams_in_chunks(self):
+        ids = self.reindex('--chunk-size', '2')
+        self.assertEqual([len(b) for b in self.batches], [2, 2, 1, 1])
+        self.assertEqual(len(ids), 6)
+
+    def test_type_and_since_filters(self):
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        ids = self.reindex('--type', 'news', '--since', since)
+        self.assertEqual(sorted(ids), sorted(f'news:{p.id}' for p in self.posts[1:]))
+
+    @patch('ai.management.commands.ai_reindex.get_stored_hashes')
+    def test_changed_only_skips_unchanged_documents(self, m_stored):
+        m_stored.side_effect = lambda ids: {d['id']: text_hash(d['text']) for d in map(news_document, self.posts[:4])}
+        ids = self.reindex('--changed-only')
+        self.assertEqual(ids, [f'news:{self.posts[4].id}', f'project:{self.project.id}'])
+
+
+class ChromaHandleTest(SimpleTestCase):
+    def setUp(self):
+        ai_services.reset_collection()
+        self.addCleanup(ai_services.reset_collection)
+        patcher = patch('ai.ai_services._get_chroma_client')
+        self.m_client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_handle_is_opened_once_per_process(self):
+        coll = ai_services.get_collection()
+        self.assertIs(ai_services.get_collection(), coll)
+        self.assertEqual(self.m_client.call_count, 1)
+
+    def test_forked_child_reopens_handle(self):
+        ai_services.get_collection()
+        with patch('ai.ai_services.os.getpid', return_value=-1):
+            ai_services.get_collection()
+        self.assertEqual(self.m_client.call_count, 2)
+
+    @skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_child_forked_while_lock_is_held_can_open_store(self):
+        with ai_services._chroma_lock:
+            pid = os.fork()
+            if pid == 0:
+                opened = ai_services._chroma_lock.acquire(timeout=2) and ai_services._chroma_handle['collection'] is None
+                os._exit(0 if opened else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+    def test_warm_up_skipped_under_management_commands(self):
+        for argv, expected in [(['manage.py', 'migrate'], False), (['manage.py', 'runserver'], True), (['gunicorn', 'mysite.wsgi'], True)]:
+            with patch('ai.apps.sys.argv', argv):
+                self.assertIs(serving(), expected, argv)
+
+    @skipUnless(np is not None, 'numpy not installed')
+    def test_numpy_backend_is_warmed_up_without_chromadb(self):
+        with tempfile.TemporaryDirectory() as path, patch('ai.ai_services.chromadb', None), \
+                patch('ai.ai_services.AI_VECTOR_BACKEND', 'numpy'), patch('ai.ai_services.AI_VECTOR_DIR', path), \
+                self.assertLogs('ai.apps', 'INFO') as logs:
+            apps.get_app_config('ai').warm_up()
+            self.assertIsInstance(ai_services.get_collection(), NumpyVectorStore)
+        self.assertIn(f"NumPy vector store '{path}' ready", logs.output[0])
+
+    def test_warm_up_reports_elapsed_time(self):
+        elapsed = ai_services.warm_up()
+        self.assertGreaterEqual(elapsed, 0)
+        self.assertEqual(ai_services.chroma_warmup_seconds, elapsed)
+        self.m_client.return_value.get_collection.return_value.count.assert_called_once()
@@ -0,0 +1,107 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ai import metrics
+from ai.answer_cache import SemanticAnswerCache
+from ai.metrics import MetricsRegistry
+from ai.ollama_client import CircuitBreaker, OllamaClient
+from ai.standin import StandinConfig, start_in_thread
+
+
+class RegistryTest(SimpleTestCase):
+    def test_render_prometheus_text(self):
+        reg = MetricsRegistry()
+        labels = (('op', 'generate'), ('source', 'ai:chat'))
+        reg.observe('ai_call_seconds', labels, 0.3)
+        reg.observe('ai_call_seconds', labels, 3.0)
+        reg.inc('ai_completion_tokens_total', (('source', 'ai:chat'),), 40)
+        reg.inc('ai_eval_seconds_total', (('source', 'ai:chat'),), 2)
+        text = reg.render()
+        self.assertIn('# TYPE ai_call_seconds histogram', text)
+        self.assertIn('ai_call_seconds_bucket{op="generate",source="ai:chat",le="0.5"} 1', text)
+        self.assertIn('ai_call_seconds_bucket{op="generate",source="ai:chat",le="+Inf"} 2', text)
+        self.assertIn('ai_call_seconds_count{op="generate",source="ai:chat"} 2', text)
+        self.assertIn('ai_generation_tokens_per_second{source="ai:chat"} 20', text)
+
+    def test_slow_calls_are_logged(self):
+        with patch('ai.metrics.registry', MetricsRegistry()), patch('ai.metrics.AI_SLOW_CALL_MS', 100):
+            with self.assertLogs('ai.slow', level='WARNING') as logs:
+                metrics.observe_call('generate', 0.5, {'eval_count': 12})
+            metrics.observe_call('embed', 0.01)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Slow generate call from other: 500 ms', logs.output[0])
+
+
+class ClientInstrumentationTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = start_in_thread(StandinConfig(latency=0.01, token_rate=0, tokens=4, dim=8, embed_latency=0))
+        host, port = cls.server.server_address[:2]
+        cls.ollama = OllamaClient(f'http://{host}:{port}', chat_model='m', embed_model='e', breaker=CircuitBreaker(), on_call=metrics.observe_call)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        patcher = patch('ai.metrics.registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_generate_records_ollama_counters_by_source(self):
+        with metrics.source('command:test'):
+            self.ollama.generate('Summarize today')
+            self.ollama.embed_batch(['a', 'b'])
+        by_source = (('source', 'command:test'),)
+        self.assertEqual(self.registry.counters[('ai_completion_tokens_total', by_source)], 4)
+        self.assertAlmostEqual(self.registry.counters[('ai_load_seconds_total', by_source)], 0.01)
+        self.assertEqual(self.registry.histograms[('ai_call_seconds', (('op', 'generate'), ('source', 'command:test')))].count, 1)
+        self.assertEqual(self.registry.histograms[('ai_call_seconds', (('op', 'embed'), ('source', 'command:test')))].count, 1)
+
+    def test_bound_stream_keeps_scope_after_block(self):
+        with metrics.source('ai:chat'):
+            tokens = metrics.bind(self.ollama.generate_stream('Summarize today'))
+        self.assertEqual(len(list(tokens)), 4)
+        by_source = (('source', 'ai:chat'),)
+        self.assertEqual(self.registry.counters[('ai_completion_tokens_total', by_source)], 4)
+        self.assertEqual(self.registry.histograms[('ai_first_token_seconds', by_source)].count, 1)
+
+
+class MetricsViewsTest(TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        for target, value in [('ai.metrics.registry', self.registry), ('ai.views.metrics_registry', self.registry),
+                              ('ai.ai_services.answer_cache', SemanticAnswerCache(''))]:
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='u@example.com', password='pass')
+        User.objects.create_user(username='s@example.com', password='pass', is_staff=True)
+
+    @patch('ai.views.ollama_generate', return_value='Nothing yet.')
+    @patch('ai.views.query_similar', return_value=[])
+    def test_chat_request_phases_are_recorded(self, m_query, m_gen):
+        self.client.login(username='u@example.com', password='pass')
+        r = self.client.post(reverse('ai:chat'), {'q': 'Any news?'})
+        self.assertEqual(r.status_code, 200)
+        self.assertIn('retrieval;dur=', r['Server-Timing'])
+        total = self.registry.histograms[('ai_request_seconds', (('source', 'ai:chat'), ('phase', 'total')))]
+        self.assertEqual(total.count, 1)
+
+    def test_metrics_endpoint_access(self):
+        url = reverse('ai:metrics')
+        self.client.login(username='u@example.com', password='pass')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with patch('ai.views.AI_METRICS_TOKEN', 'secret'):
+            r = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.client.login(username='s@example.com', password='pass')
+        self.assertEqual(self.client.get(url).status_code, 200)
@@ -0,0 +1,93 @@
+from unittest.mock import patch, MagicMock
+
+import requests
+from django.test import SimpleTestCase
+
+from ai.ollama_client import OllamaClient, CircuitBreaker, OllamaUnavailable
+
+
+def response(status=200, data=None):
+    r = MagicMock()
+    r.status_code = status
+    r.json.return_value = data or {}
+    if status >= 400:
+        r.raise_for_status.side_effect = requests.exceptions.HTTPError(str(status))
+    return r
+
+
+class OllamaClientTest(SimpleTestCase):
+    def setUp(self):
+        self.client = OllamaClient('http://ollama.test', 'chat', 'embed', retry_backoff=0,
+                                   breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        patcher = patch.object(requests.Session, 'post')
+        self.m_post = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_session_is_reused_with_split_timeouts(self):
+        self.m_post.return_value = response(data={'response': 'hi'})
+        self.assertEqual(self.client.generate('p'), 'hi')
+        session = self.client.session
+        self.client.generate('p')
+        self.assertIs(self.client.session, session)
+        self.assertEqual(self.m_post.call_args.kwargs['timeout'], (3.0, 120.0))
+
+    def test_embed_retries_transient_errors(self):
+        self.m_post.side_effect = [requests.exceptions.ConnectionError(), response(503), response(data={'embedding': [1.0]})]
+        self.assertEqual(self.client.embed('t'), [1.0])
+        self.assertEqual(self.m_post.call_count, 3)
+        self.assertEqual(self.client.breaker.state, 'closed')
+
+    def test_generate_is_not_retried(self):
+        self.m_post.side_effect = requests.exceptions.ConnectionError()
+        with self.assertRaises(OllamaUnavailable):
+            self.client.generate('p')
+        self.assertEqual(self.m_post.call_count, 1)
+
+    def test_circuit_opens_and_fails_fast(self):
+        self.m_post.side_effect = requests.exceptions.ConnectTimeout()
+        for _ in range(2):
+            with self.assertRaises(OllamaUnavailable):
+                self.client.generate('p')
+        self.assertEqual(self.client.breaker.state, 'open')
+        calls = self.m_post.call_count
+        with self.assertRaises(OllamaUnavailable):
+            self.client.generate('p')
+        self.assertEqual(self.m_post.call_count, calls)
+
+    def test_half_open_trial_closes_circuit(self):
+        breaker = self.client.breaker
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.opened_at -= 61
+        self.assertEqual(breaker.state, 'half-open')
+        self.m_post.side_effect = None
+        self.m_post.return_value = response(data={'response': 'back'})
+        self.assertEqual(self.client.generate('p'), 'back')
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_half_open_trial_failing_unexpectedly_reopens_circuit(self):
+        breaker = self.client.breaker
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.opened_at -= 61
+        self.m_post.side_effect = requests.exceptions.ChunkedEncodingError()
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            self.client.generate('p')
+        self.assertEqual(breaker.state, 'open')
+        breaker.opened_at -= 61
+        self.m_post.side_effect = KeyboardInterrupt()
+        with self.assertRaises(KeyboardInterrupt):
+            self.client.generate('p')
+        # Interrupted without an outcome: the next call is let through as the trial
+        self.m_post.side_effect = None
+        self.m_post.return_value = response(data={'response': 'back'})
+        self.assertEqual(self.client.generate('p'), 'back')
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_generate_stream_yields_tokens(self):
+        r = response()
+        r.iter_lines.return_value = [b'{"response": "Hel"}', b'', b'{"response": "lo"}', b'{"response": "", "done": true}']
+        self.m_post.return_value = r
+        self.assertEqual(list(self.client.generate_stream('p')), ['Hel', 'lo'])
+        self.assertTrue(self.m_post.call_args.kwargs['stream'])
+        r.close.assert_called_once()
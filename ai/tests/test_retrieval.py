@@ -0,0 +1,105 @@
+from datetime import date, datetime
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from ai import ai_services
+from ai.lexical import BM25Index, LexicalIndex, tokenize
+from ai.ollama_client import OllamaUnavailable
+
+
+DOCS = [
+    {'id': 'news:1', 'text': 'News: BioTech Lab Receives DST Grant\nCancer biomarker research', 'metadata': {'type': 'news'}},
+    {'id': 'news:2', 'text': 'News: Career Fair with 60+ Companies\nPlacement cell event', 'metadata': {'type': 'news'}},
+    {'id': 'project:3', 'text': 'Project: Course Planner Optimizer\nSkills: Python, OR-Tools\nCS101 timetables', 'metadata': {'type': 'project'}},
+]
+
+
+class BM25IndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.add_many(DOCS)
+
+    def test_tokenize_keeps_codes_and_drops_stopwords(self):
+        self.assertEqual(tokenize('What is the CS101 DST-grant?'), ['cs101', 'dst', 'grant'])
+
+    def test_exact_terms_rank_first(self):
+        self.assertEqual(self.index.search('DST grant', n=1)[0]['id'], 'news:1')
+        self.assertEqual(self.index.search('cs101', n=1)[0]['id'], 'project:3')
+
+    def test_incremental_replace_and_remove(self):
+        self.index.add({'id': 'news:2', 'text': 'Hackathon moved to Friday'})
+        self.assertEqual(self.index.search('career fair'), [])
+        self.assertEqual(self.index.search('hackathon')[0]['id'], 'news:2')
+        self.index.remove('news:2')
+        self.assertEqual(self.index.search('hackathon'), [])
+        self.assertEqual(len(self.index), 2)
+
+
+class HybridRetrievalTest(SimpleTestCase):
+    def setUp(self):
+        lexical = LexicalIndex()
+        lexical.index = BM25Index()
+        lexical.index.add_many(DOCS)
+        lexical.loaded_at = float('inf')
+        patcher = patch('ai.ai_services.lexical_index', lexical)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('ai.ai_services._vector_search')
+    def test_lexical_mode_makes_no_embedding_call(self, m_vector):
+        results = ai_services.query_similar('DST grant', n=2, mode='lexical')
+        self.assertEqual(results[0]['id'], 'news:1')
+        m_vector.assert_not_called()
+
+    @patch('ai.ai_services._vector_search')
+    def test_hybrid_fuses_rankings(self, m_vector):
+        m_vector.return_value = [dict(DOCS[1], distance=0.1), dict(DOCS[0], distance=0.2)]
+        results = ai_services.query_similar('DST grant', n=3, mode='hybrid')
+        # news:1 is ranked by both retrievers, so it wins the fusion
+        self.assertEqual([r['id'] for r in results], ['news:1', 'news:2'])
+        self.assertIn('rrf_score', results[0])
+
+    @patch('ai.ai_services._vector_search')
+    def test_hybrid_keeps_vector_passage_text(self, m_vector):
+        m_vector.return_value = [dict(DOCS[0], text='DST grant passage', metadata={'type': 'news', 'passages': 1})]
+        result = ai_services.query_similar('DST grant', n=1, mode='hybrid')[0]
+        self.assertEqual((result['id'], result['text']), ('news:1', 'DST grant passage'))
+        self.assertEqual(result['metadata'], {'type': 'news', 'passages': 1})
+
+    @patch('ai.ai_services._vector_search', side_effect=OllamaUnavailable('busy'))
+    def test_hybrid_falls_back_to_lexical(self, m_vector):
+        results = ai_services.query_similar('career fair', n=2, mode='hybrid')
+        self.assertEqual(results[0]['id'], 'news:2')
+
+
+class FilteredRetrievalTest(SimpleTestCase):
+    def setUp(self):
+        self.day = date(2026, 3, 2)
+        start = int(timezone.make_aware(datetime(2026, 3, 2)).timestamp())
+        lexical = LexicalIndex()
+        lexical.index = BM25Index()
+        lexical.index.add_many([
+            {'id': 'news:10', 'text': 'Fest schedule today', 'metadata': {'type': 'news', 'category': 'events', 'created_at': start + 3600}},
+            {'id': 'news:11', 'text': 'Fest schedule yesterday', 'metadata': {'type': 'news', 'category': 'events', 'created_at': start - 3600}},
+            {'id': 'project:12', 'text': 'Fest schedule planner', 'metadata': {'type': 'project', 'created_at': start + 60}},
+        ])
+        lexical.loaded_at = float('inf')
+        patcher = patch('ai.ai_services.lexical_index', lexical)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_build_where_combines_clauses(self):
+        self.assertIsNone(ai_services.build_where({}))
+        self.assertEqual(ai_services.build_where({'type': 'news'}), {'type': 'news'})
+        where = ai_services.build_where(ai_services.day_filters(self.day, category='events'))
+        self.assertEqual(where['$and'][:2], [{'type': 'news'}, {'category': 'events'}])
+        self.assertEqual(where['$and'][3]['created_at']['$lt'] - where['$and'][2]['created_at']['$gte'], 86400)
+
+    @patch('ai.ai_services._vector_search', return_value=[])
+    def test_day_filter_reaches_both_retrievers(self, m_vector):
+        results = ai_services.query_similar('fest schedule', n=5, filters=ai_services.day_filters(self.day))
+        self.assertEqual([r['id'] for r in results], ['news:10'])
+        where = m_vector.call_args[0][2]
+        self.assertEqual(where['$and'][0], {'type': 'news'})
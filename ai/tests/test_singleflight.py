@@ -0,0 +1,134 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ai import ai_services
+from ai.answer_cache import SemanticAnswerCache
+from ai.singleflight import SingleFlight, flight_key
+
+
+class SingleFlightTest(SimpleTestCase):
+    def test_concurrent_threads_share_one_call(self):
+        flight = SingleFlight(lock_dir='')
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'summary'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(4)]
+        for t in followers:
+            t.start()
+        while flight.stats()['coalesced'] < 4:
+            time.sleep(0.001)
+        release.set()
+        for t in [leader] + followers:
+            t.join(5)
+        self.assertEqual(results, ['summary'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats(), {'calls': 5, 'executed': 1, 'coalesced': 4, 'coalesced_remote': 0, 'coalesced_rate': 0.8})
+        # Once finished, the next call runs again
+        self.assertEqual(flight.do('k', lambda: 'fresh'), 'fresh')
+
+    def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight(lock_dir='')
+        with self.assertRaises(ValueError):
+            flight.do('k', lambda: (_ for _ in ()).throw(ValueError('boom')))
+        self.assertEqual(flight.do('k', lambda: 'ok'), 'ok')
+
+    def test_async_callers_share_one_call(self):
+        flight = SingleFlight(lock_dir='')
+        calls = []
+
+        async def generate():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'answer'
+
+        async def burst():
+            return await asyncio.gather(*(flight.ado('k', generate) for _ in range(10)))
+
+        self.assertEqual(asyncio.run(burst()), ['answer'] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()['coalesced'], 9)
+
+    def test_cancelled_leader_does_not_cancel_waiters(self):
+        flight = SingleFlight(lock_dir='')
+
+        async def generate():
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def scenario():
+            leader = asyncio.ensure_future(flight.ado('k', generate))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flight.ado('k', generate))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        self.assertEqual(asyncio.run(scenario()), 'answer')
+        self.assertEqual(flight.stats()['executed'], 1)
+
+    def test_waiting_process_reads_shared_result(self):
+        with tempfile.TemporaryDirectory() as lock_dir:
+            leader, follower = SingleFlight(lock_dir=lock_dir), SingleFlight(lock_dir=lock_dir)
+            started, release = threading.Event(), threading.Event()
+
+            def slow():
+                started.set()
+                release.wait(5)
+                return {'text': 'summary'}
+
+            t = threading.Thread(target=leader.do, args=('k', slow))
+            t.start()
+            started.wait(5)
+            threading.Timer(0.2, release.set).start()
+            # A second SingleFlight stands in for another worker process
+            self.assertEqual(follower.do('k', lambda: self.fail('should not run')), {'text': 'summary'})
+            t.join(5)
+            self.assertEqual(follower.stats()['coalesced_remote'], 1)
+            self.assertTrue(os.path.exists(os.path.join(lock_dir, 'k.json')))
+
+    def test_sweep_keeps_lock_files(self):
+        with tempfile.TemporaryDirectory() as lock_dir:
+            flight = SingleFlight(lock_dir=lock_dir, result_ttl=10)
+            flight.do('old', lambda: 'a')
+            expired = time.time() - 60
+            os.utime(os.path.join(lock_dir, 'old.json'), (expired, expired))
+            flight.do('new', lambda: 'b')
+            self.assertEqual(sorted(os.listdir(lock_dir)), ['new.json', 'new.lock', 'old.lock'])
+
+    @patch.object(ai_services.ollama, 'generate', return_value='Bullets')
+    def test_ollama_generate_keys_on_model_prompt_and_options(self, m_generate):
+        self.assertNotEqual(flight_key('m', 'p', 0.2), flight_key('m', 'p', 0.7))
+        self.assertEqual(ai_services.ollama_generate('Summarize'), 'Bullets')
+        m_generate.assert_called_once_with('Summarize', model=ai_services.OLLAMA_CHAT_MODEL, temperature=0.2)
+
+
+class StatsEndpointTest(TestCase):
+    @patch('ai.views.answer_cache', SemanticAnswerCache(''))
+    def test_staff_only(self):
+        User.objects.create_user(username='s@example.com', password='pass', is_staff=True)
+        User.objects.create_user(username='u@example.com', password='pass')
+        self.client.login(username='u@example.com', password='pass')
+        self.assertEqual(self.client.get(reverse('ai:stats')).status_code, 302)
+        self.client.login(username='s@example.com', password='pass')
+        data = self.client.get(reverse('ai:stats')).json()
+        self.assertIn('coalesced', data['generate_coalescing'])
@@ -0,0 +1,39 @@
+import math
+
+from django.test import SimpleTestCase
+
+from ai.ollama_client import CircuitBreaker, OllamaClient
+from ai.standin import StandinConfig, deterministic_vector, start_in_thread
+
+
+class StandinServerTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = start_in_thread(StandinConfig(latency=0, token_rate=0, tokens=5, dim=8, embed_latency=0))
+        host, port = cls.server.server_address[:2]
+        cls.ollama = OllamaClient(f'http://{host}:{port}', chat_model='m', embed_model='e', breaker=CircuitBreaker())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_vectors_are_deterministic_unit_vectors(self):
+        vec = deterministic_vector('hello', 8)
+        self.assertEqual(vec, deterministic_vector('hello', 8))
+        self.assertNotEqual(vec, deterministic_vector('hello!', 8))
+        self.assertAlmostEqual(math.sqrt(sum(v * v for v in vec)), 1.0)
+
+    def test_embeddings_match_between_endpoints(self):
+        single = self.ollama.embed('campus news')
+        batch = self.ollama.embed_batch(['campus news', 'projects'])
+        self.assertEqual(len(single), 8)
+        self.assertEqual(batch[0], single)
+
+    def test_generate_and_stream_agree(self):
+        answer = self.ollama.generate('Summarize today')
+        tokens = list(self.ollama.generate_stream('Summarize today'))
+        self.assertEqual(len(tokens), 5)
+        self.assertEqual(''.join(tokens).strip(), answer)
@@ -0,0 +1,160 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from django.test import SimpleTestCase
+from unittest.mock import patch
+
+from ai import ai_services
+from ai.vector_store import INDEXED_FIELDS, NumpyVectorStore, matches_where, np, where_mask
+
+
+class MatchesWhereTest(SimpleTestCase):
+    def test_operators(self):
+        meta = {'type': 'news', 'category': 'events', 'created_at': 100}
+        self.assertTrue(matches_where(meta, {'type': 'news'}))
+        self.assertTrue(matches_where(meta, {'category': {'$in': ['events', 'sports']}}))
+        self.assertTrue(matches_where(meta, {'$and': [{'created_at': {'$gte': 50}}, {'created_at': {'$lt': 150}}]}))
+        self.assertFalse(matches_where(meta, {'$or': [{'type': 'project'}, {'created_at': {'$gt': 100}}]}))
+        self.assertFalse(matches_where(meta, {'author_id': {'$gte': 1}}))
+
+
+@unittest.skipIf(np is None, 'numpy not installed')
+class NumpyVectorStoreTest(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = tmp.name
+        self.store = NumpyVectorStore(self.path)
+        self.store.upsert(
+            ids=['news:1#0', 'news:2#0', 'project:3#0'],
+            embeddings=[[1.0, 0.0], [0.6, 0.8], [0.0, 2.0]],
+            documents=['one', 'two', 'three'],
+            metadatas=[{'type': 'news'}, {'type': 'news'}, {'type': 'project'}],
+        )
+
+    def test_query_ranks_by_cosine_similarity(self):
+        res = self.store.query(query_embeddings=[[0.0, 1.0], [1.0, 0.0]], n_results=2)
+        self.assertEqual(res['ids'], [['project:3#0', 'news:2#0'], ['news:1#0', 'news:2#0']])
+        self.assertEqual(res['documents'][0], ['three', 'two'])
+        self.assertAlmostEqual(res['distances'][0][0], 0.0, places=5)
+
+    def test_query_applies_where_filter(self):
+        res = self.store.query(query_embeddings=[[0.0, 1.0]], n_results=5, where={'type': 'news'})
+        self.assertEqual(res['ids'][0], ['news:2#0', 'news:1#0'])
+
+    def test_column_mask_agrees_with_matches_where(self):
+        metas = [
+            {'type': 'news', 'category': 'events', 'created_at': 100},
+            {'type': 'news', 'category': 'sports', 'created_at': 200},
+            {'type': 'project', 'created_at': 150},
+            {'type': 'news'},
+        ]
+        self.store.upsert(ids=[f'm:{i}' for i in range(4)], embeddings=[[1.0, 1.0]] * 4, metadatas=metas)
+        wheres = [
+            {'type': 'news'},
+            {'$and': [{'type': 'news'}, {'created_at': {'$gte': 100}}, {'created_at': {'$lt': 200}}]},
+            {'$or': [{'category': {'$in': ['sports']}}, {'created_at': {'$lte': 150}}]},
+            {'category': {'$ne': 'events'}, 'type': {'$nin': ['project']}},
+            {'created_at': None},
+        ]
+        store = self.store
+        for where in wheres:
+            mask = where_mask(store._columns, where, len(store._live))
+            expected = [bool(alive) and matches_where(store._metadatas[r], where) for r, alive in enumerate(store._live)]
+            self.assertEqual(list(mask & store._live), expected, where)
+        # Fields without a column fall back to matches_where per row
+        self.assertIsNone(where_mask(store._columns, {'author_id': 1}, len(store._live)))
+        self.assertEqual(set(store._columns), set(INDEXED_FIELDS))
+        res = store.query(query_embeddings=[[1.0, 1.0]], n_results=10, where={'author_id': {'$in': [1]}})
+        self.assertEqual(res['ids'], [[]])
+
+    def test_scores_without_holding_the_lock(self):
+        store = self.store
+        store.count()
+        acquired = []
+
+        class Matrix:
+            # Stands in for the mapped matrix to check the lock during scoring
+            def __init__(self, matrix):
+                self.matrix = matrix
+
+            def __getattr__(self, name):
+                return getattr(self.matrix, name)
+
+            def __matmul__(self, other):
+                def try_lock():
+                    if store._lock.acquire(timeout=1):
+                        acquired.append(True)
+                        store._lock.release()
+                t = threading.Thread(target=try_lock)
+                t.start()
+                t.join(2)
+                return self.matrix @ other
+
+        store._matrix = Matrix(store._matrix)
+        res = store.query(query_embeddings=[[1.0, 0.0]], n_results=1, where={'type': 'news'})
+        self.assertEqual(res['ids'], [['news:1#0']])
+        self.assertEqual(acquired, [True])
+
+    def test_upsert_replaces_and_delete_frees_rows(self):
+        self.store.upsert(ids=['news:1#0'], embeddings=[[0.0, 1.0]], documents=['one v2'], metadatas=[{'type': 'news'}])
+        self.store.delete(ids=['project:3#0'])
+        self.assertEqual(self.store.count(), 2)
+        res = self.store.query(query_embeddings=[[0.0, 1.0]], n_results=1)
+        self.assertEqual((res['ids'][0], res['documents'][0]), (['news:1#0'], ['one v2']))
+        self.store.upsert(ids=['news:4#0'], embeddings=[[1.0, 1.0]], documents=['four'], metadatas=[{}])
+        self.assertEqual(self.store.count(), 3)
+        self.assertEqual(self.store.get(ids=['news:4#0'])['documents'], ['four'])
+
+    def test_other_instances_see_writes(self):
+        # A second handle on the same directory stands in for another worker
+        other = NumpyVectorStore(self.path)
+        self.assertEqual(other.count(), 3)
+        self.store.upsert(ids=[f'news:{i}#0' for i in range(10, 1100)], embeddings=[[1.0, 0.5]] * 1090)
+        self.store.delete(ids=['news:1#0'])
+        self.assertEqual(other.count(), 1092)
+        self.assertEqual(other.get(ids=['news:1#0', 'news:10#0'])['ids'], ['news:10#0'])
+
+    def test_compact_switches_matrix_and_rows_in_one_commit(self):
+        self.store.delete(ids=['news:1#0'])
+        store, conn = self.store, self.store._connection()
+
+        class FailingCommit:
+            # Stands in for the sidecar connection; the renumbering commit fails
+            def __getattr__(self, name):
+                return getattr(conn, name)
+
+            def commit(self):
+                raise sqlite3.OperationalError('disk I/O error')
+
+        store._conn = FailingCommit()
+        with self.assertRaises(sqlite3.OperationalError):
+            store.compact()
+        store._conn = conn
+        conn.rollback()
+        self.assertEqual(sorted(os.listdir(self.path)), sorted(['.lock', 'index.sqlite3', 'index.sqlite3-shm', 'index.sqlite3-wal', 'vectors.npy']))
+        for reader in (NumpyVectorStore(self.path), store):
+            res = reader.query(query_embeddings=[[0.0, 1.0]], n_results=2)
+            self.assertEqual((res['ids'][0], res['documents'][0]), (['project:3#0', 'news:2#0'], ['three', 'two']))
+        other = NumpyVectorStore(self.path)
+        other.count()
+        store.compact()
+        self.assertFalse(os.path.exists(os.path.join(self.path, 'vectors.npy')))
+        res = other.query(query_embeddings=[[0.0, 1.0]], n_results=2)
+        self.assertEqual((res['ids'][0], res['documents'][0]), (['project:3#0', 'news:2#0'], ['three', 'two']))
+        self.assertEqual(other._matrix.shape[0], 2)
+
+    def test_rejects_dimension_change(self):
+        with self.assertRaises(ValueError):
+            self.store.upsert(ids=['news:9#0'], embeddings=[[1.0, 0.0, 0.0]])
+        self.assertEqual(self.store.count(), 3)
+
+    def test_selected_by_backend_setting(self):
+        ai_services.reset_collection()
+        self.addCleanup(ai_services.reset_collection)
+        with patch('ai.ai_services.AI_VECTOR_BACKEND', 'numpy'), patch('ai.ai_services.AI_VECTOR_DIR', self.path):
+            coll = ai_services.get_collection()
+        self.assertIsInstance(coll, NumpyVectorStore)
+        self.assertEqual(coll.count(), 3)
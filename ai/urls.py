@@ -1,10 +1,21 @@
+import os
+
 from django.urls import path
 from . import views
 
 app_name = 'ai'
 
+# Async views under ASGI (mysite/asgi.py turns them on); the sync views keep
+# token-by-token streaming under WSGI servers and runserver
+if os.environ.get('AI_ASYNC_VIEWS', '0') == '1':
+    chat, summary, qa = views.chat_assistant_async, views.news_summary_today_async, views.news_qa_today_async
+else:
+    chat, summary, qa = views.chat_assistant, views.news_summary_today, views.news_qa_today
+
 urlpatterns = [
-    path('chat/', views.chat_assistant, name='chat'),
-    path('news/summary/today/', views.news_summary_today, name='news_summary_today'),
-    path('news/qa/today/', views.news_qa_today, name='news_qa_today'),
-]
\ No newline at end of file
+    path('chat/', chat, name='chat'),
+    path('news/summary/today/', summary, name='news_summary_today'),
+    path('news/qa/today/', qa, name='news_qa_today'),
+    path('stats/', views.ai_stats, name='stats'),
+    path('metrics/', views.ai_metrics, name='metrics'),
+]
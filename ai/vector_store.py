@@ -0,0 +1,452 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - numpy is installed alongside chromadb
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+# 'chroma' (PersistentClient) or 'numpy' (memory-mapped matrix, see NumpyVectorStore)
+AI_VECTOR_BACKEND = os.environ.get('AI_VECTOR_BACKEND', 'chroma')
+AI_VECTOR_DIR = os.environ.get('AI_VECTOR_DIR', '.vector_index')
+
+_OPERATORS = {
+    '$eq': lambda a, b: a == b,
+    '$ne': lambda a, b: a != b,
+    '$gt': lambda a, b: a is not None and a > b,
+    '$gte': lambda a, b: a is not None and a >= b,
+    '$lt': lambda a, b: a is not None and a < b,
+    '$lte': lambda a, b: a is not None and a <= b,
+    '$in': lambda a, b: a in b,
+    '$nin': lambda a, b: a not in b,
+}
+
+
+# Metadata fields kept as NumPy columns, so filtered queries build their row
+# mask with array comparisons instead of evaluating each row's metadata.
+# Numeric fields also support $gt/$gte/$lt/$lte; a missing value is NaN.
+INDEXED_FIELDS = ('type', 'category', 'created_at')
+NUMERIC_FIELDS = {'created_at'}
+
+_ORDERING = {'$gt': 'greater', '$gte': 'greater_equal', '$lt': 'less', '$lte': 'less_equal'}
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style metadata filter ({'field': value}, $in, $gte, $and, ...)."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == '$and':
+            if not all(matches_where(metadata, c) for c in cond):
+                return False
+        elif key == '$or':
+            if not any(matches_where(metadata, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = metadata.get(key)
+            if not all(_OPERATORS[op](value, arg) for op, arg in cond.items()):
+                return False
+        elif metadata.get(key) != cond:
+            return False
+    return True
+
+
+def _cell(field: str, metadata: Dict[str, Any]):
+    value = metadata.get(field)
+    if field not in NUMERIC_FIELDS:
+        return value
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+def _empty_column(field: str, size: int):
+    if field in NUMERIC_FIELDS:
+        return np.full(size, np.nan)
+    return np.full(size, None, dtype=object)
+
+
+def _equals(column, field: str, value):
+    if field not in NUMERIC_FIELDS:
+        return column == value
+    if value is None:
+        return np.isnan(column)
+    if isinstance(value, (int, float)):
+        return column == float(value)
+    return np.zeros(len(column), dtype=bool)
+
+
+def where_mask(columns: Dict[str, Any], where: Dict[str, Any], size: int):
+    """matches_where() for every row at once, from the indexed columns.
+
+    Returns None when `where` uses a field or operator the columns cannot
+    answer; the caller then falls back to matches_where() per row.
+    """
+    mask = np.ones(size, dtype=bool)
+    for key, cond in where.items():
+        if key in ('$and', '$or'):
+            parts = [where_mask(columns, c, size) for c in cond]
+            if any(p is None for p in parts):
+                return None
+            if key == '$and':
+                for part in parts:
+                    mask &= part
+            else:
+                mask &= np.logical_or.reduce(parts) if parts else np.zeros(size, dtype=bool)
+            continue
+        column = columns.get(key)
+        if column is None:
+            return None
+        for op, arg in (cond.items() if isinstance(cond, dict) else [('$eq', cond)]):
+            if op in _ORDERING:
+                if key not in NUMERIC_FIELDS or not isinstance(arg, (int, float)):
+                    return None
+                # NaN (missing) compares False, as None does in matches_where
+                mask &= getattr(np, _ORDERING[op])(column, arg)
+            elif op in ('$eq', '$ne'):
+                hit = _equals(column, key, arg)
+                mask &= hit if op == '$eq' else ~hit
+            elif op in ('$in', '$nin'):
+                hit = np.zeros(size, dtype=bool)
+                for value in arg:
+                    hit |= _equals(column, key, value)
+                mask &= hit if op == '$in' else ~hit
+            else:
+                return None
+    return mask
+
+
+class NumpyVectorStore:
+    """Vector store backed by a memory-mapped float32 matrix and a SQLite sidecar.
+
+    Implements the part of the Chroma collection API that ai_services uses
+    (upsert, get, delete, query, count), so it can stand in for the Chroma
+    collection. Embeddings are L2-normalized on write and searched with one
+    matrix product. `vectors.npy` is opened with mmap, so every worker process
+    reads the same page-cache pages instead of holding its own copy; ids,
+    documents and metadata live in `index.sqlite3` next to it.
+
+    Writers take an exclusive file lock and bump a version number; readers
+    reload the sidecar and remap the matrix when the version changes. The
+    sidecar also names the current matrix file, so compact() can renumber
+    rows and switch to a packed matrix in a single commit. Writers
+    replace the in-memory lists and arrays instead of mutating them, so a
+    query scores against a consistent snapshot without holding the lock.
+    """
+
+    def __init__(self, path: str = AI_VECTOR_DIR):
+        if np is None:
+            raise RuntimeError('NumPy not installed. Please install numpy to use AI_VECTOR_BACKEND=numpy.')
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.matrix_path = self._matrix_file(0)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._version = None
+        self._matrix = None
+        self._rows: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._documents: Dict[int, str] = {}
+        self._metadatas: Dict[int, Dict[str, Any]] = {}
+        self._live = None
+        self._columns: Dict[str, Any] = {}
+
+    # -- storage ---------------------------------------------------------
+
+    def _connection(self):
+        # Reopen after fork: SQLite handles must not be shared across processes
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(os.path.join(self.path, 'index.sqlite3'), check_same_thread=False, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS vectors ('
+                'row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, document TEXT NOT NULL, metadata TEXT NOT NULL)'
+            )
+            conn.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT OR IGNORE INTO state (key, value) VALUES ('version', 0)")
+            # Generation of the matrix file the rows refer to, see _matrix_file()
+            conn.execute("INSERT OR IGNORE INTO state (key, value) VALUES ('matrix', 0)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+            self._version = None
+        return self._conn
+
+    def _matrix_file(self, generation: int) -> str:
+        return os.path.join(self.path, 'vectors.npy' if generation == 0 else f'vectors.{generation}.npy')
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock, open(os.path.join(self.path, '.lock'), 'a+') as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                self._sync()
+                yield self._connection()
+            except BaseException:
+                # In-memory state may be half-updated; reload it on next use
+                self._version = None
+                raise
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _bump_version(self, conn):
+        # Called under the write lock after updating the in-memory state, so
+        # this process does not need to reload its own write
+        conn.execute("UPDATE state SET value = value + 1 WHERE key = 'version'")
+        conn.commit()
+        (self._version,) = conn.execute("SELECT value FROM state WHERE key = 'version'").fetchone()
+
+    def _sync(self):
+        """Reload ids/metadata and remap the matrix if another writer changed them."""
+        conn = self._connection()
+        (version,) = conn.execute("SELECT value FROM state WHERE key = 'version'").fetchone()
+        if version == self._version:
+            return
+        for attempt in range(3):
+            # Rows and the matrix file they index come from one snapshot
+            began = not conn.in_transaction
+            if began:
+                conn.execute('BEGIN')
+            try:
+                state = dict(conn.execute('SELECT key, value FROM state'))
+                rows, ids, documents, metadatas = {}, [], {}, {}
+                for row, doc_id, document, metadata in conn.execute('SELECT row, id, document, metadata FROM vectors'):
+                    rows[doc_id] = row
+                    documents[row] = document
+                    metadatas[row] = json.loads(metadata)
+            finally:
+                if began:
+                    conn.commit()
+            matrix_path = self._matrix_file(state['matrix'])
+            try:
+                matrix = np.load(matrix_path, mmap_mode='r')
+                break
+            except FileNotFoundError:
+                if not rows and state['matrix'] == 0:
+                    matrix = None  # nothing stored yet
+                    break
+                # A compact() committed since the snapshot and removed this file
+                if attempt == 2:
+                    raise
+        version = state['version']
+        capacity = 0 if matrix is None else matrix.shape[0]
+        ids = [None] * capacity
+        live = np.zeros(capacity, dtype=bool)
+        columns = {field: _empty_column(field, capacity) for field in INDEXED_FIELDS}
+        for doc_id, row in rows.items():
+            ids[row] = doc_id
+            live[row] = True
+            for field, column in columns.items():
+                column[row] = _cell(field, metadatas[row])
+        self._rows, self._ids, self._documents, self._metadatas = rows, ids, documents, metadatas
+        self._matrix, self._live, self._columns, self._version = matrix, live, columns, version
+        self.matrix_path = matrix_path
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        # Grow by doubling into a new file and swap it in atomically; readers
+        # still mapping the old file keep working until they resync
+        current = self._matrix
+        if current is not None and current.shape[1] != dim:
+            raise ValueError(f'Embedding dimension {dim} does not match stored dimension {current.shape[1]}')
+        capacity = 0 if current is None else current.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        tmp = self.matrix_path + '.tmp'
+        grown = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(new_capacity, dim))
+        if capacity:
+            grown[:capacity] = current
+        grown.flush()
+        del grown
+        os.replace(tmp, self.matrix_path)
+        self._matrix = np.load(self.matrix_path, mmap_mode='r')
+        grow = new_capacity - capacity
+        self._ids = self._ids + [None] * grow
+        self._live = np.concatenate([self._live, np.zeros(grow, dtype=bool)])
+        self._columns = {f: np.concatenate([c, _empty_column(f, grow)]) for f, c in self._columns.items()}
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # -- Chroma collection API ------------------------------------------
+
+    def count(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._rows)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        ids = [str(i) for i in ids]
+        documents = documents or [''] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        vectors = self._normalize(embeddings)
+        with self._write_lock() as conn:
+            free = [r for r, doc_id in enumerate(self._ids) if doc_id is None]
+            next_row = len(self._ids)
+            rows = dict(self._rows)
+            targets = []
+            for doc_id in ids:
+                row = rows.get(doc_id)
+                if row is None:
+                    if free:
+                        row = free.pop(0)
+                    else:
+                        row, next_row = next_row, next_row + 1
+                    rows[doc_id] = row
+                targets.append(row)
+            self._ensure_capacity(max(targets) + 1, vectors.shape[1])
+            writable = np.load(self.matrix_path, mmap_mode='r+')
+            writable[targets] = vectors
+            writable.flush()
+            del writable
+            conn.executemany(
+                'INSERT OR REPLACE INTO vectors (row, id, document, metadata) VALUES (?, ?, ?, ?)',
+                [(row, doc_id, doc, json.dumps(meta or {})) for row, doc_id, doc, meta in zip(targets, ids, documents, metadatas)],
+            )
+            state = self._copy_state()
+            for row, doc_id, doc, meta in zip(targets, ids, documents, metadatas):
+                self._set_row(state, row, doc_id, doc, dict(meta or {}))
+            self._rows = rows
+            self._publish(state)
+            self._bump_version(conn)
+
+    def delete(self, ids=None, where=None):
+        with self._write_lock() as conn:
+            doomed = self.get(ids=ids, where=where, include=[], _synced=True)['ids']
+            if not doomed:
+                return
+            conn.executemany('DELETE FROM vectors WHERE id = ?', [(i,) for i in doomed])
+            rows = dict(self._rows)
+            state = self._copy_state()
+            for doc_id in doomed:
+                self._set_row(state, rows.pop(doc_id), None, None, None)
+            self._rows = rows
+            self._publish(state)
+            self._bump_version(conn)
+
+    def _copy_state(self):
+        return {
+            'ids': list(self._ids), 'documents': dict(self._documents), 'metadatas': dict(self._metadatas),
+            'live': self._live.copy(), 'columns': {f: c.copy() for f, c in self._columns.items()},
+        }
+
+    @staticmethod
+    def _set_row(state, row: int, doc_id, document, metadata):
+        # doc_id None frees the row
+        state['ids'][row] = doc_id
+        state['live'][row] = doc_id is not None
+        if doc_id is None:
+            state['documents'].pop(row, None)
+            state['metadatas'].pop(row, None)
+        else:
+            state['documents'][row] = document
+            state['metadatas'][row] = metadata
+        for field, column in state['columns'].items():
+            column[row] = _cell(field, metadata or {})
+
+    def _publish(self, state):
+        self._ids, self._documents, self._metadatas = state['ids'], state['documents'], state['metadatas']
+        self._live, self._columns = state['live'], state['columns']
+
+    def get(self, ids=None, where=None, include=('documents', 'metadatas'), limit=None, offset=None, _synced=False):
+        with self._lock:
+            if not _synced:
+                self._sync()
+            if ids is not None:
+                rows = [(str(i), self._rows[str(i)]) for i in ids if str(i) in self._rows]
+            else:
+                rows = sorted(self._rows.items(), key=lambda kv: kv[1])
+            rows = [(doc_id, row) for doc_id, row in rows if matches_where(self._metadatas[row], where)]
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            result = {'ids': [doc_id for doc_id, _ in rows]}
+            if 'documents' in include:
+                result['documents'] = [self._documents[row] for _, row in rows]
+            if 'metadatas' in include:
+                result['metadatas'] = [self._metadatas[row] for _, row in rows]
+            if 'embeddings' in include:
+                result['embeddings'] = [self._matrix[row].tolist() for _, row in rows]
+            return result
+
+    def compact(self):
+        """Rewrite the matrix without free rows and vacuum the sidecar."""
+        with self._write_lock() as conn:
+            live = sorted(self._rows.items(), key=lambda kv: kv[1])
+            if self._matrix is None or len(live) == self._matrix.shape[0]:
+                return
+            dim = self._matrix.shape[1]
+            (generation,) = conn.execute("SELECT value FROM state WHERE key = 'matrix'").fetchone()
+            # Packed into a new file that no reader uses until the commit
+            # below names it together with the renumbered rows
+            packed_path = self._matrix_file(generation + 1)
+            packed = np.lib.format.open_memmap(packed_path, mode='w+', dtype=np.float32, shape=(max(len(live), 1), dim))
+            if live:
+                packed[:len(live)] = self._matrix[[row for _, row in live]]
+            packed.flush()
+            del packed
+            try:
+                # Ascending order: each new row number is free by the time it is assigned
+                conn.executemany('UPDATE vectors SET row = ? WHERE id = ?', [(new, doc_id) for new, (doc_id, _) in enumerate(live)])
+                conn.execute("UPDATE state SET value = ? WHERE key = 'matrix'", (generation + 1,))
+                conn.execute("UPDATE state SET value = value + 1 WHERE key = 'version'")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                os.remove(packed_path)
+                raise
+            # Processes still mapping the old file keep their mapping
+            os.remove(self._matrix_file(generation))
+            conn.execute('VACUUM')
+
+    def query(self, query_embeddings, n_results=10, where=None, include=('documents', 'metadatas', 'distances')):
+        queries = self._normalize(query_embeddings)
+        # Writers publish new objects rather than mutating these, so the
+        # filtering and scoring below run without the lock
+        with self._lock:
+            self._sync()
+            matrix, live, columns = self._matrix, self._live, self._columns
+            ids, documents, metadatas = self._ids, self._documents, self._metadatas
+        empty = {'ids': [[] for _ in queries], 'documents': [[] for _ in queries],
+                 'metadatas': [[] for _ in queries], 'distances': [[] for _ in queries]}
+        if matrix is None or not documents:
+            return empty
+        if where:
+            mask = where_mask(columns, where, len(live))
+            if mask is None:
+                mask = np.array([bool(alive) and matches_where(metadatas[row], where) for row, alive in enumerate(live)], dtype=bool)
+            live = live & mask
+        candidates = int(live.sum())
+        if not candidates:
+            return empty
+        k = min(n_results, candidates)
+        # One (rows x queries) product for the whole batch of queries
+        scores = matrix @ queries.T
+        scores[~live] = -np.inf
+        result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        for q in range(scores.shape[1]):
+            column = scores[:, q]
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top])]
+            result['ids'].append([ids[r] for r in top])
+            result['documents'].append([documents[int(r)] for r in top])
+            result['metadatas'].append([metadatas[int(r)] for r in top])
+            # Cosine distance, so smaller is closer as with Chroma
+            result['distances'].append([float(1.0 - column[r]) for r in top])
+        return result
@@ -1,69 +1,237 @@
+import hmac
+import json
 from datetime import date
-from django.http import JsonResponse, HttpResponseBadRequest
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.utils import timezone
 
-from news.models import NewsPost
-from .ai_services import query_similar, ollama_generate
+from .answer_cache import answer_cache
+from .metrics import AI_METRICS_TOKEN, instrument_view, registry as metrics_registry
+from .models import DailySummary
+from .summaries import posts_for_day, schedule_summary_refresh, refresh_pending, arefresh_pending
+from .ai_services import (
+    query_similar, ollama_generate, ollama_generate_stream, build_chat_prompt,
+    build_news_qa_prompt, retrieve_news_for_day, lookup_answer, remember_answer, OllamaUnavailable,
+    generate_flight,
+    aquery_similar, aollama_generate, aollama_generate_stream, aretrieve_news_for_day,
+    alookup_answer, aremember_answer,
+)
+
+
+def wants_stream(request) -> bool:
+    return request.POST.get('stream') == '1' or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+
+def ndjson_stream(tokens, on_complete=None, **meta):
+    # One JSON object per line: a meta line, then tokens, then done (or error)
+    yield json.dumps({'type': 'meta', **meta}) + '\n'
+    parts = []
+    try:
+        for token in tokens:
+            parts.append(token)
+            yield json.dumps({'type': 'token', 'text': token}) + '\n'
+    except Exception as e:
+        yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+        return
+    if on_complete is not None:
+        on_complete(''.join(parts))
+    yield json.dumps({'type': 'done'}) + '\n'
+
+
+async def andjson_stream(tokens, on_complete=None, **meta):
+    # ndjson_stream over an async token iterator; on_complete is awaited
+    yield json.dumps({'type': 'meta', **meta}) + '\n'
+    parts = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield json.dumps({'type': 'token', 'text': token}) + '\n'
+    except Exception as e:
+        yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+        return
+    if on_complete is not None:
+        await on_complete(''.join(parts))
+    yield json.dumps({'type': 'done'}) + '\n'
+
+
+def streaming_response(tokens, on_complete=None, **meta):
+    if hasattr(tokens, '__aiter__'):
+        content = andjson_stream(tokens, on_complete, **meta)
+    else:
+        content = ndjson_stream(tokens, on_complete, **meta)
+    response = StreamingHttpResponse(content, content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @require_POST
 @login_required
+@instrument_view
 def chat_assistant(request):
     question = (request.POST.get('q') or '').strip()
     if not question:
         return HttpResponseBadRequest('Missing q')
-    retrieved = query_similar(question, n=6)
-    context_blocks = []
-    for r in retrieved:
-        meta = r.get('metadata') or {}
-        prefix = 'News' if meta.get('type') == 'news' else 'Project'
-        context_blocks.append(f"[{prefix}] {meta.get('title','')}\n{r.get('text','')}")
-    context_text = "\n\n".join(context_blocks) if context_blocks else "No context found."
-    prompt = (
-        "You are a helpful university assistant. Use the provided context to answer the user's question accurately.\n"
-        f"Context:\n{context_text}\n\n"
-        f"Question: {question}\n"
-        "Answer concisely and cite whether info came from News or Projects when relevant."
-    )
-    answer = ollama_generate(prompt)
-    return JsonResponse({'answer': answer, 'used_context': len(context_blocks)})
+    try:
+        hit = lookup_answer(question)
+        retrieved = query_similar(question, n=6) if hit is None else []
+    except OllamaUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    if hit is not None:
+        if wants_stream(request):
+            return streaming_response(iter([hit['answer']]), used_context=hit['used_context'], cached=True)
+        return JsonResponse({'answer': hit['answer'], 'used_context': hit['used_context'], 'cached': True})
+    prompt = build_chat_prompt(question, retrieved)
+    if wants_stream(request):
+        return streaming_response(
+            ollama_generate_stream(prompt),
+            on_complete=lambda answer: remember_answer(question, answer, retrieved),
+            used_context=len(retrieved),
+            cached=False,
+        )
+    try:
+        answer = ollama_generate(prompt)
+    except OllamaUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    remember_answer(question, answer, retrieved)
+    return JsonResponse({'answer': answer, 'used_context': len(retrieved), 'cached': False})
 
 
 @login_required
+@instrument_view
 def news_summary_today(request):
+    # Served from the stored summary; the job worker regenerates it when
+    # today's posts change (see ai.summaries)
     today = timezone.localdate()
-    posts = NewsPost.objects.filter(created_at__date=today).order_by('-created_at')
-    if not posts.exists():
-        return JsonResponse({'summary': 'No news published today.'})
-    joined = "\n\n".join([f"- {p.title}: {p.content}" for p in posts])
-    prompt = (
-        "Summarize today's university news into 4-6 bullet points that capture key updates.\n"
-        f"Today's items:\n{joined}\n"
-        "Provide a student-friendly, factual summary."
-    )
-    summary = ollama_generate(prompt)
-    return JsonResponse({'summary': summary, 'count': posts.count()})
+    stored = DailySummary.objects.filter(date=today).first()
+    if stored is None:
+        if not posts_for_day(today).exists():
+            return JsonResponse({'summary': 'No news published today.'})
+        schedule_summary_refresh(today, delay=0)
+        return JsonResponse({'summary': "Today's summary is being prepared. Please check back shortly.", 'pending': True})
+    return JsonResponse({
+        'summary': stored.summary,
+        'count': stored.post_count,
+        'generated_at': stored.generated_at.isoformat(),
+        'refreshing': refresh_pending(today),
+    })
 
 
 @require_POST
 @login_required
+@instrument_view
 def news_qa_today(request):
     question = (request.POST.get('q') or '').strip()
     if not question:
         return HttpResponseBadRequest('Missing q')
     today = timezone.localdate()
-    posts = NewsPost.objects.filter(created_at__date=today).order_by('-created_at')
-    if not posts.exists():
+    count = posts_for_day(today).count()
+    if not count:
+        return JsonResponse({'answer': 'No news published today.', 'count': 0})
+    try:
+        # Only the day's most relevant posts go into the prompt
+        retrieved = retrieve_news_for_day(question, today)
+        answer = ollama_generate(build_news_qa_prompt(question, retrieved, count))
+    except OllamaUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    return JsonResponse({'answer': answer, 'count': count, 'used_context': len(retrieved)})
+
+
+@staff_member_required
+def ai_stats(request):
+    # Counters for this worker process only
+    return JsonResponse({
+        'generate_coalescing': generate_flight.stats(),
+        'answer_cache': answer_cache.stats(),
+        'calls': metrics_registry.summary(),
+    })
+
+
+def ai_metrics(request):
+    # Prometheus text format; staff, or a scraper sending AI_METRICS_TOKEN
+    auth = request.headers.get('Authorization', '')
+    token_ok = bool(AI_METRICS_TOKEN) and hmac.compare_digest(auth, f'Bearer {AI_METRICS_TOKEN}')
+    if not token_ok and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Async versions of the views above, routed when AI_ASYNC_VIEWS=1 (the
+# default under mysite/asgi.py). Waiting on Ollama suspends a coroutine
+# instead of holding a worker thread.
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+@require_POST
+@login_required
+@instrument_view
+async def chat_assistant_async(request):
+    question = (request.POST.get('q') or '').strip()
+    if not question:
+        return HttpResponseBadRequest('Missing q')
+    try:
+        hit = await alookup_answer(question)
+        retrieved = await aquery_similar(question, n=6) if hit is None else []
+    except OllamaUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    if hit is not None:
+        if wants_stream(request):
+            return streaming_response(_aiter([hit['answer']]), used_context=hit['used_context'], cached=True)
+        return JsonResponse({'answer': hit['answer'], 'used_context': hit['used_context'], 'cached': True})
+    prompt = build_chat_prompt(question, retrieved)
+    if wants_stream(request):
+        return streaming_response(
+            aollama_generate_stream(prompt),
+            on_complete=lambda answer: aremember_answer(question, answer, retrieved),
+            used_context=len(retrieved),
+            cached=False,
+        )
+    try:
+        answer = await aollama_generate(prompt)
+    except OllamaUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    await aremember_answer(question, answer, retrieved)
+    return JsonResponse({'answer': answer, 'used_context': len(retrieved), 'cached': False})
+
+
+@login_required
+@instrument_view
+async def news_summary_today_async(request):
+    today = timezone.localdate()
+    stored = await DailySummary.objects.filter(date=today).afirst()
+    if stored is None:
+        if not await posts_for_day(today).aexists():
+            return JsonResponse({'summary': 'No news published today.'})
+        await sync_to_async(schedule_summary_refresh)(today, delay=0)
+        return JsonResponse({'summary': "Today's summary is being prepared. Please check back shortly.", 'pending': True})
+    return JsonResponse({
+        'summary': stored.summary,
+        'count': stored.post_count,
+        'generated_at': stored.generated_at.isoformat(),
+        'refreshing': await arefresh_pending(today),
+    })
+
+
+@require_POST
+@login_required
+@instrument_view
+async def news_qa_today_async(request):
+    question = (request.POST.get('q') or '').strip()
+    if not question:
+        return HttpResponseBadRequest('Missing q')
+    today = timezone.localdate()
+    count = await posts_for_day(today).acount()
+    if not count:
         return JsonResponse({'answer': 'No news published today.', 'count': 0})
-    joined = "\n\n".join([f"- {p.title}: {p.content}" for p in posts])
-    prompt = (
-        "You are a helpful university assistant. Using ONLY the provided items from today's news, answer the user's question precisely.\n"
-        "If the user asks for a count, respond with the number first, followed by a short explanation.\n"
-        f"Today's items:\n{joined}\n\n"
-        f"Question: {question}\n"
-        "Answer:"
-    )
-    answer = ollama_generate(prompt)
-    return JsonResponse({'answer': answer, 'count': posts.count()})
\ No newline at end of file
+    try:
+        retrieved = await aretrieve_news_for_day(question, today)
+        answer = await aollama_generate(build_news_qa_prompt(question, retrieved, count))
+    except OllamaUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    return JsonResponse({'answer': answer, 'count': count, 'used_context': len(retrieved)})
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+	list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'locked_by', 'created_at')
+	list_filter = ('status', 'name')
+	search_fields = ('name', 'unique_key', 'last_error')
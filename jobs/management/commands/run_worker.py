@@ -0,0 +1,64 @@
+import logging
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from jobs.queue import claim, run_job, worker_id, JOBS_VISIBILITY_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Process background jobs with N worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2, help='Number of worker threads (default 2).')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--visibility-timeout', type=int, default=JOBS_VISIBILITY_TIMEOUT, help='Seconds before a running job is handed to another worker.')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty instead of polling forever.')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        threads = [
+            threading.Thread(target=self.work, args=(options,), name=f'job-worker-{i}', daemon=True)
+            for i in range(max(1, options['threads']))
+        ]
+        self.stdout.write(self.style.WARNING(f'Starting {len(threads)} worker thread(s)...'))
+        for t in threads:
+            t.start()
+        try:
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Stopping workers after current jobs...'))
+            self.stop.set()
+            for t in threads:
+                t.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
+
+    def work(self, options):
+        me = worker_id()
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    job = claim(me, visibility_timeout=options['visibility_timeout'])
+                    if job is None:
+                        if options['burst']:
+                            return
+                        self.stop.wait(options['poll_interval'])
+                        continue
+                    started = time.monotonic()
+                    ok = run_job(job)
+                    status = 'done' if ok else job.status
+                    self.stdout.write(f'[{me}] {job.name}#{job.id} {status} in {time.monotonic() - started:.2f}s')
+                except Exception:
+                    # e.g. "database is locked": keep this worker alive and try again
+                    logger.exception('Worker %s failed to claim or run a job', me)
+                    close_old_connections()
+                    self.stop.wait(options['poll_interval'])
+        finally:
+            connection.close()
@@ -0,0 +1,34 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+	STATUS_CHOICES = [
+		('queued', 'Queued'),
+		('running', 'Running'),
+		('done', 'Done'),
+		('failed', 'Failed'),
+	]
+	name = models.CharField(max_length=100)
+	payload = models.JSONField(default=dict, blank=True)
+	# Optional key: enqueueing a job whose key is already queued is a no-op
+	unique_key = models.CharField(max_length=200, blank=True, db_index=True)
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+	attempts = models.PositiveIntegerField(default=0)
+	max_attempts = models.PositiveIntegerField(default=5)
+	run_at = models.DateTimeField(default=timezone.now)
+	# Visibility timeout: a running job whose lock expired is picked up again
+	locked_until = models.DateTimeField(null=True, blank=True)
+	locked_by = models.CharField(max_length=100, blank=True)
+	last_error = models.TextField(blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		ordering = ['run_at', 'id']
+		indexes = [
+			models.Index(fields=['status', 'run_at']),
+		]
+
+	def __str__(self):
+		return f"{self.name}#{self.id} ({self.status})"
@@ -0,0 +1,140 @@
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOBS_VISIBILITY_TIMEOUT = int(os.environ.get('JOBS_VISIBILITY_TIMEOUT', '300'))
+JOBS_RETRY_BASE_DELAY = float(os.environ.get('JOBS_RETRY_BASE_DELAY', '5'))
+JOBS_RETRY_MAX_DELAY = float(os.environ.get('JOBS_RETRY_MAX_DELAY', '600'))
+
+_handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+
+
+def task(name: str):
+	"""Register a handler for jobs called `name`. Handlers receive the payload dict."""
+	def decorator(fn):
+		_handlers[name] = fn
+		return fn
+	return decorator
+
+
+def get_handler(name: str):
+	return _handlers.get(name)
+
+
+def enqueue(name: str, payload: Optional[Dict[str, Any]] = None, unique_key: str = '', delay: float = 0, max_attempts: int = 5) -> Job:
+	"""Insert a job row. The row commits with the caller's transaction, if any.
+
+	With `unique_key`, an already-queued job with the same key absorbs this
+	one; it is only moved earlier if this call asked for an earlier run.
+	"""
+	run_at = timezone.now() + timedelta(seconds=delay)
+	if unique_key:
+		existing = Job.objects.filter(unique_key=unique_key, status='queued').first()
+		if existing is not None:
+			if run_at < existing.run_at:
+				Job.objects.filter(id=existing.id, status='queued').update(run_at=run_at)
+				existing.run_at = run_at
+			return existing
+	return Job.objects.create(
+		name=name,
+		payload=payload or {},
+		unique_key=unique_key,
+		max_attempts=max_attempts,
+		run_at=run_at,
+	)
+
+
+def worker_id() -> str:
+	return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _claimable(now):
+	return Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+
+
+def claim(worker: str, visibility_timeout: int = JOBS_VISIBILITY_TIMEOUT) -> Optional[Job]:
+	"""Atomically lock the next due job for `worker`.
+
+	Uses a conditional UPDATE instead of SELECT ... FOR UPDATE so it works on
+	SQLite; a worker that loses the race simply tries the next candidate.
+	Attempts are counted at claim time so a job that keeps killing its worker
+	still runs out of retries.
+	"""
+	now = timezone.now()
+	candidates = Job.objects.filter(_claimable(now)).order_by('run_at', 'id').values_list('id', flat=True)[:10]
+	for job_id in candidates:
+		locked = Job.objects.filter(_claimable(now), id=job_id).update(
+			status='running',
+			attempts=F('attempts') + 1,
+			locked_by=worker,
+			locked_until=now + timedelta(seconds=visibility_timeout),
+			updated_at=now,
+		)
+		if not locked:
+			continue
+		job = Job.objects.get(id=job_id)
+		if job.attempts > job.max_attempts:
+			job.status = 'failed'
+			job.last_error = job.last_error or 'Visibility timeout expired on every attempt'
+			job.save(update_fields=['status', 'last_error', 'updated_at'])
+			continue
+		return job
+	return None
+
+
+def retry_delay(attempts: int) -> float:
+	delay = min(JOBS_RETRY_BASE_DELAY * (2 ** max(0, attempts - 1)), JOBS_RETRY_MAX_DELAY)
+	return delay * random.uniform(0.5, 1.5)
+
+
+def run_job(job: Job) -> bool:
+	"""Run a claimed job and record the outcome. Returns True on success."""
+	handler = get_handler(job.name)
+	try:
+		if handler is None:
+			raise LookupError(f"No handler registered for job '{job.name}'")
+		handler(job.payload)
+	except Exception as e:
+		job.last_error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+		job.locked_by = ''
+		job.locked_until = None
+		if handler is None or job.attempts >= job.max_attempts:
+			job.status = 'failed'
+			logger.error("Job %s failed permanently: %s", job, job.last_error)
+		else:
+			job.status = 'queued'
+			job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+			logger.warning("Job %s failed (attempt %s/%s), retrying: %s", job, job.attempts, job.max_attempts, job.last_error)
+		job.save(update_fields=['status', 'run_at', 'locked_by', 'locked_until', 'last_error', 'updated_at'])
+		return False
+	job.status = 'done'
+	job.locked_by = ''
+	job.locked_until = None
+	job.last_error = ''
+	job.save(update_fields=['status', 'locked_by', 'locked_until', 'last_error', 'updated_at'])
+	return True
+
+
+def run_pending(limit: Optional[int] = None, worker: Optional[str] = None) -> int:
+	"""Run due jobs in the current thread until none are left. Returns the count run."""
+	worker = worker or worker_id()
+	count = 0
+	while limit is None or count < limit:
+		job = claim(worker)
+		if job is None:
+			break
+		run_job(job)
+		count += 1
+	return count
@@ -0,0 +1,91 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import task, enqueue, claim, run_job, run_pending
+from news.models import NewsPost
+
+
+calls = []
+
+
+@task('tests.record')
+def record(payload):
+    calls.append(payload)
+
+
+@task('tests.boom')
+def boom(payload):
+    raise ValueError('boom')
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_run_pending_runs_handler(self):
+        enqueue('tests.record', {'n': 1})
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [{'n': 1}])
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    def test_unique_key_collapses_queued_jobs(self):
+        a = enqueue('tests.record', {'n': 1}, unique_key='k')
+        b = enqueue('tests.record', {'n': 2}, unique_key='k')
+        self.assertEqual(a.id, b.id)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_failure_is_retried_with_backoff_then_fails(self):
+        enqueue('tests.boom', max_attempts=2)
+        job = claim('w')
+        self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+        # Not due yet
+        self.assertIsNone(claim('w'))
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        run_job(claim('w'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 2)
+
+    def test_expired_visibility_timeout_is_reclaimed(self):
+        enqueue('tests.record')
+        job = claim('w1', visibility_timeout=60)
+        self.assertIsNone(claim('w2'))
+        Job.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        again = claim('w2')
+        self.assertEqual(again.id, job.id)
+        self.assertEqual(again.locked_by, 'w2')
+
+    def test_post_save_enqueues_indexing_instead_of_embedding(self):
+        user = User.objects.create_user(username='a@example.com', password='pass')
+        with patch('ai.tasks.add_documents') as m_add:
+            post = NewsPost.objects.create(title='T', category='events', content='C', author=user)
+            post.save()
+            self.assertFalse(m_add.called)
+            self.assertEqual(Job.objects.filter(name='ai.index_news').count(), 1)
+            run_pending()
+        self.assertEqual(m_add.call_args[0][0][0]['id'], f'news:{post.id}')
+
+    def test_worker_survives_transient_errors(self):
+        failures = [OperationalError('database is locked')]
+
+        def flaky_claim(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return None
+
+        with patch('jobs.management.commands.run_worker.claim', side_effect=flaky_claim) as m_claim, \
+                self.assertLogs('jobs.management.commands.run_worker', 'ERROR'):
+            call_command('run_worker', '--threads', '1', '--burst', '--poll-interval', '0', stdout=StringIO())
+        self.assertEqual(m_claim.call_count, 2)
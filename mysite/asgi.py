@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+# Route the AI endpoints to their async views (see ai/urls.py)
+os.environ.setdefault('AI_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'premitive',
     'news',
     'projects',
+    'jobs',
     'ai',
 ]
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class NewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'news'
+
+    def ready(self):
+        # Engagement counter receivers
+        from . import signals  # noqa: F401
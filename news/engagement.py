@@ -0,0 +1,324 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from premitive.models import Notification
+from .models import NewsLike, NewsPost, NewsShare, Poll, PollVote
+
+logger = logging.getLogger(__name__)
+
+# Milliseconds between flushes of buffered likes, shares and poll votes; 0
+# writes each click through immediately. Buffered clicks live in the worker
+# process until flushed: other workers see them one interval later and a
+# crash loses at most one interval of clicks
+NEWS_ENGAGEMENT_FLUSH_MS = float(os.environ.get('NEWS_ENGAGEMENT_FLUSH_MS', '0'))
+# A request that finds this many clicks pending flushes them itself
+NEWS_ENGAGEMENT_MAX_PENDING = int(os.environ.get('NEWS_ENGAGEMENT_MAX_PENDING', '5000'))
+# A batch that keeps failing is dropped after this many attempts
+FLUSH_ATTEMPTS = 3
+
+
+class Batch:
+	"""Clicks recorded since the last flush, coalesced per (object, user)."""
+
+	def __init__(self):
+		self.likes = {}  # (post_id, user_id) -> liked
+		self.shares = []  # (post_id, user_id)
+		self.votes = {}  # (poll_id, user_id) -> option_index
+		self.notify = {}  # (post_id, user_id) -> Notification for a new like
+		# What readers add to the stored numbers until the batch is written
+		self.counts = defaultdict(Counter)  # post_id -> {counter field: delta}
+		self.tallies = defaultdict(Counter)  # poll_id -> {option_index: delta}
+		self.attempts = 0
+
+	def __len__(self):
+		return len(self.likes) + len(self.shares) + len(self.votes)
+
+
+class EngagementBuffer:
+	"""Write-behind buffer for likes, shares and poll votes.
+
+	Clicks are answered from memory and written by a background thread in
+	one transaction per `interval` seconds, however many arrived: bulk
+	inserts, and one counter UPDATE per touched post or poll. `interval=0`
+	writes each click straight through (see like_now() and friends); `None`
+	only writes when flush() is called.
+	Readers merge the unwritten deltas with merge_posts() / merge_polls().
+	"""
+
+	def __init__(self, interval=0.0, max_pending=NEWS_ENGAGEMENT_MAX_PENDING):
+		self.interval = interval
+		self.max_pending = max_pending
+		self._lock = threading.Lock()
+		self._flush_lock = threading.Lock()
+		self._pending = Batch()
+		self._inflight = None  # taken by flush(), visible to readers until committed
+		self._thread = None
+
+	def _batches(self):
+		return [b for b in (self._inflight, self._pending) if b is not None]
+
+	def _state(self, attr, key):
+		# Newest recorded value for `key`, or None when only the database knows
+		with self._lock:
+			for batch in reversed(self._batches()):
+				if key in getattr(batch, attr):
+					return getattr(batch, attr)[key]
+		return None
+
+	def toggle_like(self, post, user):
+		"""Flip `user`'s like on `post`; returns whether it is now liked."""
+		if self.interval == 0:
+			return like_now(post, user)
+		key = (post.id, user.id)
+		liked = self._state('likes', key)
+		if liked is None:
+			liked = NewsLike.objects.filter(post_id=post.id, user_id=user.id).exists()
+		with self._record() as batch:
+			batch.likes[key] = not liked
+			batch.counts[post.id]['likes_count'] += -1 if liked else 1
+			if not liked and post.author_id != user.id:
+				batch.notify[key] = like_notification(post, user)
+		return not liked
+
+	def share(self, post, user):
+		if self.interval == 0:
+			share_now(post, user)
+			return
+		with self._record() as batch:
+			batch.shares.append((post.id, user.id))
+			batch.counts[post.id]['shares_count'] += 1
+
+	def vote(self, poll, user, option_index):
+		"""Record `user`'s vote, replacing any earlier one on `poll`."""
+		if self.interval == 0:
+			vote_now(poll, user, option_index)
+			return
+		key = (poll.id, user.id)
+		previous = self._state('votes', key)
+		if previous is None:
+			previous = PollVote.objects.filter(poll_id=poll.id, user_id=user.id).values_list('option_index', flat=True).first()
+		if previous == option_index:
+			return
+		with self._record() as batch:
+			batch.votes[key] = option_index
+			tally = batch.tallies[poll.id]
+			if previous is not None:
+				tally[previous] -= 1
+			tally[option_index] += 1
+
+	@contextmanager
+	def _record(self):
+		"""Yield the pending batch to record one click in, then schedule its flush."""
+		with self._lock:
+			yield self._pending
+			full = len(self._pending) >= self.max_pending
+		if full:
+			# The click is already buffered; a failed flush is retried by the thread
+			try:
+				self.flush()
+			except Exception:
+				logger.exception('Flushing buffered news clicks failed')
+		elif self.interval and self._thread is None:
+			self._start()
+
+	def pending_count(self, post_id, field):
+		with self._lock:
+			return sum(b.counts[post_id][field] for b in self._batches() if post_id in b.counts)
+
+	def merge_posts(self, posts):
+		"""Add unwritten likes and shares to the posts' counters.
+
+		Posts with pending clicks get `pending = True`, which keeps their card
+		out of the shared fragment cache until the clicks are written.
+		"""
+		with self._lock:
+			batches = self._batches()
+			for post in posts:
+				deltas = Counter()
+				for batch in batches:
+					deltas.update(batch.counts.get(post.id, {}))
+				if deltas:
+					post.pending = True
+					for field, n in deltas.items():
+						setattr(post, field, max(0, getattr(post, field) + n))
+		return posts
+
+	def merge_polls(self, polls, user):
+		"""Attach unwritten votes as `pending_votes` and apply the viewer's own."""
+		with self._lock:
+			batches = self._batches()
+			for poll in polls:
+				tally = Counter()
+				for batch in batches:
+					tally.update(batch.tallies.get(poll.id, {}))
+					if (poll.id, user.id) in batch.votes:
+						poll.user_choice = batch.votes[(poll.id, user.id)]
+				if tally:
+					poll.pending = True
+					poll.pending_votes = tally
+		return polls
+
+	def flush(self):
+		"""Write the recorded clicks in one transaction; returns how many were written."""
+		with self._flush_lock:
+			with self._lock:
+				if self._inflight is None:
+					if not self._pending:
+						return 0
+					self._inflight, self._pending = self._pending, Batch()
+				batch = self._inflight
+			try:
+				with transaction.atomic():
+					write_batch(batch)
+			except Exception:
+				batch.attempts += 1
+				if batch.attempts >= FLUSH_ATTEMPTS:
+					logger.error('Dropping %d buffered news clicks after %d failed flushes', len(batch), batch.attempts)
+					with self._lock:
+						self._inflight = None
+				raise
+			with self._lock:
+				self._inflight = None
+			return len(batch)
+
+	def _start(self):
+		with self._lock:
+			if self._thread is not None:
+				return
+			self._thread = threading.Thread(target=self._run, name='news-engagement-flush', daemon=True)
+			self._thread.start()
+		atexit.register(self.flush)
+
+	def _run(self):
+		while True:
+			time.sleep(self.interval)
+			try:
+				self.flush()
+			except Exception:
+				logger.exception('Flushing buffered news clicks failed')
+			finally:
+				close_old_connections()
+
+
+def like_notification(post, user):
+	return Notification(
+		user_id=post.author_id,
+		actor=user,
+		type='like',
+		message=f"{user.first_name or user.username} liked your post",
+		post_id=post.id,
+	)
+
+
+# Write-through clicks: the row alone, with its counter or version bumped by
+# the receivers in news/signals.py. Failed buffered batches are never retried
+# from here, so a click only fails its own request.
+
+def like_now(post, user):
+	with transaction.atomic():
+		like, created = NewsLike.objects.get_or_create(post_id=post.id, user_id=user.id)
+		if not created:
+			like.delete()
+		elif post.author_id != user.id:
+			like_notification(post, user).save()
+	return created
+
+
+def share_now(post, user):
+	NewsShare.objects.create(post_id=post.id, user_id=user.id)
+
+
+def vote_now(poll, user, option_index):
+	PollVote.objects.update_or_create(poll_id=poll.id, user_id=user.id, defaults={'option_index': option_index})
+
+
+def write_batch(batch):
+	"""Apply a batch to the database; the caller wraps it in a transaction."""
+	# Clicks on posts or polls deleted since would fail their foreign keys
+	live_posts = set(NewsPost.objects.filter(id__in={p for p, _ in [*batch.likes, *batch.shares]}).values_list('id', flat=True))
+	live_polls = set(Poll.objects.filter(id__in={p for p, _ in batch.votes}).values_list('id', flat=True))
+	added = Counter()
+	recount = set()
+
+	likes = {k: liked for k, liked in batch.likes.items() if k[0] in live_posts}
+	if likes:
+		existing = {
+			(post_id, user_id): like_id
+			for like_id, post_id, user_id in NewsLike.objects.filter(
+				post_id__in={p for p, _ in likes}, user_id__in={u for _, u in likes},
+			).values_list('id', 'post_id', 'user_id')
+		}
+		new = [k for k, liked in likes.items() if liked and k not in existing]
+		rows = [NewsLike(post_id=p, user_id=u) for p, u in new]
+		try:
+			with transaction.atomic():
+				NewsLike.objects.bulk_create(rows)
+			added.update((p, 'likes_count') for p, _ in new)
+		except IntegrityError:
+			# Another worker stored some of these likes since they were read;
+			# keep its rows and count the posts involved from scratch
+			NewsLike.objects.bulk_create(rows, ignore_conflicts=True)
+			recount.update(p for p, _ in new)
+		Notification.objects.bulk_create([batch.notify[k] for k in new if k in batch.notify])
+		# Deletes still go through the post_delete receivers in news/signals.py
+		gone = [existing[k] for k, liked in likes.items() if not liked and k in existing]
+		if gone:
+			NewsLike.objects.filter(id__in=gone).delete()
+
+	shares = [(p, u) for p, u in batch.shares if p in live_posts]
+	NewsShare.objects.bulk_create([NewsShare(post_id=p, user_id=u) for p, u in shares])
+	added.update((p, 'shares_count') for p, _ in shares)
+
+	# bulk_create skips post_save, so new rows are counted here: one UPDATE
+	# per post, however many clicks it got
+	per_post = defaultdict(dict)
+	for (post_id, field), n in added.items():
+		per_post[post_id][field] = F(field) + n
+	for post_id in recount:
+		per_post[post_id]['likes_count'] = Coalesce(Subquery(
+			NewsLike.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('id')).values('n')
+		), 0)
+	for post_id, fields in per_post.items():
+		NewsPost.objects.filter(id=post_id).update(version=F('version') + 1, **fields)
+
+	votes = {k: option for k, option in batch.votes.items() if k[0] in live_polls}
+	if votes:
+		existing = {
+			(v.poll_id, v.user_id): v
+			for v in PollVote.objects.filter(poll_id__in={p for p, _ in votes}, user_id__in={u for _, u in votes})
+		}
+		new, changed = [], []
+		for (poll_id, user_id), option in votes.items():
+			vote = existing.get((poll_id, user_id))
+			if vote is None:
+				new.append(PollVote(poll_id=poll_id, user_id=user_id, option_index=option))
+			elif vote.option_index != option:
+				vote.option_index = option
+				changed.append(vote)
+		try:
+			with transaction.atomic():
+				PollVote.objects.bulk_create(new)
+		except IntegrityError:
+			# Another worker stored votes for some of these users since they
+			# were read; keep its rows but give them the newer choice made here
+			PollVote.objects.bulk_create(new, ignore_conflicts=True)
+			raced = {(v.poll_id, v.user_id) for v in new}
+			for vote in PollVote.objects.filter(poll_id__in={p for p, _ in raced}, user_id__in={u for _, u in raced}):
+				key = (vote.poll_id, vote.user_id)
+				if key in raced and vote.option_index != votes[key]:
+					vote.option_index = votes[key]
+					changed.append(vote)
+		PollVote.objects.bulk_update(changed, ['option_index'])
+		Poll.objects.filter(id__in={p for p, _ in votes}).update(version=F('version') + 1)
+
+
+buffer = EngagementBuffer(NEWS_ENGAGEMENT_FLUSH_MS / 1000)
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.template.backends.utils import csrf_input
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Rendered post and poll cards are cached under their id and version; any
+# like, comment, share, vote or edit bumps the version (news/signals.py), so
+# stale cards are never served and simply age out. Clicks still waiting in
+# the write-behind buffer (news/engagement.py) bypass the cache
+FRAGMENT_CACHE_TTL = 60 * 60
+FRAGMENT_CACHE_ENABLED = True
+
+CSRF_PLACEHOLDER = '<!-- viewer:csrf -->'
+
+
+def post_card_key(post):
+	# Cards showing clicks still in the write-behind buffer are not shared
+	if getattr(post, 'pending', False):
+		return None
+	return f'news:post-card:{post.id}:{post.version}'
+
+
+def poll_card_key(poll):
+	if getattr(poll, 'pending', False):
+		return None
+	return f'news:poll-card:{poll.id}:{poll.version}'
+
+
+def cached_cards(items, key, render):
+	"""Return rendered cards for `items`, rendering only the cache misses.
+
+	`render(missing)` receives the items not in the cache and returns their
+	HTML in the same order; items whose `key` is None are always rendered
+	and never stored. One cache round trip for the lookups and one for the
+	new entries.
+	"""
+	if not FRAGMENT_CACHE_ENABLED:
+		return render(items)
+	keys = [key(item) for item in items]
+	found = cache.get_many([k for k in keys if k])
+	html = [found.get(k) if k else None for k in keys]
+	missing = [i for i, h in enumerate(html) if h is None]
+	if missing:
+		for i, h in zip(missing, render([items[i] for i in missing])):
+			html[i] = h
+		cache.set_many({keys[i]: html[i] for i in missing if keys[i]}, FRAGMENT_CACHE_TTL)
+	return html
+
+
+def render_post_cards(posts):
+	html = cached_cards(posts, post_card_key, lambda missing: [
+		render_to_string('news/_post_card.html', {'post': p}) for p in missing
+	])
+	return [mark_safe(h) for h in html]
+
+
+def render_poll_cards(polls, request, tally):
+	"""Poll cards for `request.user`.
+
+	`tally(polls)` attaches vote counts and is only called for cache misses;
+	the viewer's CSRF token and own choice (`poll.user_choice`) are layered
+	onto the shared cached HTML.
+	"""
+	def render(missing):
+		tally(missing)
+		return [render_to_string('news/_poll_card.html', {'poll': p}) for p in missing]
+
+	token = str(csrf_input(request))
+	cards = []
+	for poll, html in zip(polls, cached_cards(polls, poll_card_key, render)):
+		html = html.replace(CSRF_PLACEHOLDER, token)
+		if poll.user_choice is not None:
+			marker = f'data-choice="{poll.user_choice}"'
+			html = html.replace(marker, marker + ' checked', 1)
+		cards.append(mark_safe(html))
+	return cards
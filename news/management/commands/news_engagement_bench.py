@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import RequestFactory
+
+from news import engagement
+from news.engagement import EngagementBuffer
+from news.models import NewsPost
+from news.views import post_like
+
+
+class Command(BaseCommand):
+    help = 'Compare like throughput on one hot post with clicks written through and written behind.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clicks', type=int, default=1000, help='Likes per mode, one per synthetic user (default 1000).')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clickers (default 8).')
+        parser.add_argument('--flush-ms', type=float, default=250, help='Write-behind flush interval (default 250).')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        clicks = max(1, options['clicks'])
+        # Clickers run on their own connections, so the data is committed and removed afterwards
+        author = User.objects.create_user(username='engagement-bench-author@example.com')
+        users = User.objects.bulk_create([User(username=f'engagement-bench-{i}@example.com') for i in range(clicks)])
+        factory = RequestFactory()
+        original = engagement.buffer
+        try:
+            for mode, interval in (('write-through', 0), ('write-behind', options['flush_ms'] / 1000)):
+                post = NewsPost.objects.create(title='Engagement benchmark', category='events', content='x', author=author)
+                engagement.buffer = EngagementBuffer(interval)
+
+                def click(user):
+                    request = factory.post(f'/news/posts/{post.id}/like/')
+                    request.user = user
+                    try:
+                        return post_like(request, post.id).status_code
+                    finally:
+                        close_old_connections()
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max(1, options['threads'])) as pool:
+                    statuses = list(pool.map(click, users))
+                acked = time.perf_counter() - started
+                engagement.buffer.flush()
+                written = time.perf_counter() - started
+                post.refresh_from_db()
+                if statuses.count(200) != len(users) or post.likes_count != len(users):
+                    raise CommandError(f'{mode}: {statuses.count(200)} clicks answered, {post.likes_count} likes stored')
+                self.stdout.write(
+                    f'{mode:>13}: {len(users) / acked:,.0f} clicks/s acknowledged, '
+                    f'all {len(users)} stored after {written:.2f}s'
+                )
+                post.delete()
+        finally:
+            engagement.buffer = original
+            NewsPost.objects.filter(title='Engagement benchmark', author=author).delete()
+            User.objects.filter(username__startswith='engagement-bench-').delete()
@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from news import fragments
+from news.models import NewsComment, NewsLike, NewsPost, Poll, PollVote
+from news.views import news_list
+
+
+class Command(BaseCommand):
+    help = 'Time rendering of the news page without the fragment cache, with it cold, and with it warm.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Page renders per mode (default 50).')
+        parser.add_argument('--posts', type=int, default=0, help='Add N synthetic posts for the run; rolled back afterwards.')
+        parser.add_argument('--polls', type=int, default=0, help='Add N synthetic polls for the run; rolled back afterwards.')
+        parser.add_argument('--user', help='Username to render the page as (default: first user).')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        with transaction.atomic():
+            user = User.objects.filter(username=options['user']).first() if options['user'] else User.objects.order_by('id').first()
+            if user is None:
+                user = User.objects.create_user(username='news-bench@example.com')
+            self.seed(user, options['posts'], options['polls'])
+            self.stdout.write(
+                f"{NewsPost.objects.count()} posts, {Poll.objects.count()} polls; "
+                f"{options['requests']} renders per mode as {user.username}"
+            )
+            factory = RequestFactory()
+            self.render(factory, user)  # load templates and URL resolvers first
+            baseline = None
+            try:
+                for mode in ('uncached', 'cold', 'warm'):
+                    fragments.FRAGMENT_CACHE_ENABLED = mode != 'uncached'
+                    cache.clear()
+                    if mode == 'warm':
+                        self.render(factory, user)
+                    timings, queries = [], 0
+                    for _ in range(max(1, options['requests'])):
+                        if mode == 'cold':
+                            cache.clear()
+                        with CaptureQueriesContext(connection) as captured:
+                            timings.append(self.render(factory, user))
+                        queries = len(captured)
+                    median = statistics.median(timings)
+                    baseline = baseline or median
+                    self.stdout.write(
+                        f'{mode:>9}: median {median:.1f} ms, p95 {sorted(timings)[int(0.95 * (len(timings) - 1))]:.1f} ms, '
+                        f'{queries} queries ({baseline / median:.1f}x)'
+                    )
+            finally:
+                fragments.FRAGMENT_CACHE_ENABLED = True
+                cache.clear()
+                transaction.set_rollback(True)
+
+    def render(self, factory, user):
+        request = factory.get('/news/')
+        request.user = user
+        request._messages = []
+        started = time.perf_counter()
+        response = news_list(request)
+        if response.status_code != 200:
+            raise CommandError(f'News page returned {response.status_code}')
+        return (time.perf_counter() - started) * 1000
+
+    def seed(self, user, posts, polls):
+        if posts:
+            created = NewsPost.objects.bulk_create([
+                NewsPost(title=f'Benchmark post {i}', category='events', content='Lorem ipsum dolor sit amet. ' * 20, author=user)
+                for i in range(posts)
+            ])
+            NewsLike.objects.bulk_create([NewsLike(post=p, user=user) for p in created], ignore_conflicts=True)
+            NewsComment.objects.bulk_create([NewsComment(post=p, user=user, text='Nice') for p in created])
+        if polls:
+            created = Poll.objects.bulk_create([
+                Poll(question=f'Benchmark poll {i}?', options='Yes\nNo\nMaybe', choices=['Yes', 'No', 'Maybe'], author=user)
+                for i in range(polls)
+            ])
+            PollVote.objects.bulk_create([PollVote(poll=p, user=user, option_index=i % 3) for i, p in enumerate(created)])
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from news.models import NewsPost
+from news.signals import COUNTERS
+
+
+def actual_counts():
+    # Correlated COUNT(*) per counter, evaluated for each post row
+    return {
+        field: Coalesce(Subquery(
+            model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('id')).values('n')
+        ), 0)
+        for model, field in COUNTERS.items()
+    }
+
+
+class Command(BaseCommand):
+    help = "Recompute NewsPost likes/comments/shares counters from the engagement tables, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts checked per batch (default 500).')
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted posts without fixing them.')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            ids = list(NewsPost.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            checked += len(ids)
+            actual = {f'actual_{field}': expr for field, expr in actual_counts().items()}
+            drifted = [
+                row['id'] for row in
+                NewsPost.objects.filter(id__in=ids).annotate(**actual).values('id', *actual, *COUNTERS.values())
+                if any(row[field] != row[f'actual_{field}'] for field in COUNTERS.values())
+            ]
+            if drifted and not options['dry_run']:
+                # One UPDATE with the counts computed in the database, so likes
+                # landing meanwhile are not overwritten with a stale value; the
+                # version bump retires the cached cards showing the old counts
+                NewsPost.objects.filter(id__in=drifted).update(version=F('version') + 1, **actual_counts())
+            fixed += len(drifted)
+            if options['dry_run']:
+                for pk in drifted:
+                    self.stdout.write(f'  drifted: post {pk}')
+        verb = 'would fix' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} posts; {verb} {fixed}.'))
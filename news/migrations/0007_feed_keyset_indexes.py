@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0006_newscomment_newsshare_newslike'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newspost',
+            index=models.Index(fields=['created_at', 'id'], name='newspost_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['created_at', 'id'], name='poll_created_id'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    NewsPost = apps.get_model('news', 'NewsPost')
+    for model_name, field in (('NewsLike', 'likes_count'), ('NewsComment', 'comments_count'), ('NewsShare', 'shares_count')):
+        model = apps.get_model('news', model_name)
+        counts = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('id')).values('n')
+        NewsPost.objects.update(**{field: Coalesce(Subquery(counts), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0007_feed_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newspost',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='newspost',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='newspost',
+            name='shares_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:02
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def parse_choices(apps, schema_editor):
+    Poll = apps.get_model('news', 'Poll')
+    polls = list(Poll.objects.only('id', 'options'))
+    for poll in polls:
+        poll.choices = [o.strip() for o in re.split(r'[\r\n,;]+', poll.options or '') if o.strip()]
+    Poll.objects.bulk_update(polls, ['choices'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0008_newspost_engagement_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='choices',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddIndex(
+            model_name='pollvote',
+            index=models.Index(fields=['poll', 'option_index'], name='pollvote_poll_option'),
+        ),
+        migrations.RunPython(parse_choices, migrations.RunPython.noop),
+    ]
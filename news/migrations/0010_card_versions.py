@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0009_poll_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newspost',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='poll',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0010_card_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newscomment',
+            index=models.Index(fields=['post', 'created_at', 'id'], name='newscomment_post_created_id'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import re
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -15,9 +17,18 @@ class NewsPost(models.Model):
 	image_url = models.URLField(blank=True)
 	author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='news_posts')
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Denormalized engagement counts, kept in step by news/signals.py;
+	# `manage.py recount_engagement` repairs any drift
+	likes_count = models.PositiveIntegerField(default=0)
+	comments_count = models.PositiveIntegerField(default=0)
+	shares_count = models.PositiveIntegerField(default=0)
+	# Bumped with every change that shows on the card; part of its cache key
+	version = models.PositiveIntegerField(default=0)
 
 	class Meta:
 		ordering = ['-created_at']
+		# Keyset pagination of the feed seeks on (created_at, id)
+		indexes = [models.Index(fields=['created_at', 'id'], name='newspost_created_id')]
 
 	def __str__(self):
 		return self.title
@@ -40,6 +51,8 @@ class NewsComment(models.Model):
 
 	class Meta:
 		ordering = ['-created_at']
+		# Comment pages and feed previews seek on (created_at, id) within a post
+		indexes = [models.Index(fields=['post', 'created_at', 'id'], name='newscomment_post_created_id')]
 
 
 class NewsShare(models.Model):
@@ -61,26 +74,35 @@ class Announcement(models.Model):
 		return self.title
 
 
+def parse_options(raw):
+	"""Split poll options given one per line (commas and semicolons also separate)."""
+	return [o.strip() for o in re.split(r'[\r\n,;]+', raw or '') if o.strip()]
+
+
 class Poll(models.Model):
 	question = models.CharField(max_length=255)
 	options = models.TextField(help_text='One option per line')
+	# `options` parsed when the poll is saved
+	choices = models.JSONField(default=list, blank=True)
+	# Bumped with every vote; part of the poll card's cache key
+	version = models.PositiveIntegerField(default=0)
 	author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='polls')
 	created_at = models.DateTimeField(auto_now_add=True)
 
 	class Meta:
 		ordering = ['-created_at']
+		indexes = [models.Index(fields=['created_at', 'id'], name='poll_created_id')]
 
 	def __str__(self):
 		return self.question
 
+	def save(self, *args, **kwargs):
+		# Re-parsed on every save, so edited options never keep stale choices
+		self.choices = parse_options(self.options)
+		super().save(*args, **kwargs)
+
 	def options_list(self):
-		raw = self.options or ''
-		try:
-			import re
-			parts = re.split(r'[\r\n,;]+', raw)
-		except Exception:
-			parts = raw.splitlines()
-		return [o.strip() for o in parts if o.strip()]
+		return list(self.choices) if self.choices else parse_options(self.options)
 
 	@property
 	def options_parsed(self):
@@ -95,6 +117,8 @@ class PollVote(models.Model):
 
 	class Meta:
 		unique_together = ('poll', 'user')
+		# Covers the per-option tally GROUP BY
+		indexes = [models.Index(fields=['poll', 'option_index'], name='pollvote_poll_option')]
 
 	def __str__(self):
 		return f"{self.user.username} -> {self.poll_id}:{self.option_index}"
@@ -0,0 +1,38 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(obj) -> str:
+	"""Opaque cursor pointing just after `obj` in (created_at, id) descending order."""
+	raw = f"{obj.created_at.isoformat()}|{obj.id}"
+	return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+	"""Return (created_at, id) for a cursor, raising ValueError when it is malformed."""
+	try:
+		raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+		stamp, _, pk = raw.rpartition('|')
+		return datetime.fromisoformat(stamp), int(pk)
+	except (TypeError, UnicodeDecodeError, ValueError) as e:
+		raise ValueError('Invalid cursor') from e
+
+
+def keyset_page(queryset, cursor: str = '', size: int = 20):
+	"""Return (items, next_cursor) for the page after `cursor`, newest first.
+
+	Seeks on the (created_at, id) index instead of counting past an OFFSET, so
+	every page costs the same however deep it is. next_cursor is '' on the
+	last page.
+	"""
+	queryset = queryset.order_by('-created_at', '-id')
+	if cursor:
+		created_at, pk = decode_cursor(cursor)
+		queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+	items = list(queryset[:size + 1])
+	if len(items) > size:
+		items = items[:size]
+		return items, encode_cursor(items[-1])
+	return items, ''
@@ -0,0 +1,90 @@
+from django.contrib.auth.models import User
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import NewsComment, NewsLike, NewsPost, NewsShare, Poll, PollVote
+
+# Engagement rows and the NewsPost counter each one feeds
+COUNTERS = {
+	NewsLike: 'likes_count',
+	NewsComment: 'comments_count',
+	NewsShare: 'shares_count',
+}
+
+
+def adjust_counter(post_id, field, delta):
+	"""Add `delta` to one of a post's counters in a single UPDATE.
+
+	F() makes the database do the arithmetic, so concurrent likes never
+	overwrite each other; counters never go below zero.
+	"""
+	qs = NewsPost.objects.filter(id=post_id)
+	if delta < 0:
+		qs = qs.filter(**{f'{field}__gte': -delta})
+	# The card shows the counts, so its cached fragment is now stale
+	return qs.update(**{field: F(field) + delta, 'version': F('version') + 1})
+
+
+def bump_version(model, pk):
+	model.objects.filter(id=pk).update(version=F('version') + 1)
+
+
+def deleted_with(origin, model):
+	"""Ids of `model` rows removed by the same delete() call as `origin`.
+
+	Cascades from a post (or its author) reach every like and comment; those
+	rows need no counter update, as the counters go with the post. The ids
+	are looked up once per delete() call and kept on `origin`.
+	"""
+	if isinstance(origin, model):
+		return {origin.id}
+	cache = getattr(origin, '_news_deleted_with', None)
+	if cache is None:
+		cache = {}
+		try:
+			origin._news_deleted_with = cache
+		except AttributeError:
+			return set()
+	if model not in cache:
+		rows = model.objects.none()
+		if isinstance(origin, QuerySet) and origin.model is model:
+			rows = origin
+		elif isinstance(origin, User):
+			rows = model.objects.filter(author=origin)
+		elif isinstance(origin, QuerySet) and origin.model is User:
+			rows = model.objects.filter(author__in=origin)
+		cache[model] = set(rows.order_by().values_list('id', flat=True))
+	return cache[model]
+
+
+@receiver(post_save, sender=NewsLike)
+@receiver(post_save, sender=NewsComment)
+@receiver(post_save, sender=NewsShare)
+def count_engagement(sender, instance, created, **kwargs):
+	if created:
+		adjust_counter(instance.post_id, COUNTERS[sender], 1)
+
+
+@receiver(post_delete, sender=NewsLike)
+@receiver(post_delete, sender=NewsComment)
+@receiver(post_delete, sender=NewsShare)
+def uncount_engagement(sender, instance, origin=None, **kwargs):
+	if instance.post_id in deleted_with(origin, NewsPost):
+		return
+	adjust_counter(instance.post_id, COUNTERS[sender], -1)
+
+
+@receiver(post_save, sender=NewsPost)
+@receiver(post_save, sender=Poll)
+def bump_edited(sender, instance, created, **kwargs):
+	# New rows start with their own cache keys; edits invalidate the card
+	if not created:
+		bump_version(sender, instance.id)
+
+
+@receiver(post_save, sender=PollVote)
+@receiver(post_delete, sender=PollVote)
+def bump_voted_poll(sender, instance, origin=None, **kwargs):
+	if origin is not None and instance.poll_id in deleted_with(origin, Poll):
+		return
+	bump_version(Poll, instance.poll_id)
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from jobs.queue import task
+from premitive.models import Notification
+from .models import Announcement
+
+
+NOTIFY_BATCH_SIZE = 1000
+
+
+@task('news.notify_announcement')
+def notify_announcement(payload):
+	ann = Announcement.objects.filter(id=payload['announcement_id']).select_related('author').first()
+	if ann is None:
+		return
+	# Notify all users except the author, in bounded batches. Users notified by
+	# an earlier, partially failed attempt are skipped so retries stay idempotent.
+	already = Notification.objects.filter(announcement=ann, type='announcement').values('user_id')
+	recipient_ids = (
+		User.objects.exclude(id=ann.author_id)
+		.exclude(id__in=already)
+		.values_list('id', flat=True)
+		.iterator(chunk_size=NOTIFY_BATCH_SIZE)
+	)
+	batch = []
+	for uid in recipient_ids:
+		batch.append(Notification(
+			user_id=uid,
+			actor=ann.author,
+			type='announcement',
+			message=f"New announcement: {ann.title}",
+			announcement=ann,
+		))
+		if len(batch) >= NOTIFY_BATCH_SIZE:
+			Notification.objects.bulk_create(batch, ignore_conflicts=True)
+			batch = []
+	if batch:
+		Notification.objects.bulk_create(batch, ignore_conflicts=True)
@@ -1,3 +1,354 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from premitive.models import Notification
+
+from .engagement import EngagementBuffer
+from .models import NewsLike, NewsPost, Poll, PollVote
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from . import engagement, fragments, views
+
+
+class KeysetPaginationTest(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='u@example.com', password='pass')
+		now = timezone.now()
+		# Pairs of posts share a timestamp, so ordering must fall back to id
+		for i in range(7):
+			post = NewsPost.objects.create(title=f'Post {i}', category='events', content='x', author=self.user)
+			NewsPost.objects.filter(id=post.id).update(created_at=now - timedelta(minutes=i // 2))
+
+	def test_pages_cover_every_post_once_newest_first(self):
+		seen, cursor = [], ''
+		while True:
+			items, cursor = keyset_page(NewsPost.objects.all(), cursor, size=3)
+			seen.extend(items)
+			if not cursor:
+				break
+		expected = list(NewsPost.objects.order_by('-created_at', '-id'))
+		self.assertEqual(seen, expected)
+
+	def test_cursor_round_trip_and_invalid_cursor(self):
+		post = NewsPost.objects.first()
+		self.assertEqual(decode_cursor(encode_cursor(post)), (post.created_at, post.id))
+		with self.assertRaises(ValueError):
+			decode_cursor('not-a-cursor')
+
+
+class NewsFeedViewsTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='u@example.com', password='pass')
+		self.client.login(username='u@example.com', password='pass')
+
+	def make_posts(self, n):
+		for i in range(n):
+			NewsPost.objects.create(title=f'Post {i}', category='events', content='x', author=self.user)
+
+	def test_first_page_query_count_is_independent_of_history(self):
+		self.make_posts(3)
+		self.client.get(reverse('news:list'))  # creates the profile
+		with CaptureQueriesContext(connection) as small:
+			self.client.get(reverse('news:list'))
+		self.make_posts(40)
+		with CaptureQueriesContext(connection) as large:
+			r = self.client.get(reverse('news:list'))
+		self.assertEqual(len(small), len(large))
+		self.assertEqual(len(r.context['posts']), views.POSTS_PAGE_SIZE)
+		self.assertTrue(r.context['next_cursor'])
+
+	def test_feed_returns_next_page_fragment(self):
+		self.make_posts(views.POSTS_PAGE_SIZE + 2)
+		first = self.client.get(reverse('news:list')).context
+		NewsLike.objects.create(post=NewsPost.objects.order_by('id').first(), user=self.user)
+		data = self.client.get(reverse('news:feed'), {'cursor': first['next_cursor']}).json()
+		self.assertEqual(data['html'].count('class="news-card'), 2)
+		self.assertIn('data-likes="1"', data['html'])
+		self.assertEqual(data['next'], '')
+		self.assertEqual(self.client.get(reverse('news:feed'), {'cursor': '!!'}).status_code, 400)
+
+	def test_poll_feed_includes_viewer_choice(self):
+		for i in range(views.POLLS_PAGE_SIZE + 1):
+			Poll.objects.create(question=f'Q{i}', options='A\nB', author=self.user)
+		oldest = Poll.objects.order_by('id').first()
+		PollVote.objects.create(poll=oldest, user=self.user, option_index=1)
+		cursor = self.client.get(reverse('news:list')).context['polls_next_cursor']
+		data = self.client.get(reverse('news:poll_feed'), {'cursor': cursor}).json()
+		self.assertIn(oldest.question, data['html'])
+		self.assertIn('data-choice="1" checked', data['html'])
+		self.assertIn('csrfmiddlewaretoken', data['html'])
+
+
+class EngagementCountersTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='u@example.com', password='pass')
+		self.other = User.objects.create_user(username='o@example.com', password='pass')
+		self.post = NewsPost.objects.create(title='Fest', category='events', content='x', author=self.other)
+		self.client.login(username='u@example.com', password='pass')
+
+	def test_toggles_maintain_counters_without_aggregates(self):
+		with CaptureQueriesContext(connection) as queries:
+			liked = self.client.post(reverse('news:post_like', args=[self.post.id])).json()
+			self.client.post(reverse('news:post_comment_create', args=[self.post.id]), {'text': 'Nice'})
+			shared = self.client.post(reverse('news:post_share', args=[self.post.id])).json()
+		self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql'].upper()])
+		self.assertEqual((liked['likes'], shared['shares']), (1, 1))
+		unliked = self.client.post(reverse('news:post_like', args=[self.post.id])).json()
+		self.assertEqual(unliked, {'liked': False, 'likes': 0})
+		self.post.refresh_from_db()
+		self.assertEqual((self.post.likes_count, self.post.comments_count, self.post.shares_count), (0, 1, 1))
+
+	def test_cascades_only_count_rows_on_surviving_posts(self):
+		own = NewsPost.objects.create(title='Mine', category='events', content='x', author=self.user)
+		for i in range(5):
+			fan = User.objects.create_user(username=f'f{i}@example.com')
+			NewsLike.objects.create(post=own, user=fan)
+			own.comments.create(user=fan, text='Nice')
+		with CaptureQueriesContext(connection) as queries:
+			own.delete()
+		self.assertFalse([q['sql'] for q in queries if q['sql'].startswith('UPDATE "news_newspost"')])
+		NewsLike.objects.create(post=self.post, user=self.user)
+		NewsLike.objects.create(post=NewsPost.objects.create(title='Also mine', category='events', content='x', author=self.user), user=self.user)
+		self.user.delete()
+		self.post.refresh_from_db()
+		self.assertEqual(self.post.likes_count, 0)
+
+	def test_recount_repairs_drift(self):
+		NewsLike.objects.create(post=self.post, user=self.user)
+		NewsPost.objects.filter(id=self.post.id).update(likes_count=5, shares_count=2)
+		out = StringIO()
+		call_command('recount_engagement', '--batch-size', '1', stdout=out)
+		self.assertIn('fixed 1', out.getvalue())
+		self.post.refresh_from_db()
+		self.assertEqual((self.post.likes_count, self.post.shares_count), (1, 0))
+
+	def test_recount_refreshes_cached_cards(self):
+		NewsPost.objects.filter(id=self.post.id).update(likes_count=1)
+		self.assertIn('data-likes="1"', ''.join(views.post_page()[1]))
+		call_command('recount_engagement', stdout=StringIO())
+		self.assertIn('data-likes="0"', ''.join(views.post_page()[1]))
+
+
+class PollTallyTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='u@example.com', password='pass')
+		self.client.login(username='u@example.com', password='pass')
+		self.voters = [User.objects.create_user(username=f'v{i}@example.com') for i in range(4)]
+
+	def make_polls(self, n):
+		for i in range(n):
+			poll = Poll.objects.create(question=f'Q{i}', options='Yes\nNo; Maybe', author=self.user)
+			for j, voter in enumerate(self.voters):
+				PollVote.objects.create(poll=poll, user=voter, option_index=j % 2)
+
+	def test_options_are_parsed_once_at_creation(self):
+		self.client.post(reverse('news:poll_create'), {'p_question': 'Lunch?', 'p_options': 'Pizza\r\nTacos, Salad'})
+		self.assertEqual(Poll.objects.get(question='Lunch?').choices, ['Pizza', 'Tacos', 'Salad'])
+
+	def test_editing_options_reparses_choices(self):
+		poll = Poll.objects.create(question='Lunch?', options='Pizza\nTacos', author=self.user)
+		poll.options = 'Pizza\nSalad\nTacos'
+		poll.save()
+		poll.refresh_from_db()
+		self.assertEqual(poll.options_list(), ['Pizza', 'Salad', 'Tacos'])
+
+	def test_tallies_cost_constant_queries(self):
+		self.make_polls(2)
+		with CaptureQueriesContext(connection) as few:
+			self.client.get(reverse('news:poll_feed'))
+		self.make_polls(8)
+		PollVote.objects.create(poll=Poll.objects.order_by('-id').first(), user=self.user, option_index=2)
+		with CaptureQueriesContext(connection) as many:
+			data = self.client.get(reverse('news:poll_feed')).json()
+		self.assertEqual(len(few), len(many))
+		self.assertIn('50.0% (2)', data['html'])
+		self.assertIn('20.0% (1)', data['html'])
+		self.assertIn('data-choice="2" checked', data['html'])
+
+
+class FragmentCacheTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='u@example.com', password='pass')
+		self.other = User.objects.create_user(username='o@example.com', password='pass')
+		self.post = NewsPost.objects.create(title='Fest', category='events', content='x', author=self.other)
+		self.poll = Poll.objects.create(question='Lunch?', options='Pizza\nTacos', author=self.other)
+		self.client.login(username='u@example.com', password='pass')
+
+	def test_warm_cache_skips_tallies_and_bumps_invalidate(self):
+		self.client.get(reverse('news:list'))
+		with CaptureQueriesContext(connection) as warm:
+			self.client.get(reverse('news:poll_feed'))
+		self.assertFalse([q for q in warm if 'GROUP BY' in q['sql']])
+		self.client.post(reverse('news:post_like', args=[self.post.id]))
+		self.client.post(reverse('news:poll_vote', args=[self.poll.id]), {'option_index': 1})
+		html = self.client.get(reverse('news:list')).content.decode()
+		self.assertIn('data-likes="1"', html)
+		self.assertIn('100.0% (1)', html)
+
+	def test_deleting_a_poll_does_not_bump_it_per_vote(self):
+		for i in range(5):
+			PollVote.objects.create(poll=self.poll, user=User.objects.create_user(username=f'v{i}@example.com'), option_index=0)
+		with CaptureQueriesContext(connection) as queries:
+			self.poll.delete()
+		self.assertFalse([q['sql'] for q in queries if q['sql'].startswith('UPDATE "news_poll"')])
+
+	def test_viewer_bits_are_layered_on_shared_cards(self):
+		PollVote.objects.create(poll=self.poll, user=self.user, option_index=0)
+		mine = self.client.get(reverse('news:poll_feed')).json()['html']
+		self.client.login(username='o@example.com', password='pass')
+		theirs = self.client.get(reverse('news:poll_feed')).json()['html']
+		self.assertIn('data-choice="0" checked', mine)
+		self.assertNotIn('checked', theirs)
+		self.assertIn('csrfmiddlewaretoken', theirs)
+		self.assertNotIn(fragments.CSRF_PLACEHOLDER, theirs)
+
+
+class EngagementBufferTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.buffer = EngagementBuffer(interval=None)
+		patcher = patch('news.engagement.buffer', self.buffer)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.user = User.objects.create_user(username='u@example.com', password='pass')
+		self.other = User.objects.create_user(username='o@example.com', password='pass')
+		self.post = NewsPost.objects.create(title='Finals', category='sports', content='x', author=self.other)
+		self.poll = Poll.objects.create(question='MVP?', options='Asha\nRavi', author=self.other)
+		self.client.login(username='u@example.com', password='pass')
+
+	def test_clicks_are_acknowledged_before_they_are_written(self):
+		with CaptureQueriesContext(connection) as clicks:
+			liked = self.client.post(reverse('news:post_like', args=[self.post.id])).json()
+			shared = self.client.post(reverse('news:post_share', args=[self.post.id])).json()
+			self.client.post(reverse('news:poll_vote', args=[self.poll.id]), {'option_index': 1})
+		self.assertFalse([q['sql'] for q in clicks if 'news_' in q['sql'] and not q['sql'].startswith('SELECT')])
+		self.assertEqual((liked, shared['shares']), ({'liked': True, 'likes': 1}, 1))
+		html = self.client.get(reverse('news:list')).content.decode()
+		self.assertIn('data-likes="1"', html)
+		self.assertIn('100.0% (1)', html)
+		self.assertIn('data-choice="1" checked', html)
+		self.assertEqual(self.buffer.flush(), 3)
+		self.post.refresh_from_db()
+		self.assertEqual((self.post.likes_count, self.post.shares_count), (1, 1))
+		self.assertEqual(PollVote.objects.get(poll=self.poll, user=self.user).option_index, 1)
+		self.assertEqual(Notification.objects.filter(user=self.other, type='like').count(), 1)
+
+	def test_repeated_clicks_coalesce_into_one_write(self):
+		NewsLike.objects.create(post=self.post, user=self.other)
+		fans = [User.objects.create_user(username=f'f{i}@example.com', password='pass') for i in range(3)]
+		for fan in fans:
+			self.client.force_login(fan)
+			self.client.post(reverse('news:post_like', args=[self.post.id]))
+			self.client.post(reverse('news:poll_vote', args=[self.poll.id]), {'option_index': 0})
+			self.client.post(reverse('news:poll_vote', args=[self.poll.id]), {'option_index': 1})
+		self.client.force_login(self.other)
+		self.assertEqual(self.client.post(reverse('news:post_like', args=[self.post.id])).json(), {'liked': False, 'likes': 3})
+		with CaptureQueriesContext(connection) as flush:
+			self.buffer.flush()
+		self.assertEqual(len([q for q in flush if q['sql'].startswith('UPDATE "news_newspost"')]), 2)
+		self.post.refresh_from_db()
+		self.assertEqual(self.post.likes_count, 3)
+		self.assertEqual(list(PollVote.objects.values_list('option_index', flat=True)), [1, 1, 1])
+		self.assertEqual(self.buffer.flush(), 0)
+
+	def test_like_stored_by_another_worker_meanwhile_is_counted_once(self):
+		self.client.post(reverse('news:post_like', args=[self.post.id]))
+		real, raced = NewsLike.objects.bulk_create, []
+
+		def racing(rows, **kwargs):
+			if not raced:
+				# The other worker's like lands between our read and our insert
+				raced.append(NewsLike.objects.create(post=self.post, user=self.user))
+			return real(rows, **kwargs)
+
+		with patch.object(NewsLike.objects, 'bulk_create', side_effect=racing):
+			self.buffer.flush()
+		self.post.refresh_from_db()
+		self.assertEqual((NewsLike.objects.count(), self.post.likes_count), (1, 1))
+
+	def test_vote_stored_by_another_worker_meanwhile_takes_the_newer_choice(self):
+		self.client.post(reverse('news:poll_vote', args=[self.poll.id]), {'option_index': 1})
+		real, raced = PollVote.objects.bulk_create, []
+
+		def racing(rows, **kwargs):
+			if not raced:
+				raced.append(PollVote.objects.create(poll=self.poll, user=self.user, option_index=0))
+			return real(rows, **kwargs)
+
+		with patch.object(PollVote.objects, 'bulk_create', side_effect=racing):
+			self.buffer.flush()
+		self.assertEqual(list(PollVote.objects.values_list('option_index', flat=True)), [1])
+
+	def test_write_through_click_writes_row_and_counter_only(self):
+		through = EngagementBuffer(interval=0)
+		with CaptureQueriesContext(connection) as queries:
+			self.assertTrue(through.toggle_like(self.post, self.user))
+		writes = [q['sql'].split()[0] for q in queries if 'SAVEPOINT' not in q['sql']]
+		self.assertEqual(writes, ['SELECT', 'INSERT', 'UPDATE', 'INSERT'])
+		self.post.refresh_from_db()
+		self.assertEqual(self.post.likes_count, 1)
+		self.assertFalse(through.toggle_like(self.post, self.user))
+		through.share(self.post, self.user)
+		through.vote(self.poll, self.user, 1)
+		self.post.refresh_from_db()
+		self.assertEqual((self.post.likes_count, self.post.shares_count), (0, 1))
+		self.assertEqual(PollVote.objects.get(poll=self.poll, user=self.user).option_index, 1)
+
+	def test_write_through_click_ignores_failed_buffered_batch(self):
+		through = EngagementBuffer(interval=0)
+		through._inflight = bad = engagement.Batch()
+		bad.likes[('not-a-post', self.user.id)] = True
+		with patch('news.engagement.buffer', through):
+			r = self.client.post(reverse('news:post_like', args=[self.post.id]))
+		self.assertEqual(r.json(), {'liked': True, 'likes': 1})
+		self.assertIs(through._inflight, bad)
+
+
+class CommentsApiTest(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='u@example.com', password='pass', first_name='Uma')
+		self.client.login(username='u@example.com', password='pass')
+		self.posts = [NewsPost.objects.create(title=f'Post {i}', category='events', content='x', author=self.user) for i in range(3)]
+		for post in self.posts:
+			for j in range(5):
+				post.comments.create(user=self.user, text=f'{post.title} comment {j}')
+
+	def test_comment_pages_follow_cursor(self):
+		url = reverse('news:post_comment_list', args=[self.posts[0].id])
+		texts, cursor = [], ''
+		while True:
+			data = self.client.get(url, {'cursor': cursor, 'limit': 2}).json()
+			self.assertLessEqual(len(data['comments']), 2)
+			texts += [c['text'] for c in data['comments']]
+			cursor = data['next']
+			if not cursor:
+				break
+		self.assertEqual(texts, [f'Post 0 comment {j}' for j in reversed(range(5))])
+		self.assertEqual(data['comments'][0]['user'], 'Uma')
+		self.assertEqual(self.client.get(url, {'cursor': '!!'}).status_code, 400)
+		self.assertEqual(self.client.get(reverse('news:post_comment_list', args=[0])).status_code, 404)
+
+	def test_previews_for_many_posts_in_one_query(self):
+		url = reverse('news:comment_previews')
+		self.client.get(url, {'ids': self.posts[0].id})  # loads the session and user
+		ids = ','.join(str(p.id) for p in self.posts)
+		with CaptureQueriesContext(connection) as queries:
+			data = self.client.get(url, {'ids': ids, 'n': 2}).json()
+		self.assertEqual(len([q for q in queries if 'news_newscomment' in q['sql']]), 1)
+		for post in self.posts:
+			self.assertEqual([c['text'] for c in data['previews'][str(post.id)]], [f'{post.title} comment 4', f'{post.title} comment 3'])
+		self.assertEqual(self.client.get(url, {'ids': 'a,b'}).status_code, 400)
 
-# Create your tests here.
@@ -5,6 +5,8 @@ app_name = 'news'
 
 urlpatterns = [
     path('', views.news_list, name='list'),
+    path('feed/', views.news_feed, name='feed'),
+    path('polls/feed/', views.poll_feed, name='poll_feed'),
     path('create/', views.news_create, name='create'),
     path('announcements/create/', views.announcement_create, name='announcement_create'),
     path('polls/create/', views.poll_create, name='poll_create'),
@@ -12,5 +14,6 @@ urlpatterns = [
     path('posts/<int:post_id>/like/', views.post_like, name='post_like'),
     path('posts/<int:post_id>/comments/', views.post_comment_list, name='post_comment_list'),
     path('posts/<int:post_id>/comments/create/', views.post_comment_create, name='post_comment_create'),
+    path('comments/previews/', views.comment_previews, name='comment_previews'),
     path('posts/<int:post_id>/share/', views.post_share, name='post_share'),
 ]
@@ -2,65 +2,132 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse, HttpResponseBadRequest
-from django.db.models import Count
-from .models import NewsPost, Announcement, Poll, PollVote, NewsLike, NewsComment, NewsShare
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from .models import NewsPost, Announcement, Poll, PollVote, NewsComment, parse_options
+from .fragments import render_poll_cards, render_post_cards
+from .pagination import keyset_page
+from . import engagement
 from premitive.models import UserProfile, Notification
+from jobs.queue import enqueue
 
 
-@login_required
-def news_list(request):
-	posts = (
-		NewsPost.objects.select_related('author')
-		.annotate(likes_count=Count('likes', distinct=True))
-		.annotate(comments_count=Count('comments', distinct=True))
-		.annotate(shares_count=Count('shares', distinct=True))
-		.all()
-	)
-	announcements = []
-	polls = Poll.objects.select_related('author').prefetch_related('votes').all()
-	# Ensure profile exists and determine role
-	profile, _ = UserProfile.objects.get_or_create(user=request.user)
-	role = profile.role
-	if role == 'teacher':
-		announcements = Announcement.objects.filter(author=request.user).select_related('author')
-	# Build poll stats and attach to poll instances for UI (no leading underscores for template safety)
+# Cards per page of the feed and of the polls tab; later pages are fetched
+# by cursor as the user scrolls
+POSTS_PAGE_SIZE = 12
+POLLS_PAGE_SIZE = 10
+# Comments per page in the post modal (?limit= may ask for up to the max),
+# and per post in the feed previews (?n=, at most COMMENTS_PAGE_SIZE) for up
+# to COMMENT_PREVIEW_MAX_POSTS posts per request
+COMMENTS_PAGE_SIZE = 20
+COMMENTS_MAX_PAGE_SIZE = 100
+COMMENT_PREVIEW_SIZE = 3
+COMMENT_PREVIEW_MAX_POSTS = 50
+
+
+def attach_poll_tallies(polls):
+	"""Attach total_votes and choice_rows to each poll (no leading underscores for template safety).
+
+	One GROUP BY query for any number of polls.
+	"""
+	ids = [p.id for p in polls]
+	tallies = {}
+	for poll_id, option_index, n in (
+		PollVote.objects.filter(poll_id__in=ids).order_by()
+		.values('poll_id', 'option_index').annotate(n=Count('id'))
+		.values_list('poll_id', 'option_index', 'n')
+	):
+		tallies.setdefault(poll_id, {})[option_index] = n
 	for p in polls:
 		opts = p.options_list()
-		total = p.votes.count()
-		counts = [0] * len(opts)
-		for v in p.votes.all():
-			if 0 <= v.option_index < len(counts):
-				counts[v.option_index] += 1
-		if total > 0:
-			percentages = [round(c * 100 / total, 1) for c in counts]
-		else:
-			percentages = [0.0] * max(1, len(counts))
-		user_choice = None
-		if request.user.is_authenticated:
-			uv = next((v for v in p.votes.all() if v.user_id == request.user.id), None)
-			user_choice = uv.option_index if uv else None
+		# Votes still in the write-behind buffer (see engagement.EngagementBuffer.merge_polls)
+		pending = getattr(p, 'pending_votes', {})
+		counts = [max(0, tallies.get(p.id, {}).get(i, 0) + pending.get(i, 0)) for i in range(len(opts))]
+		total = max(0, sum(tallies.get(p.id, {}).values()) + sum(pending.values()))
 		p.total_votes = total
-		p.user_choice = user_choice
 		p.choice_rows = [
 			{
 				'idx': i,
-				'text': opts[i],
+				'text': text,
 				'count': counts[i],
-				'pct': percentages[i],
+				'pct': round(counts[i] * 100 / total, 1) if total else 0.0,
 			}
-			for i in range(len(opts))
+			for i, text in enumerate(opts)
 		]
-	# Ensure attached attributes persist into the template
-	polls = list(polls)
+	return polls
+
+
+def attach_user_choices(polls, user):
+	"""Set user_choice on each poll from one query for the viewer's votes."""
+	ids = [p.id for p in polls]
+	mine = {}
+	if user.is_authenticated and ids:
+		mine = dict(PollVote.objects.filter(poll_id__in=ids, user=user).values_list('poll_id', 'option_index'))
+	for p in polls:
+		p.user_choice = mine.get(p.id)
+	return polls
+
+
+def post_page(cursor=''):
+	"""(posts, rendered cards, next cursor) for one page of the feed."""
+	# likes_count, comments_count and shares_count are columns: no aggregates
+	posts, next_cursor = keyset_page(NewsPost.objects.select_related('author'), cursor, POSTS_PAGE_SIZE)
+	engagement.buffer.merge_posts(posts)
+	return posts, render_post_cards(posts), next_cursor
+
+
+def poll_page(request, cursor=''):
+	"""(polls, rendered cards, next cursor) for one page of the polls tab."""
+	polls, next_cursor = keyset_page(Poll.objects.select_related('author'), cursor, POLLS_PAGE_SIZE)
+	attach_user_choices(polls, request.user)
+	engagement.buffer.merge_polls(polls, request.user)
+	# Tallies are only computed for cards missing from the fragment cache
+	return polls, render_poll_cards(polls, request, attach_poll_tallies), next_cursor
+
+
+@login_required
+def news_list(request):
+	posts, post_cards, next_cursor = post_page()
+	polls, poll_cards, polls_next_cursor = poll_page(request)
+	announcements = []
+	# Ensure profile exists and determine role
+	profile, _ = UserProfile.objects.get_or_create(user=request.user)
+	role = profile.role
+	if role == 'teacher':
+		announcements = Announcement.objects.filter(author=request.user).select_related('author')
 	context = {
 		'posts': posts,
+		'post_cards': post_cards,
+		'next_cursor': next_cursor,
 		'announcements': announcements,
 		'polls': polls,
+		'poll_cards': poll_cards,
+		'polls_next_cursor': polls_next_cursor,
 		'is_teacher': role == 'teacher'
 	}
 	return render(request, 'news/news.html', context)
 
 
+@login_required
+def news_feed(request):
+	"""Next page of post cards for infinite scroll: {html, next}."""
+	try:
+		_, cards, next_cursor = post_page(request.GET.get('cursor', ''))
+	except ValueError:
+		return HttpResponseBadRequest('Invalid cursor')
+	return JsonResponse({'html': ''.join(cards), 'next': next_cursor})
+
+
+@login_required
+def poll_feed(request):
+	"""Next page of poll cards for the polls tab: {html, next}."""
+	try:
+		_, cards, next_cursor = poll_page(request, request.GET.get('cursor', ''))
+	except ValueError:
+		return HttpResponseBadRequest('Invalid cursor')
+	return JsonResponse({'html': ''.join(cards), 'next': next_cursor})
+
+
 @login_required
 @require_POST
 def news_create(request):
@@ -90,20 +157,8 @@ def announcement_create(request):
 		return redirect('news:list')
 	if title and content:
 		ann = Announcement.objects.create(title=title, content=content, author=request.user)
-		# Notify all students about teacher's announcement
-		# Minimal approach: notify all users except the author
-		from django.contrib.auth.models import User
-		recipients = User.objects.exclude(id=request.user.id)
-		bulk = [
-			Notification(
-				user=u,
-				actor=request.user,
-				type='announcement',
-				message=f"New announcement: {title}",
-				announcement=ann,
-			) for u in recipients
-		]
-		Notification.objects.bulk_create(bulk, ignore_conflicts=True)
+		# Fan-out to every user runs in the job worker, not in the request
+		enqueue('news.notify_announcement', {'announcement_id': ann.id})
 	return redirect('news:list')
 
 
@@ -113,7 +168,7 @@ def poll_create(request):
 	question = request.POST.get('p_question', '').strip()
 	options = request.POST.get('p_options', '').strip()
 	if question and options:
-		Poll.objects.create(question=question, options=options, author=request.user)
+		Poll.objects.create(question=question, options=options, choices=parse_options(options), author=request.user)
 	return redirect('news:list')
 
 
@@ -130,15 +185,18 @@ def poll_vote(request, poll_id):
 		option_index = -1
 	options = poll.options_list()
 	if 0 <= option_index < len(options):
-		# Create or update user's vote for this poll
-		PollVote.objects.update_or_create(
-			poll=poll,
-			user=request.user,
-			defaults={'option_index': option_index}
-		)
+		# Create or update user's vote for this poll (written behind, see engagement.py)
+		engagement.buffer.vote(poll, request.user, option_index)
 	return redirect('news:list')
 
 
+def refreshed_count(post, field):
+	# Counters are updated in the database with F(); read back the new value
+	# plus any clicks still waiting in the write-behind buffer
+	post.refresh_from_db(fields=[field])
+	return getattr(post, field) + engagement.buffer.pending_count(post.id, field)
+
+
 @login_required
 @require_POST
 def post_like(request, post_id):
@@ -146,39 +204,73 @@ def post_like(request, post_id):
 		post = NewsPost.objects.get(id=post_id)
 	except NewsPost.DoesNotExist:
 		return JsonResponse({'error': 'Not found'}, status=404)
-	like, created = NewsLike.objects.get_or_create(post=post, user=request.user)
-	if not created:
-		like.delete()
-		liked = False
-	else:
-		liked = True
-		if post.author_id != request.user.id:
-			Notification.objects.create(
-				user=post.author,
-				actor=request.user,
-				type='like',
-				message=f"{request.user.first_name or request.user.username} liked your post",
-				post=post,
-			)
-	counts = post.likes.count()
-	return JsonResponse({'liked': liked, 'likes': counts})
+	# The like and its notification are written behind, see engagement.py
+	liked = engagement.buffer.toggle_like(post, request.user)
+	return JsonResponse({'liked': liked, 'likes': refreshed_count(post, 'likes_count')})
+
+
+def comment_json(user_first_name, user_username, text, created_at):
+	return {
+		'user': user_first_name or user_username,
+		'text': text,
+		'created_at': created_at.isoformat(),
+	}
+
+
+def int_param(request, name, default, maximum):
+	try:
+		return max(1, min(int(request.GET.get(name, default)), maximum))
+	except ValueError:
+		return default
 
 
 @login_required
 def post_comment_list(request, post_id):
-	try:
-		post = NewsPost.objects.get(id=post_id)
-	except NewsPost.DoesNotExist:
+	"""One page of a post's comments, newest first: {comments, next}.
+
+	?cursor= continues from a previous page's `next`; ?limit= sets the page size.
+	"""
+	if not NewsPost.objects.filter(id=post_id).exists():
 		return JsonResponse({'error': 'Not found'}, status=404)
-	data = [
-		{
-			'user': c.user.first_name or c.user.username,
-			'text': c.text,
-			'created_at': c.created_at.isoformat(),
-		}
-		for c in post.comments.select_related('user')[:50]
-	]
-	return JsonResponse({'comments': data})
+	# Only the columns the comment list renders, plus the keyset columns
+	comments = NewsComment.objects.filter(post_id=post_id).select_related('user').only(
+		'id', 'text', 'created_at', 'user__first_name', 'user__username',
+	)
+	try:
+		page, next_cursor = keyset_page(
+			comments, request.GET.get('cursor', ''), int_param(request, 'limit', COMMENTS_PAGE_SIZE, COMMENTS_MAX_PAGE_SIZE),
+		)
+	except ValueError:
+		return HttpResponseBadRequest('Invalid cursor')
+	data = [comment_json(c.user.first_name, c.user.username, c.text, c.created_at) for c in page]
+	return JsonResponse({'comments': data, 'next': next_cursor})
+
+
+@login_required
+def comment_previews(request):
+	"""Newest comments of many posts in one query: {previews: {post_id: [comment, ...]}}.
+
+	?ids=1,2,3 lists the posts; ?n= sets how many comments each gets.
+	"""
+	try:
+		ids = {int(i) for i in request.GET.get('ids', '').split(',') if i.strip()}
+	except ValueError:
+		return HttpResponseBadRequest('Invalid ids')
+	if len(ids) > COMMENT_PREVIEW_MAX_POSTS:
+		return HttpResponseBadRequest(f'At most {COMMENT_PREVIEW_MAX_POSTS} posts')
+	n = int_param(request, 'n', COMMENT_PREVIEW_SIZE, COMMENTS_PAGE_SIZE)
+	# Rank each post's comments newest first and keep the top n of every post
+	rows = (
+		NewsComment.objects.filter(post_id__in=ids)
+		.annotate(rank=Window(RowNumber(), partition_by=F('post_id'), order_by=[F('created_at').desc(), F('id').desc()]))
+		.filter(rank__lte=n)
+		.order_by('post_id', 'rank')
+		.values_list('post_id', 'user__first_name', 'user__username', 'text', 'created_at')
+	)
+	previews = {post_id: [] for post_id in sorted(ids)}
+	for post_id, *fields in rows:
+		previews[post_id].append(comment_json(*fields))
+	return JsonResponse({'previews': previews})
 
 
 @login_required
@@ -202,12 +294,8 @@ def post_comment_create(request, post_id):
 		)
 	return JsonResponse({
 		'ok': True,
-		'comment': {
-			'user': c.user.first_name or c.user.username,
-			'text': c.text,
-			'created_at': c.created_at.isoformat(),
-		},
-		'count': post.comments.count(),
+		'comment': comment_json(request.user.first_name, request.user.username, c.text, c.created_at),
+		'count': refreshed_count(post, 'comments_count'),
 	})
 
 
@@ -218,5 +306,5 @@ def post_share(request, post_id):
 		post = NewsPost.objects.get(id=post_id)
 	except NewsPost.DoesNotExist:
 		return JsonResponse({'error': 'Not found'}, status=404)
-	NewsShare.objects.create(post=post, user=request.user)
-	return JsonResponse({'ok': True, 'shares': post.shares.count()})
+	engagement.buffer.share(post, request.user)
+	return JsonResponse({'ok': True, 'shares': refreshed_count(post, 'shares_count')})
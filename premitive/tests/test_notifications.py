@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from premitive.models import UserProfile, Notification
 from news.models import NewsPost, Announcement
 from projects.models import Project, ProjectMember
+from jobs.queue import run_pending
 
 
 class NotificationFlowTest(TestCase):
@@ -50,6 +51,8 @@ class NotificationFlowTest(TestCase):
         url = reverse('news:announcement_create')
         r = self.client.post(url, {'a_title': 'Exam', 'a_content': 'Midterm on Friday'})
         self.assertEqual(r.status_code, 302)
+        # Fan-out happens in the background worker
+        run_pending()
         # Everyone except teacher should get a notification
         recipients = [self.author, self.student, u2]
         for u in recipients: